@@ -0,0 +1,244 @@
+import subprocess
+
+import numpy as np
+
+from cancellation import check
+from encoding import get_ffmpeg
+
+FRAME_MS = 20
+ANALYSIS_SAMPLE_RATE = 8000
+
+
+def iter_pcm_blocks(audio_file_path, sample_rate=ANALYSIS_SAMPLE_RATE, block_seconds=60, start=None, duration=None,
+                    cancel_token=None):
+    """
+        Yields the audio as mono int16 numpy arrays of block_seconds each, decoded by ffmpeg at sample_rate.
+        start and duration (ms) limit it to a part of the audio.
+
+        Only one block is in memory at a time, however long the audio is.
+        Cancelling cancel_token kills ffmpeg and raises CancelledError.
+    """
+    command = [get_ffmpeg(), '-v', 'error']
+    if start is not None:
+        command += ['-ss', f'{start / 1000:.6f}']
+    command += ['-i', audio_file_path]
+    if duration is not None:
+        command += ['-t', f'{duration / 1000:.6f}']
+    process = subprocess.Popen(command + ['-vn', '-ac', '1', '-ar', str(sample_rate), '-f', 's16le', '-'],
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    block_size = sample_rate * block_seconds * 2
+    handle = cancel_token.on_cancel(process.kill) if cancel_token else None
+    try:
+        while True:
+            data = process.stdout.read(block_size)
+            # A killed ffmpeg ends the output like a finished one
+            check(cancel_token)
+            if not data:
+                break
+            yield np.frombuffer(data[:len(data) // 2 * 2], dtype=np.int16)
+    finally:
+        if handle:
+            cancel_token.remove_callback(handle)
+        process.stdout.close()
+        process.kill()
+        process.wait()
+
+
+def get_frame_energy(audio_file_path, frame_ms=FRAME_MS, sample_rate=ANALYSIS_SAMPLE_RATE, start=None, duration=None,
+                     cancel_token=None):
+    """
+        Returns the RMS energy (dBFS) of every frame_ms frame of the audio (or of duration ms from start)
+        as a float32 numpy array.
+    """
+    frame_size = sample_rate * frame_ms // 1000
+    energies = []
+    remainder = np.empty(0, dtype=np.int16)
+    for block in iter_pcm_blocks(audio_file_path, sample_rate, start=start, duration=duration,
+                                 cancel_token=cancel_token):
+        samples = np.concatenate((remainder, block))
+        n = len(samples) // frame_size * frame_size
+        frames = samples[:n].astype(np.float32).reshape(-1, frame_size) / 32768
+        energies.append(np.sqrt(np.mean(frames ** 2, axis=1)))
+        remainder = samples[n:]
+    if len(remainder):
+        frame = remainder.astype(np.float32) / 32768
+        energies.append(np.sqrt(np.mean(frame ** 2, keepdims=True)))
+    if not energies:
+        return np.empty(0, dtype=np.float32)
+    rms = np.concatenate(energies)
+    return (20 * np.log10(np.maximum(rms, 1e-10))).astype(np.float32)
+
+
+def get_frame_features(audio_file_path, frame_ms=FRAME_MS, sample_rate=ANALYSIS_SAMPLE_RATE, cancel_token=None):
+    """
+        Returns the RMS energy (dBFS) and the spectral centroid (Hz) of every whole frame_ms frame of the audio,
+        as two float32 numpy arrays.
+    """
+    frame_size = sample_rate * frame_ms // 1000
+    window = np.hanning(frame_size).astype(np.float32)
+    freqs = np.fft.rfftfreq(frame_size, 1 / sample_rate).astype(np.float32)
+    energies, centroids = [], []
+    remainder = np.empty(0, dtype=np.int16)
+    for block in iter_pcm_blocks(audio_file_path, sample_rate, cancel_token=cancel_token):
+        samples = np.concatenate((remainder, block))
+        n = len(samples) // frame_size * frame_size
+        frames = samples[:n].astype(np.float32).reshape(-1, frame_size) / 32768
+        energies.append(np.sqrt(np.mean(frames ** 2, axis=1)))
+        power = np.abs(np.fft.rfft(frames * window, axis=1)) ** 2 + 1e-12
+        centroids.append(power @ freqs / power.sum(axis=1))
+        remainder = samples[n:]
+    if not energies:
+        return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32)
+    rms = np.concatenate(energies)
+    return (20 * np.log10(np.maximum(rms, 1e-10))).astype(np.float32), np.concatenate(centroids).astype(np.float32)
+
+
+def classify_speech(energy_db, centroid, frame_ms=FRAME_MS, window_ms=1000, silence_threshold=-40,
+                    modulation_threshold=6, centroid_threshold=200):
+    """
+        Returns whether each window_ms window of the frames sounds like speech, as a bool numpy array.
+
+        Speech goes up and down by syllables and moves between voiced and unvoiced sounds, so its frame energy
+        and its spectral centroid vary a lot within a second. Music and hold tones are far steadier,
+        silence is under silence_threshold. A window is speech when two of these three say so:
+        the energy varies by modulation_threshold dB (std), the centroid by centroid_threshold Hz (std),
+        and a tenth of the frames are 20 dB under the loudest one (the pauses between syllables).
+    """
+    window_frames = max(1, window_ms // frame_ms)
+    n = len(energy_db) // window_frames * window_frames
+    if not n:
+        return np.zeros(0, dtype=bool)
+    energy_windows = energy_db[:n].reshape(-1, window_frames)
+    centroid_windows = centroid[:n].reshape(-1, window_frames)
+    loudest = energy_windows.max(axis=1)
+    votes = ((energy_windows.std(axis=1) >= modulation_threshold).astype(np.int8)
+             + (centroid_windows.std(axis=1) >= centroid_threshold)
+             + (np.mean(energy_windows < loudest[:, None] - 20, axis=1) >= 0.1))
+    return (votes >= 2) & (loudest >= silence_threshold)
+
+
+def find_speech_range(audio_file_path, duration=None, frame_ms=FRAME_MS, window_ms=1000, padding=500, min_trim=2000,
+                      cancel_token=None):
+    """
+        Returns (start, end) in milliseconds of the audio between the music or silence it begins and ends with,
+        (0, duration) when there is nothing to trim. padding milliseconds are kept before and after the speech,
+        intros and outros shorter than min_trim are kept too. Audio without any speech isn't trimmed at all.
+    """
+    energy_db, centroid = get_frame_features(audio_file_path, frame_ms, cancel_token=cancel_token)
+    duration = duration or len(energy_db) * frame_ms
+    speech = classify_speech(energy_db, centroid, frame_ms, window_ms).astype(np.int8)
+    # Speech starts at a speech window followed by another one within two windows, and ends the same way,
+    # so a lone window of music which sounds like speech doesn't count
+    padded = np.concatenate(([0, 0], speech, [0, 0]))
+    ahead = padded[2:-2] + padded[3:-1] + padded[4:]
+    behind = padded[:-4] + padded[1:-3] + padded[2:-2]
+    starts = np.flatnonzero(speech & (ahead >= 2))
+    ends = np.flatnonzero(speech & (behind >= 2))
+    if not len(starts):
+        return 0, duration
+    start = max(0, int(starts[0]) * window_ms - padding)
+    end = min(duration, (int(ends[-1]) + 1) * window_ms + padding)
+    return (start if start >= min_trim else 0), (end if duration - end >= min_trim else duration)
+
+
+def find_silences(energy_db, silence_threshold=-40, min_frames=1):
+    """
+        Returns (start, end) frame indexes of every run of frames quieter than silence_threshold
+        which is at least min_frames long.
+    """
+    silent = np.concatenate(([0], (energy_db < silence_threshold).astype(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(silent))
+    starts, ends = edges[0::2], edges[1::2]
+    keep = ends - starts >= min_frames
+    return list(zip(starts[keep].tolist(), ends[keep].tolist()))
+
+
+def smooth_energy(energy_db):
+    # Smooth over ~300ms, a single quiet frame in the middle of a word is not a pause
+    kernel = np.ones(15, dtype=np.float32) / 15
+    return np.convolve(energy_db, kernel, mode='same') if len(energy_db) >= len(kernel) else energy_db
+
+
+def find_quietest_point(audio_file_path, start, duration, frame_ms=FRAME_MS, cancel_token=None):
+    """
+        Returns the position (ms) of the quietest moment of duration ms from start, only that part is decoded.
+    """
+    energy_db = get_frame_energy(audio_file_path, frame_ms, start=start, duration=duration, cancel_token=cancel_token)
+    if not len(energy_db):
+        return start + duration
+    return start + int(np.argmin(smooth_energy(energy_db))) * frame_ms
+
+
+def get_search_range(cut, end, split_duration, search_window):
+    """
+        Returns (earliest, latest) the chunk beginning at cut can end at, searched for a pause: at most split_duration
+        after cut, and late enough for the rest up to end to fit in as few chunks as cutting exactly would make.
+        Any unit, milliseconds or frames.
+    """
+    chunks_left = -(-(end - cut) // split_duration)
+    latest = cut + split_duration
+    earliest = max(latest - min(search_window, split_duration // 2), end - (chunks_left - 1) * split_duration)
+    return earliest, latest
+
+
+def plan_chunks_by_silence(energy_db, split_duration=600000, duration=None, frame_ms=FRAME_MS, search_window=30000,
+                           silence_threshold=-40, drop_silence=None, padding=500):
+    """
+        Returns (start, length) in milliseconds of every chunk, cutting at the quietest point
+        near each split_duration boundary (see get_search_range), so words are not cut in half.
+        energy_db has every frame of the audio, script.plan_chunks_at_pauses does the same decoding only
+        what it searches.
+
+        With drop_silence (ms), silences at least that long which fall between chunks are left out
+        (padding milliseconds are kept around the speech). Chunks keep their real start time,
+        so the segments of each chunk can still be shifted to the right place.
+    """
+    frame_count = len(energy_db)
+    duration = duration or frame_count * frame_ms
+    split_frames = max(1, split_duration // frame_ms)
+    window_frames = max(1, search_window // frame_ms)
+
+    smoothed = smooth_energy(energy_db)
+
+    spans = [(0, frame_count)]
+    if drop_silence:
+        padding_frames = padding // frame_ms
+        spans = []
+        cur = 0
+        for start, end in find_silences(energy_db, silence_threshold, drop_silence // frame_ms):
+            # No padding is needed at the very beginning or the end of the audio
+            start = start + padding_frames if start > 0 else 0
+            end = end - padding_frames if end < frame_count else frame_count
+            if end <= start:
+                continue
+            if start > cur:
+                spans.append((cur, start))
+            cur = max(cur, end)
+        if cur < frame_count:
+            spans.append((cur, frame_count))
+
+        # Join neighbouring speech while it fits in a chunk, so dropping silence means fewer chunks, not more.
+        # Only the silences between chunks are dropped, a chunk keeps a single offset.
+        merged_spans = []
+        for span_start, span_end in spans:
+            if merged_spans and span_end - merged_spans[-1][0] <= split_frames:
+                merged_spans[-1] = (merged_spans[-1][0], span_end)
+            else:
+                merged_spans.append((span_start, span_end))
+        spans = merged_spans
+
+    chunk_ranges = []
+    for span_start, span_end in spans:
+        cut = span_start
+        while span_end - cut > split_frames:
+            window_start, window_end = get_search_range(cut, span_end, split_frames, window_frames)
+            boundary = (window_start + int(np.argmin(smoothed[window_start:window_end]))
+                        if window_end > window_start else window_end)
+            chunk_ranges.append((cut, boundary))
+            cut = boundary
+        chunk_ranges.append((cut, span_end))
+
+    # The last frame may be shorter than frame_ms, so the chunk which reaches it ends at duration
+    ends = [duration if end == frame_count else min(end * frame_ms, duration) for _, end in chunk_ranges]
+    return [(start * frame_ms, end - start * frame_ms) for (start, _), end in zip(chunk_ranges, ends)
+            if start * frame_ms < end]
@@ -1,7 +1,49 @@
-from PyQt5.QtCore import pyqtSignal
+import hashlib
+import time
+
+from PyQt5.QtCore import pyqtSignal, QThread
 from PyQt5.QtGui import QColor
 from PyQt5.QtWidgets import QPushButton, QWidget, QHBoxLayout, QLineEdit, QLabel
 
+# How long (seconds) a key which was found valid is trusted without asking the API again
+API_KEY_CHECK_TTL = 24 * 60 * 60
+# How long the API has to answer before the key is taken as unchecked
+API_KEY_CHECK_TIMEOUT = 5
+
+
+def get_key_hash(api_key):
+    # Tells whether the cached result is about the same key, without writing the key a second time
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+
+class ApiKeyCheckThread(QThread):
+    # api_key, True / False, None when the API couldn't tell
+    checked = pyqtSignal(str, object)
+
+    def __init__(self, wrapper, api_key, trusted=False, known_good=False, timeout=API_KEY_CHECK_TIMEOUT, parent=None):
+        super(ApiKeyCheckThread, self).__init__(parent)
+        self.__wrapper = wrapper
+        self.__api_key = api_key
+        # trusted: not asked to the API at all, known_good: set anyway when the API can't tell
+        self.__trusted = trusted
+        self.__known_good = known_good
+        self.__timeout = timeout
+
+    def run(self):
+        try:
+            if self.__trusted:
+                # Setting the key loads openai, which takes a while too
+                self.__wrapper.set_api(self.__api_key)
+                result = True
+            else:
+                result = self.__wrapper.request_and_set_api(self.__api_key, self.__timeout)
+                if result is None and self.__known_good:
+                    self.__wrapper.set_api(self.__api_key)
+        except Exception:
+            # e.g. a malformed OPENAI_BASE_URL, the key could be neither checked nor set
+            result = None
+        self.checked.emit(self.__api_key, result)
+
 
 class ApiWidget(QWidget):
     apiKeyAccepted = pyqtSignal(str, bool)
@@ -18,6 +60,8 @@ class ApiWidget(QWidget):
         self.__api_key_name = api_key_name
 
         self.__not_check_api = not_check_api
+        # Only the result of the last check counts when the key is submitted again while one is running
+        self.__t = None
 
     def __initUi(self):
         self.__apiLineEdit = QLineEdit()
@@ -38,37 +82,64 @@ class ApiWidget(QWidget):
 
         self.setLayout(lay)
 
+        # The key is checked in the background, the window doesn't wait for it
         self.setApi()
 
     def notCheckApi(self):
         self.__apiCheckPreviewLbl.hide()
         self.__not_check_api = True
 
+    def __setPreview(self, text, color):
+        self.__apiCheckPreviewLbl.setStyleSheet("color: {}".format(color.name()))
+        self.__apiCheckPreviewLbl.setText(text)
+        self.__apiCheckPreviewLbl.setVisible(not self.__not_check_api)
+
+    def __isTrusted(self, api_key, max_age=API_KEY_CHECK_TTL):
+        # Whether the key was found valid less than max_age seconds ago
+        if not self.__settings_ini:
+            return False
+        checked_at = self.__settings_ini.value(f'{self.__api_key_name}_CHECKED_AT', 0, type=float)
+        return (self.__settings_ini.value(f'{self.__api_key_name}_CHECKED_HASH', '', type=str) == get_key_hash(api_key)
+                and time.time() - checked_at < max_age)
+
     def setApi(self):
-        f = False
         self.__api_key = self.__apiLineEdit.text()
         if self.__settings_ini:
             self.__settings_ini.setValue(self.__api_key_name, self.__api_key)
-            if self.__not_check_api:
-                self.__wrapper.request_and_set_api(self.__api_key)
-                # This has to be set to True because we are not checking the API key
-                f = True
-            else:
-                try:
-                    f = self.__wrapper.request_and_set_api(self.__api_key)
-                    if f:
-                        self.__apiCheckPreviewLbl.setStyleSheet("color: {}".format(QColor(0, 200, 0).name()))
-                        self.__apiCheckPreviewLbl.setText('API key is valid')
-                    else:
-                        raise Exception
-                except Exception as e:
-                    self.__apiCheckPreviewLbl.setStyleSheet("color: {}".format(QColor(255, 0, 0).name()))
-                    self.__apiCheckPreviewLbl.setText('API key is invalid')
-                finally:
-                    self.__apiCheckPreviewLbl.show()
-            self.apiKeyAccepted.emit(self.__api_key, f)
+        if not self.__settings_ini or not self.__api_key:
+            self.__t = None
+            self.__apiCheckPreviewLbl.hide()
+            self.apiKeyAccepted.emit(self.__api_key, False)
+            return
+        trusted = self.__not_check_api or self.__isTrusted(self.__api_key)
+        self.__setPreview('Validating…', QColor(128, 128, 128))
+        # Parented, so a check which is still running when another one starts isn't destroyed
+        self.__t = ApiKeyCheckThread(self.__wrapper, self.__api_key, trusted,
+                                     self.__isTrusted(self.__api_key, float('inf')), parent=self)
+        self.__t.checked.connect(self.__checked)
+        self.__t.finished.connect(self.__t.deleteLater)
+        self.__t.start()
+
+    def __checked(self, api_key, result):
+        if self.sender() is not self.__t:
+            return
+        if result is None and self.__isTrusted(api_key, float('inf')) and self.__wrapper.is_available():
+            # Offline: the last known good result of this key is used
+            result = True
+            self.__setPreview('API key could not be checked (offline), last known to be valid', QColor(200, 120, 0))
+        elif result is None:
+            self.__setPreview('API key could not be checked', QColor(255, 0, 0))
+        elif result:
+            # Only what the API said is remembered, not a key which wasn't checked
+            if not self.__not_check_api and not self.__isTrusted(api_key):
+                self.__settings_ini.setValue(f'{self.__api_key_name}_CHECKED_HASH', get_key_hash(api_key))
+                self.__settings_ini.setValue(f'{self.__api_key_name}_CHECKED_AT', time.time())
+            self.__setPreview('API key is valid', QColor(0, 200, 0))
         else:
-            self.apiKeyAccepted.emit(self.__api_key, f)
+            self.__settings_ini.remove(f'{self.__api_key_name}_CHECKED_HASH')
+            self.__settings_ini.remove(f'{self.__api_key_name}_CHECKED_AT')
+            self.__setPreview('API key is invalid', QColor(255, 0, 0))
+        self.apiKeyAccepted.emit(api_key, bool(result))
 
     def getApi(self):
-        return self.__apiLineEdit.text()
\ No newline at end of file
+        return self.__apiLineEdit.text()
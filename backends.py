@@ -0,0 +1,294 @@
+import importlib.util
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from cancellation import CancellableReader, check
+from transport import get_client
+from workspace import get_chunk_path, open_chunk
+
+
+def _field(obj, name):
+    # Segments are dicts in older openai versions and models in newer ones
+    if isinstance(obj, dict):
+        return obj[name]
+    return getattr(obj, name)
+
+
+def wants_words(args):
+    return 'word' in (args.get('timestamp_granularities') or ())
+
+
+class TranscriptionBackend:
+    """
+        Turns one chunk file into {'language', 'duration', 'segments': [{'start', 'end', 'text'}]},
+        plus 'words': [{'start', 'end', 'word'}] when the args' timestamp_granularities has 'word' (see
+        wants_words), times relative to the start of the chunk.
+
+        transcribe() is called from several worker threads at the same time. cancel_token, when given,
+        is checked between retries and aborts an upload in progress; a request which is already sent
+        is given up on by the caller.
+        Backends with accepts_buffers get the chunks kept in memory (workspace.ChunkBuffer) as they are,
+        the others always get a path.
+    """
+    name = None
+    accepts_buffers = False
+
+    def is_available(self):
+        return True
+
+    def set_api_key(self, api_key):
+        pass
+
+    def get_params(self):
+        """
+            What, besides the request arguments, changes the result of this backend.
+            Part of the cache key and of the job manifest.
+        """
+        return {}
+
+    def transcribe(self, audio_file_path, args, cancel_token=None):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class OpenAIBackend(TranscriptionBackend):
+    """
+        The transcription endpoint of the OpenAI API (or a compatible server at base_url),
+        every request goes through the resilience policy.
+    """
+    name = 'openai'
+    # Uploaded from memory like from a file
+    accepts_buffers = True
+
+    def __init__(self, resilience, base_url=None):
+        self.__client = None
+        self.__base_url = base_url
+        self.__resilience = resilience
+
+    def is_available(self):
+        return self.__client is not None
+
+    def get_base_url(self):
+        # Where the client sends the requests, the openai package reads OPENAI_BASE_URL too
+        return self.__base_url or os.environ.get('OPENAI_BASE_URL') or 'https://api.openai.com/v1'
+
+    def get_params(self):
+        # Another server can transcribe the same chunk differently, the model is in the request arguments
+        return {'base_url': self.get_base_url()}
+
+    def set_api_key(self, api_key):
+        if self.__client is not None:
+            # Same client, same connections
+            self.__client.api_key = api_key
+            return
+        # openai takes most of the startup time, so it's loaded with the first key
+        from openai import OpenAI
+        # Retrying is up to the resilience policy, connections are pooled by the shared client
+        self.__client = OpenAI(api_key=api_key, base_url=self.__base_url, max_retries=0,
+                               http_client=get_client())
+
+    def __create_transcription(self, chunk_file, args, cancel_token=None):
+        # The file is opened on every attempt, so a retry uploads it from the beginning
+        with open_chunk(chunk_file) as audio_file:
+            if cancel_token is not None:
+                # Cancelling stops the upload, the chunk isn't transcribed (nor billed)
+                audio_file = CancellableReader(audio_file, cancel_token)
+            try:
+                return self.__client.audio.transcriptions.create(
+                    **args,
+                    file=(os.path.basename(get_chunk_path(chunk_file)), audio_file),
+                    timeout=self.__resilience.timeout,
+                )
+            except Exception:
+                # openai reports the aborted upload as a connection error
+                check(cancel_token)
+                raise
+
+    def transcribe(self, chunk_file, args, cancel_token=None):
+        transcription = self.__resilience.call(self.__create_transcription, chunk_file, args, cancel_token,
+                                               cancel_token=cancel_token)
+        result_obj = {
+            'language': transcription.language,
+            'duration': transcription.duration,
+            'segments': [{
+                'start': _field(segment, 'start'),
+                'end': _field(segment, 'end'),
+                'text': _field(segment, 'text')
+            } for segment in transcription.segments or []]
+        }
+        if wants_words(args):
+            result_obj['words'] = [{
+                'start': _field(word, 'start'),
+                'end': _field(word, 'end'),
+                'word': _field(word, 'word')
+            } for word in getattr(transcription, 'words', None) or []]
+        return result_obj
+
+
+def _load_faster_whisper(model_name, device, compute_type, cpu_threads):
+    from faster_whisper import WhisperModel
+    return WhisperModel(model_name, device=device, compute_type=compute_type, cpu_threads=cpu_threads)
+
+
+def _run_faster_whisper(model, audio_file_path, args):
+    segments, info = model.transcribe(audio_file_path, language=args.get('language'),
+                                      initial_prompt=args.get('prompt'), temperature=args.get('temperature', 0),
+                                      word_timestamps=wants_words(args))
+    # A generator, transcribed while it's read
+    segments = list(segments)
+    result_obj = {
+        'language': info.language,
+        'duration': info.duration,
+        'segments': [{'start': segment.start, 'end': segment.end, 'text': segment.text} for segment in segments],
+    }
+    if wants_words(args):
+        result_obj['words'] = [{'start': word.start, 'end': word.end, 'word': word.word}
+                               for segment in segments for word in segment.words or []]
+    return result_obj
+
+
+def _load_whisper(model_name, device, compute_type, cpu_threads):
+    import torch
+    import whisper
+    torch.set_num_threads(cpu_threads)
+    return whisper.load_model(model_name, device=device)
+
+
+def _run_whisper(model, audio_file_path, args):
+    import whisper
+    audio = whisper.load_audio(audio_file_path)
+    result = model.transcribe(audio, language=args.get('language'), initial_prompt=args.get('prompt'),
+                              temperature=args.get('temperature', 0), fp16=False, word_timestamps=wants_words(args))
+    result_obj = {
+        'language': result['language'],
+        'duration': len(audio) / whisper.audio.SAMPLE_RATE,
+        'segments': [{'start': segment['start'], 'end': segment['end'], 'text': segment['text']}
+                     for segment in result['segments']],
+    }
+    if wants_words(args):
+        result_obj['words'] = [{'start': word['start'], 'end': word['end'], 'word': word['word']}
+                               for segment in result['segments'] for word in segment.get('words', [])]
+    return result_obj
+
+
+# engine: (load the model, transcribe a file with it)
+LOCAL_ENGINES = {
+    'faster-whisper': (_load_faster_whisper, _run_faster_whisper),
+    'whisper': (_load_whisper, _run_whisper),
+}
+
+# Models loaded in this process, shared by every job and thread
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_local_engine():
+    """
+        Returns the first local engine which is installed, faster-whisper preferred.
+    """
+    for engine, module in (('faster-whisper', 'faster_whisper'), ('whisper', 'whisper')):
+        # Only looked up, the engine itself is imported with the model
+        if importlib.util.find_spec(module):
+            return engine
+    raise ImportError('Install faster-whisper (or openai-whisper) to transcribe without the API')
+
+
+def get_local_model(engine, model_name, device='cpu', compute_type='int8', cpu_threads=0):
+    """
+        Loads the model the first time it is asked for, then returns the same one.
+    """
+    key = (engine, model_name, device, compute_type, cpu_threads)
+    with _models_lock:
+        if key not in _models:
+            _models[key] = LOCAL_ENGINES[engine][0](model_name, device, compute_type, cpu_threads)
+        return _models[key]
+
+
+def _load_locally(model_key):
+    # Nothing is sent back, the model stays in the pool process
+    try:
+        get_local_model(*model_key)
+    except Exception:
+        # Raised again by the first chunk, where the job reports it
+        pass
+
+
+def _transcribe_locally(model_key, audio_file_path, args):
+    # Runs in the pool processes, each of them loads the model once on its first chunk
+    return LOCAL_ENGINES[model_key[0]][1](get_local_model(*model_key), audio_file_path, args)
+
+
+# Pools of worker processes, shared by every LocalWhisperBackend with the same model and size
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(model_key, processes):
+    with _pools_lock:
+        key = (model_key, processes)
+        if key not in _pools:
+            # spawn, not fork: the pool is started from the worker threads of a running job
+            _pools[key] = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+        return _pools[key]
+
+
+def shutdown_local_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown(cancel_futures=True)
+        _pools.clear()
+
+
+class LocalWhisperBackend(TranscriptionBackend):
+    """
+        Transcribes on this machine with faster-whisper or openai-whisper, no network and no API cost.
+
+        Chunks are spread over processes worker processes (half of the cores by default, each using the
+        rest of the cores for its own threads), processes=1 transcribes in this process.
+        Every process loads the model once, lazily, and keeps it for every later job.
+        model_name is a model size ('tiny', 'base', ...) or a directory with a converted model.
+        Languages are returned as codes ('en'), not names like the API returns them.
+    """
+    name = 'local'
+
+    def __init__(self, model_name='base', engine=None, device='cpu', compute_type='int8', processes=None):
+        self.__engine = engine or get_local_engine()
+        cpu_count = os.cpu_count() or 1
+        self.__processes = processes or max(1, cpu_count // 2)
+        cpu_threads = max(1, cpu_count // self.__processes)
+        self.__model_key = (self.__engine, model_name, device, compute_type, cpu_threads)
+
+    def get_params(self):
+        # The request's model (whisper-1) means nothing here
+        return {'backend': self.__engine, 'model': self.__model_key[1]}
+
+    def preload(self):
+        """
+            Starts loading the model now instead of on the first chunk, without waiting for it:
+            in a thread of this process with processes=1, in every process of the pool otherwise
+            (they are started by as many loads submitted at once). A chunk sent meanwhile waits for its model.
+        """
+        if self.__processes == 1:
+            threading.Thread(target=_load_locally, args=(self.__model_key,), daemon=True).start()
+            return
+        pool = _get_pool(self.__model_key, self.__processes)
+        for _ in range(self.__processes):
+            pool.submit(_load_locally, self.__model_key)
+
+    def transcribe(self, audio_file_path, args, cancel_token=None):
+        if self.__processes == 1:
+            return _transcribe_locally(self.__model_key, audio_file_path, args)
+        future = _get_pool(self.__model_key, self.__processes).submit(
+            _transcribe_locally, self.__model_key, audio_file_path, args)
+        if cancel_token:
+            # A chunk still waiting for a process is never started
+            handle = cancel_token.on_cancel(future.cancel)
+            try:
+                return future.result()
+            finally:
+                cancel_token.remove_callback(handle)
+        return future.result()
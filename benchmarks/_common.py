@@ -0,0 +1,15 @@
+import os
+import sys
+
+# Benchmarks are run as plain scripts (python benchmarks/bench_xxx.py), so make the app modules importable
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+EXAMPLES_DIR = os.path.join(ROOT_DIR, 'local_examples')
+
+
+def example_files():
+    # Chunks of an interrupted run may still be lying next to the samples
+    return sorted(os.path.join(EXAMPLES_DIR, filename) for filename in os.listdir(EXAMPLES_DIR)
+                  if not filename.startswith('split_audio_') and os.path.isfile(os.path.join(EXAMPLES_DIR, filename)))
@@ -0,0 +1,60 @@
+import argparse
+import os
+import tempfile
+import time
+
+from _common import example_files
+from mock_server import start_mock_server
+
+from cache import TranscriptionCache
+from encoding import ENCODING_PROFILES
+from resilience import ResiliencePolicy
+from script import GPTTranscribeWrapper, cut_the_audio
+
+
+def get_repeated_cut_keys(filename, tmp_dir, encoding, in_memory):
+    # The same range cut twice, the cache only hits when both give the same bytes
+    return [TranscriptionCache.make_key(cut_the_audio(filename, os.path.join(tmp_dir, f'cut_{i}.wav'), 1000, 5000,
+                                                      encoding=encoding, in_memory=in_memory), {})
+            for i in range(2)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold vs warm transcription cache against a mock server')
+    parser.add_argument('--latency', type=float, default=0.5, help='Mock API latency per request (seconds)')
+    parser.add_argument('--split-duration', type=int, default=2000, help='Chunk length (ms)')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--encoding', default='auto', help="'auto', 'copy' or one of encoding.ENCODING_PROFILES")
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for encoding in ['copy'] + list(ENCODING_PROFILES):
+            for in_memory in (False, True):
+                keys = get_repeated_cut_keys(example_files()[0], tmp_dir, encoding, in_memory)
+                failed |= keys[0] != keys[1]
+                print(f'{encoding} {"in memory" if in_memory else "file"}: the same cut twice '
+                      f'{"has the same key" if keys[0] == keys[1] else "FAIL: has different keys"}')
+
+    server, base_url = start_mock_server(latency=args.latency)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        wrapper = GPTTranscribeWrapper('sk-mock', db_url=f'sqlite:///{os.path.join(tmp_dir, "cache.db")}',
+                                       base_url=base_url, resilience=ResiliencePolicy(requests_per_minute=None))
+        for run in ('cold', 'warm'):
+            start = time.perf_counter()
+            for filename in example_files():
+                wrapper.transcribe_audio(filename, response_format='verbose_json',
+                                         timestamp_granularities=['segment'], max_workers=args.workers,
+                                         split_duration=args.split_duration, encoding=args.encoding)
+            elapsed = time.perf_counter() - start
+            print(f'{run}: {elapsed:.2f}s, {server.request_count} API requests so far, {wrapper.get_cache().stats()}')
+        # Nothing is sent again
+        failed |= wrapper.get_cache().stats()['hits'] != wrapper.get_cache().stats()['misses']
+    server.shutdown()
+    if failed:
+        raise SystemExit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
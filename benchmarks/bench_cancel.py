@@ -0,0 +1,118 @@
+import argparse
+import glob
+import os
+import subprocess
+import tempfile
+import threading
+import time
+
+from _common import EXAMPLES_DIR, example_files
+from mock_server import start_file_server, start_mock_server
+
+from cancellation import CALL_THREAD_NAME, CancellationToken, CancelledError
+from download import RangedDownloader
+from resilience import ResiliencePolicy
+from script import GPTTranscribeWrapper, cut_the_audio
+from workspace import get_temp_root
+
+
+def time_cancel(fn, after):
+    """
+        Runs fn(cancel_token), cancels it after after seconds and returns how long fn took to give up (seconds),
+        None if it finished before being cancelled.
+    """
+    cancel_token = CancellationToken()
+    cancelled_at = []
+
+    def cancel():
+        cancelled_at.append(time.perf_counter())
+        cancel_token.cancel()
+
+    timer = threading.Timer(after, cancel)
+    timer.start()
+    try:
+        fn(cancel_token)
+    except CancelledError:
+        return time.perf_counter() - cancelled_at[0]
+    finally:
+        timer.cancel()
+    return None
+
+
+def count_request_threads():
+    # Requests are sent from threads of cancellation.call, which go on after the job has stopped
+    return sum(1 for thread in threading.enumerate() if thread.name == CALL_THREAD_NAME)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='How long a running job takes to stop once it is cancelled')
+    parser.add_argument('--latency', type=float, default=10, help='Mock API latency per request (seconds)')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--after', type=float, default=1, help='Cancel after (seconds)')
+    args = parser.parse_args()
+
+    results = {}
+    filename = example_files()[0]
+
+    def transcribe(wrapper, filename, split_duration, cancel_token):
+        for _ in wrapper.iter_transcribe_audio(filename, response_format='verbose_json',
+                                               timestamp_granularities=['segment'], max_workers=args.workers,
+                                               split_duration=split_duration, cancel_token=cancel_token):
+            pass
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Uploaded already, the chunks are transcribed (and billed) anyway: their results are cached when they arrive
+        server, base_url = start_mock_server(latency=args.latency)
+        wrapper = GPTTranscribeWrapper('sk-mock', db_url=f'sqlite:///{os.path.join(tmp_dir, "cache.db")}',
+                                       base_url=base_url, resilience=ResiliencePolicy(requests_per_minute=None))
+        results['transcription (requests in flight)'] = time_cancel(
+            lambda cancel_token: transcribe(wrapper, filename, 2000, cancel_token), args.after)
+        # Give the chunks which were being read by the dropped requests a moment to be removed
+        time.sleep(0.5)
+        leftovers = glob.glob(os.path.join(EXAMPLES_DIR, 'split_audio_*')) + glob.glob(
+            os.path.join(get_temp_root(), 'transcribe_*'))
+        time.sleep(args.latency)
+        late_results = (wrapper.get_cache().stats()['entries'], server.request_count)
+        server.shutdown()
+
+        # Still uploading, the uploads are aborted: chunks bigger than the socket buffers, over a slow link
+        long_file = os.path.join(tmp_dir, 'long.wav')
+        subprocess.run(['ffmpeg', '-y', '-v', 'error', '-stream_loop', '40', '-i', filename, long_file], check=True)
+        server, base_url = start_mock_server(upload_bandwidth=1024 * 1024)
+        wrapper = GPTTranscribeWrapper('sk-mock', db_url=None, base_url=base_url,
+                                       resilience=ResiliencePolicy(requests_per_minute=None))
+        results['transcription (uploading)'] = time_cancel(
+            lambda cancel_token: transcribe(wrapper, long_file, 120000, cancel_token), args.after)
+        time.sleep(0.5)
+        aborted_uploads = (server.request_count, count_request_threads())
+        server.shutdown()
+
+        fixture = os.path.join(tmp_dir, 'fixture.m4a')
+        subprocess.run(['ffmpeg', '-y', '-v', 'error', '-stream_loop', '200', '-i', filename, '-c:a', 'aac',
+                        '-b:a', '128k', fixture], check=True)
+        with open(fixture, 'rb') as f:
+            data = f.read()
+
+        server, url = start_file_server(data, bandwidth=256 * 1024)
+        dst_filename = os.path.join(tmp_dir, 'downloaded.m4a')
+        results['download (throttled)'] = time_cancel(
+            lambda cancel_token: RangedDownloader(cancel_token=cancel_token).download(url, dst_filename), args.after)
+        server.shutdown()
+
+        # Re-encoding an hour of audio takes a while
+        results['ffmpeg (re-encoding)'] = time_cancel(
+            lambda cancel_token: cut_the_audio(fixture, os.path.join(tmp_dir, 'cut.mp3'), 0, 3600000,
+                                               encoding='mp3_64k', cancel_token=cancel_token), args.after)
+        leftovers += [path for path in [os.path.join(tmp_dir, 'cut.mp3')] if os.path.exists(path)]
+
+    print(f'cancelled after {args.after}s, mock API latency {args.latency}s, {args.workers} workers')
+    for name, latency in results.items():
+        print(f'{name:<36} {"finished first" if latency is None else f"stopped in {latency * 1000:.0f} ms"}')
+    print(f'chunk files left behind: {len(leftovers)}')
+    print(f'results of requests in flight cached when they arrived: {late_results[0]} of {late_results[1]}')
+    print(f'uploads finished after the cancel: {aborted_uploads[0]}, '
+          f'request threads still running 0.5s later: {aborted_uploads[1]}')
+
+
+if __name__ == '__main__':
+    main()
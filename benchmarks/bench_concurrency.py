@@ -0,0 +1,35 @@
+import argparse
+import time
+
+from _common import example_files
+from mock_server import start_mock_server
+
+from resilience import ResiliencePolicy
+from script import GPTTranscribeWrapper
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serial vs concurrent chunk upload against a mock server')
+    parser.add_argument('--latency', type=float, default=0.5, help='Mock API latency per request (seconds)')
+    parser.add_argument('--split-duration', type=int, default=2000, help='Chunk length (ms)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    server, base_url = start_mock_server(latency=args.latency)
+    wrapper = GPTTranscribeWrapper('sk-mock', db_url=None, base_url=base_url,
+                                   resilience=ResiliencePolicy(requests_per_minute=None))
+
+    for filename in example_files():
+        for max_workers in args.workers:
+            start = time.perf_counter()
+            result_obj_lst, _ = wrapper.transcribe_audio(filename, response_format='verbose_json',
+                                                         timestamp_granularities=['segment'],
+                                                         max_workers=max_workers,
+                                                         split_duration=args.split_duration)
+            elapsed = time.perf_counter() - start
+            print(f'{filename}: {len(result_obj_lst)} chunks, max_workers={max_workers}: {elapsed:.2f}s')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+import argparse
+import hashlib
+import os
+import subprocess
+import tempfile
+import time
+
+from _common import example_files
+from mock_server import start_file_server
+
+from download import RangedDownloader
+
+
+def make_fixture(src, dst, loops):
+    # An AAC file like the audio stream of a long video
+    subprocess.run(['ffmpeg', '-y', '-v', 'error', '-stream_loop', str(loops), '-i', src, '-c:a', 'aac', '-b:a', '128k',
+                    dst], check=True)
+    with open(dst, 'rb') as f:
+        return f.read()
+
+
+def download(url, dst_filename, **kwargs):
+    start = time.perf_counter()
+    RangedDownloader(**kwargs).download(url, dst_filename)
+    elapsed = time.perf_counter() - start
+    with open(dst_filename, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    os.remove(dst_filename)
+    return elapsed, digest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ranged parallel download against a local throttled server')
+    parser.add_argument('--loops', type=int, default=60, help='How many times the sample is repeated in the fixture')
+    parser.add_argument('--bandwidth', type=int, default=2 * 1024 * 1024, help='Bytes/s per connection')
+    parser.add_argument('--piece-size', type=int, default=1024 * 1024)
+    args = parser.parse_args()
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data = make_fixture(example_files()[0], os.path.join(tmp_dir, 'fixture.m4a'), args.loops)
+        expected = hashlib.sha256(data).hexdigest()
+        dst_filename = os.path.join(tmp_dir, 'downloaded.m4a')
+        print(f'fixture: {len(data) / 1024 / 1024:.1f} MB, {args.bandwidth / 1024 / 1024:.1f} MB/s per connection')
+
+        server, url = start_file_server(data, bandwidth=args.bandwidth)
+        for max_workers in (1, 2, 4, 8):
+            elapsed, digest = download(url, dst_filename, max_workers=max_workers, piece_size=args.piece_size)
+            ok &= digest == expected
+            print(f'max_workers={max_workers}: {elapsed:.2f}s ({len(data) / elapsed / 1024 / 1024:.1f} MB/s)'
+                  f'{"" if digest == expected else " CORRUPTED"}')
+        server.shutdown()
+
+        server, url = start_file_server(data, bandwidth=args.bandwidth, ranges=False)
+        elapsed, digest = download(url, dst_filename, max_workers=4, piece_size=args.piece_size)
+        ok &= digest == expected
+        print(f'server without ranges: {elapsed:.2f}s{"" if digest == expected else " CORRUPTED"}')
+        server.shutdown()
+
+        # Every connection may be cut: retried pieces and a second run after giving up both have to end up right
+        server, url = start_file_server(data, bandwidth=args.bandwidth, drop_rate=0.3)
+        try:
+            RangedDownloader(max_workers=4, piece_size=args.piece_size, retries=0).download(url, dst_filename)
+            print('flaky server: finished on the first run')
+        except Exception as e:
+            print(f'flaky server: first run failed ({type(e).__name__}), {server.bytes_sent} bytes sent')
+        sent = server.bytes_sent
+        server.drop_rate = 0
+        elapsed, digest = download(url, dst_filename, max_workers=4, piece_size=args.piece_size)
+        ok &= digest == expected
+        print(f'flaky server: resumed in {elapsed:.2f}s, {server.bytes_sent - sent} of {len(data)} bytes fetched by the second run'
+              f'{"" if digest == expected else " CORRUPTED"}')
+        server.shutdown()
+
+    print('OK' if ok else 'FAIL')
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
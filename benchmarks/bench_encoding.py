@@ -0,0 +1,63 @@
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+
+from _common import example_files
+
+from encoding import ENCODING_PROFILES, MAX_UPLOAD_SIZE, choose_encoding, get_max_chunk_duration
+from script import cut_the_audio, get_audio_info, get_chunk_filename
+
+
+def make_source(src, dst, loops):
+    # A high-bitrate source like the ones which used to go over the upload limit
+    subprocess.run(['ffmpeg', '-y', '-v', 'error', '-stream_loop', str(loops), '-i', src, '-ac', '2', '-ar', '48000',
+                    '-c:a', 'pcm_s16le', dst], check=True)
+
+
+def encode(filename, tmp_dir, encoding, info):
+    chunk = cut_the_audio(filename, get_chunk_filename(os.path.join(tmp_dir, 'x'), 0, info, encoding), 0,
+                          info['duration'], encoding)
+    size = os.path.getsize(chunk)
+    os.remove(chunk)
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bytes uploaded and encode time of every chunk encoding profile')
+    parser.add_argument('--loops', type=int, default=0, help='How many more times every sample is repeated')
+    parser.add_argument('--split-duration', type=int, default=600000, help='Requested chunk length (ms)')
+    args = parser.parse_args()
+
+    totals = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for i, src in enumerate(example_files()):
+            filename = os.path.join(tmp_dir, f'source_{i}.wav')
+            make_source(src, filename, args.loops)
+            info = get_audio_info(filename)
+            for encoding in ['copy'] + list(ENCODING_PROFILES):
+                start = time.perf_counter()
+                size = encode(filename, tmp_dir, encoding, info)
+                elapsed = time.perf_counter() - start
+                total = totals.setdefault(encoding, {'bytes': 0, 'seconds': 0, 'audio_ms': 0})
+                total['bytes'] += size
+                total['seconds'] += elapsed
+                total['audio_ms'] += info['duration']
+
+    print(f'{"profile":<10} {"bytes":>12} {"kbit/s":>8} {"encode s":>9} {"x realtime":>11} {"max chunk":>10}')
+    for encoding, total in totals.items():
+        bitrate = total['bytes'] * 8 / total['audio_ms'] * 1000
+        print(f'{encoding:<10} {total["bytes"]:>12} {bitrate / 1000:>8.1f} {total["seconds"]:>9.2f} '
+              f'{total["audio_ms"] / 1000 / total["seconds"]:>11.0f} '
+              f'{get_max_chunk_duration(bitrate) / 60000:>8.0f}m')
+
+    # What 'auto' picks for the requested chunk length on a few typical sources
+    for codec, bitrate in (('pcm_s16le', 1536000), ('aac', 128000), ('aac', 512000), ('opus', 160000)):
+        encoding, split_duration = choose_encoding({'codec': codec, 'bitrate': bitrate}, args.split_duration)
+        print(f'auto for {codec} {bitrate // 1000} kb/s: {encoding}, chunks of {split_duration / 60000:.1f}m '
+              f'(limit {MAX_UPLOAD_SIZE / 1024 / 1024:.0f} MB)')
+
+
+if __name__ == '__main__':
+    main()
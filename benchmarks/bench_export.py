@@ -0,0 +1,103 @@
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import _common  # noqa: F401
+
+from exporters import EXPORTERS, export
+from segments import SegmentStore
+from transcriptView import format_segment
+
+WORDS = ('revenue', 'quarter', 'growth', 'margin', 'guidance', 'customers', 'the', 'and', 'we', 'expect', 'strong',
+         'year', 'operating', 'cash', 'flow', 'thank', 'you', 'question', 'next', 'analyst', 'über', 'résumé')
+
+
+def old_convert_to_srt(original_filename, content):
+    # What the GUI did before: parse the displayed lines back and concatenate the whole file, printing every line
+    def seconds_to_srt_time(seconds):
+        hours = int(seconds // 3600)
+        minutes = int((seconds % 3600) // 60)
+        secs = int(seconds % 60)
+        millis = int((seconds % 1) * 1000)
+        return f"{hours:02}:{minutes:02}:{secs:02},{millis:03}"
+
+    srt_content = ""
+    for idx, line in enumerate(content):
+        try:
+            time_part = line.split("]")[0].replace("[", "").strip()
+            start_time, end_time = map(float, time_part.split(" --> "))
+            text = line.split("] ")[1].strip()
+            srt_content += f"{idx}\n"
+            srt_content += f"{seconds_to_srt_time(start_time)} --> {seconds_to_srt_time(end_time)}\n"
+            srt_content += f"{text}\n\n"
+            print(f"Start time: {start_time}, End time: {end_time}, Text: {text}")
+        except Exception as e:
+            print(f"Error processing line {idx}: {line} - {e}")
+
+    srt_filename = original_filename.replace(".mp4", ".srt")
+    with open(srt_filename, 'w', encoding='utf-8') as file:
+        file.write(srt_content)
+
+
+def measure(fn):
+    """
+        Returns (seconds, peak MB allocated by Python while fn runs), timed and traced in separate runs
+        since tracing slows everything down.
+    """
+    began = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - began
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export time and memory of a long transcription')
+    parser.add_argument('--segments', type=int, default=50000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    result_obj_lst = [{'language': 'english', 'duration': 600, 'segments': [
+        {'start': i * 3.2, 'end': i * 3.2 + 3.0, 'text': ' ' + ' '.join(rng.choices(WORDS, k=12))}
+        for i in range(chunk_start, min(chunk_start + 200, args.segments))]}
+        for chunk_start in range(0, args.segments, 200)]
+
+    results = {}
+    store = None
+
+    def build():
+        nonlocal store
+        store = SegmentStore.from_results(result_obj_lst)
+
+    results['store from results'] = measure(build)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        lines = [format_segment(*segment) for segment in store]
+
+        def convert():
+            with contextlib.redirect_stdout(io.StringIO()):
+                old_convert_to_srt(os.path.join(tmp_dir, 'old.mp4'), lines)
+
+        results['srt (before)'] = measure(convert)
+        for format_name in EXPORTERS:
+            results[format_name] = measure(lambda: export(store, os.path.join(tmp_dir, 'new'), [format_name]))
+        sizes = {format_name: os.path.getsize(os.path.join(tmp_dir, 'new' + ext))
+                 for format_name, (ext, _) in EXPORTERS.items()}
+
+    print(f'{args.segments} segments')
+    print(f'{"export":<20} {"seconds":>8} {"peak MB":>8} {"file MB":>8}')
+    for name, (seconds, peak) in results.items():
+        size = f'{sizes[name] / 1024 / 1024:>8.1f}' if name in sizes else ''
+        print(f'{name:<20} {seconds:>8.3f} {peak:>8.1f} {size}')
+
+
+if __name__ == '__main__':
+    main()
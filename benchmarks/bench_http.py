@@ -0,0 +1,85 @@
+import argparse
+import tempfile
+import threading
+import time
+
+from _common import example_files
+from mock_server import make_certificate, start_mock_server
+
+import transport
+from resilience import ResiliencePolicy
+from script import GPTTranscribeWrapper
+
+
+def upload(client, base_url, data, count, workers):
+    """
+        Sends count chunk uploads from workers threads at the same time, returns ms per request.
+    """
+    remaining = [count]
+    lock = threading.Lock()
+
+    def work():
+        while True:
+            with lock:
+                if not remaining[0]:
+                    return
+                remaining[0] -= 1
+            client.post(f'{base_url}/audio/transcriptions', files={'file': ('chunk.wav', data)},
+                        data={'model': 'whisper-1', 'response_format': 'verbose_json'},
+                        headers={'Authorization': 'Bearer sk-mock'}).raise_for_status()
+
+    began = time.perf_counter()
+    threads = [threading.Thread(target=work) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return (time.perf_counter() - began) / count * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Connections opened for key checks and chunk uploads over TLS')
+    parser.add_argument('--latency', type=float, default=0.02, help='Mock API latency per request (seconds)')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    certificate = make_certificate(tmp_dir.name)
+    server, base_url = start_mock_server(latency=args.latency, certificate=certificate)
+    transport.configure(verify=certificate[0])
+    with open(example_files()[0], 'rb') as f:
+        data = f.read()
+
+    # The app's own path first, on the shared client: the key check, then every chunk of the samples through openai
+    wrapper = GPTTranscribeWrapper(db_url=None, base_url=base_url, resilience=ResiliencePolicy(requests_per_minute=None))
+    began = time.perf_counter()
+    valid = wrapper.request_and_set_api('sk-mock')
+    chunks = 0
+    for filename in example_files():
+        result_obj_lst, _ = wrapper.transcribe_audio(filename, response_format='verbose_json',
+                                                     timestamp_granularities=['segment'], max_workers=args.workers,
+                                                     split_duration=2000)
+        chunks += len(result_obj_lst)
+    stats = transport.get_stats()
+    print(f'key check ({"valid" if valid else "invalid"}) + {chunks} chunks through openai in '
+          f'{time.perf_counter() - began:.2f}s: {stats["requests"]} requests, {stats["connections"]} connections, '
+          f'{stats["tls_handshakes"]} TLS handshakes, {stats["reused"]} reused '
+          f'(the server saw {server.connection_count} connections)')
+
+    print(f'{args.requests} uploads of {len(data) // 1024} KB, {args.workers} at a time, over TLS')
+    print(f'{"":<34} {"ms/request":>10} {"connections":>12}')
+    clients = [
+        ('new connection every request', transport.create_client(keepalive_expiry=0, verify=certificate[0])),
+        ('kept alive (shared client)', transport.get_client()),
+    ]
+    for name, client in clients:
+        connections_before = server.connection_count
+        ms = upload(client, base_url, data, args.requests, args.workers)
+        print(f'{name:<34} {ms:>10.1f} {server.connection_count - connections_before:>12}')
+    print(f'HTTP/2: {"available" if transport.is_http2_available() else "not available (pip install h2)"}')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+from _common import ROOT_DIR
+
+# None of these may be loaded just to start the CLI
+HEAVY_MODULES = ('PyQt5', 'numpy', 'openai', 'pytube', 'requests', 'faster_whisper', 'whisper')
+
+
+def get_import_times(module):
+    """
+        Returns {module: cumulative microseconds} of everything importing module loads (python -X importtime).
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=ROOT_DIR,
+                            capture_output=True, text=True, check=True)
+    import_times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        import_times[name.strip()] = int(cumulative)
+    return import_times
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup time of the CLI, fails if it loads a heavy module')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=150, help='Most the CLI modules may take to import')
+    args = parser.parse_args()
+
+    import_times = get_import_times('cli')
+    heavy = sorted(name for name in import_times if name.split('.')[0] in HEAVY_MODULES)
+    cli_ms = import_times['cli'] / 1000
+    print(f'import cli: {cli_ms:.1f} ms')
+    for name in ('script', 'scheduler', 'backends', 'exporters', 'cache', 'encoding'):
+        if name in import_times:
+            print(f'  {name}: {import_times[name] / 1000:.1f} ms')
+
+    # The whole process, interpreter startup included
+    elapsed = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-m', 'cli', '--help'], cwd=ROOT_DIR, capture_output=True, check=True)
+        elapsed.append(time.perf_counter() - start)
+    print(f'python -m cli --help: median {statistics.median(elapsed) * 1000:.0f} ms over {args.runs} runs')
+
+    if heavy:
+        print(f'FAIL: heavy modules loaded at startup: {", ".join(heavy)}')
+        sys.exit(1)
+    if cli_ms > args.budget_ms:
+        print(f'FAIL: import cli took more than {args.budget_ms:.0f} ms')
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+
+from _common import example_files
+
+from analysis import find_speech_range
+from script import get_audio_info
+
+# Stand-ins for hold music: a steady chord, a plucked melody, a beat with a bass line and hiss
+MUSIC = {
+    'chord': "0.2*sin(2*PI*261.6*t)+0.2*sin(2*PI*329.6*t)+0.2*sin(2*PI*392*t)",
+    'melody': "0.3*exp(-3*mod(t,0.4))*sin(2*PI*220*pow(2,floor(mod(t*2.5,8))/6)*t)+0.1*sin(2*PI*110*t)",
+    'beat': "0.6*exp(-20*mod(t,0.5))*sin(2*PI*60*t)+0.15*sin(2*PI*110*t)+0.1*sin(2*PI*440*t)",
+}
+
+
+def make_call(speech_files, dst, music, intro, outro, pause):
+    """
+        Writes music for intro ms, pause ms of silence, the speech files, silence and music for outro ms.
+        Returns where the speech starts and ends (ms).
+    """
+    music_src = f"aevalsrc='{MUSIC[music]}':s=24000" if music in MUSIC else 'anoisesrc=c=pink:a=0.1:r=24000'
+    inputs = ['-f', 'lavfi', '-t', str(intro / 1000), '-i', music_src,
+              '-f', 'lavfi', '-t', str(pause / 1000), '-i', 'anullsrc=r=24000:cl=mono']
+    for speech_file in speech_files:
+        inputs += ['-i', speech_file]
+    inputs += ['-f', 'lavfi', '-t', str(pause / 1000), '-i', 'anullsrc=r=24000:cl=mono',
+               '-f', 'lavfi', '-t', str(outro / 1000), '-i', music_src]
+    count = len(speech_files) + 4
+    filters = ''.join(f'[{i}:a]aformat=sample_rates=24000:channel_layouts=mono[a{i}];' for i in range(count))
+    filters += ''.join(f'[a{i}]' for i in range(count)) + f'concat=n={count}:v=0:a=1'
+    subprocess.run(['ffmpeg', '-y', '-v', 'error'] + inputs + ['-filter_complex', filters, dst], check=True)
+    speech = sum(get_audio_info(speech_file)['duration'] for speech_file in speech_files)
+    return intro + pause, intro + pause + speech
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Accuracy and speed of the intro/outro detection on made-up calls')
+    parser.add_argument('--loops', type=int, default=4, help='How many times the samples are repeated in a call')
+    parser.add_argument('--intro', type=int, default=45000, help='Music before the call (ms)')
+    parser.add_argument('--outro', type=int, default=20000, help='Music after the call (ms)')
+    parser.add_argument('--pause', type=int, default=2000, help='Silence between the music and the call (ms)')
+    parser.add_argument('--tolerance', type=int, default=1500, help='Most a boundary may be off (ms)')
+    args = parser.parse_args()
+
+    failed = False
+    audio_ms = saved_ms = seconds = 0
+    print(f'{"music":<8} {"speech":>17} {"detected":>17} {"error ms":>10} {"x realtime":>11}')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for music in list(MUSIC) + ['hiss']:
+            filename = os.path.join(tmp_dir, f'call_{music}.wav')
+            speech_start, speech_end = make_call(example_files() * args.loops, filename, music,
+                                                 args.intro, args.outro, args.pause)
+            duration = get_audio_info(filename)['duration']
+
+            began = time.perf_counter()
+            start, end = find_speech_range(filename, duration)
+            elapsed = time.perf_counter() - began
+
+            # Speech which is cut off is worse than music which is kept, only the first counts as an error
+            error = max(start - speech_start, speech_end - end, 0)
+            print(f'{music:<8} {speech_start:>8}-{speech_end:<8} {start:>8}-{end:<8} {error:>10} '
+                  f'{duration / 1000 / elapsed:>11.0f}')
+            if error > args.tolerance or start < speech_start - args.tolerance - args.pause \
+                    or end > speech_end + args.tolerance + args.pause:
+                print(f'FAIL: {music} boundaries are more than {args.tolerance} ms off')
+                failed = True
+            audio_ms += duration
+            saved_ms += duration - (end - start)
+            seconds += elapsed
+
+        # Speech alone mustn't be trimmed
+        for filename in example_files():
+            duration = get_audio_info(filename)['duration']
+            if find_speech_range(filename, duration) != (0, duration):
+                print(f'FAIL: {filename} has no intro or outro, but it was trimmed')
+                failed = True
+
+    print(f'billed audio: {audio_ms / 60000:.1f} -> {(audio_ms - saved_ms) / 60000:.1f} minutes '
+          f'({saved_ms / audio_ms:.0%} less), analysis {audio_ms / 1000 / seconds:.0f}x realtime')
+    if failed:
+        raise SystemExit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+import argparse
+import time
+
+from _common import example_files
+
+from backends import LocalWhisperBackend, shutdown_local_pools
+from script import GPTTranscribeWrapper
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Transcribe the samples on this machine, no API involved')
+    parser.add_argument('--model', default='tiny', help='Model size or a directory with a converted model')
+    parser.add_argument('--engine', default=None, help='faster-whisper or whisper, the installed one by default')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--split-duration', type=int, default=5000, help='Chunk length (ms)')
+    args = parser.parse_args()
+
+    for processes in args.processes:
+        backend = LocalWhisperBackend(args.model, engine=args.engine, processes=processes)
+        wrapper = GPTTranscribeWrapper(db_url=None, backend=backend)
+        # The first job pays for loading the model, the second one shows the shared model at work
+        for run in ('cold', 'warm'):
+            start = time.perf_counter()
+            audio_seconds = 0
+            segment_count = 0
+            for filename in example_files():
+                result_obj_lst, _ = wrapper.transcribe_audio(filename, response_format='verbose_json',
+                                                             max_workers=processes,
+                                                             split_duration=args.split_duration)
+                audio_seconds += sum(result_obj['duration'] for result_obj in result_obj_lst)
+                segment_count += sum(len(result_obj['segments']) for result_obj in result_obj_lst)
+            elapsed = time.perf_counter() - start
+            print(f'processes={processes} {run}: {audio_seconds:.1f}s of audio, {segment_count} segments '
+                  f'in {elapsed:.2f}s ({audio_seconds / elapsed:.1f}x realtime)')
+        shutdown_local_pools()
+
+
+if __name__ == '__main__':
+    main()
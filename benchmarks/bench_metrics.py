@@ -0,0 +1,106 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from _common import ROOT_DIR, example_files
+from mock_server import start_mock_server
+
+from metrics import Metrics
+from resilience import ResiliencePolicy
+from script import GPTTranscribeWrapper
+
+
+def make_long_audio(src, dst, loops):
+    subprocess.run(['ffmpeg', '-y', '-v', 'error', '-stream_loop', str(loops), '-i', src, dst], check=True)
+
+
+def transcribe(base_url, filename, split_duration, encoding, metrics=None):
+    wrapper = GPTTranscribeWrapper('sk-mock', db_url=None, base_url=base_url,
+                                   resilience=ResiliencePolicy(requests_per_minute=None))
+    began = time.perf_counter()
+    wrapper.transcribe_audio(filename, response_format='verbose_json', timestamp_granularities=['segment'],
+                             max_workers=4, split_duration=split_duration, encoding=encoding, metrics=metrics)
+    return time.perf_counter() - began
+
+
+def print_metrics(result):
+    for stage, totals in result['stages'].items():
+        print(f'    {stage:<10} {totals["count"]:>4} calls {totals["seconds"]:>7.2f}s '
+              f'{totals["bytes"] / 1024 / 1024:>7.1f} MB')
+    seconds = ', '.join(f'{bound} {seconds:.2f}s' for bound, seconds in result['bound_seconds'].items())
+    print(f'    wall {result["wall_seconds"]:.2f}s, {seconds} -> {result["bound"]}-bound')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tells network, CPU and API bound jobs apart from their metrics')
+    parser.add_argument('--loops', type=int, default=20, help='How many times the sample is repeated')
+    parser.add_argument('--split-duration', type=int, default=30000, help='Chunk length (ms)')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs of the overhead comparison')
+    args = parser.parse_args()
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = os.path.join(tmp_dir, 'long.wav')
+        make_long_audio(example_files()[0], filename, args.loops)
+        size = os.path.getsize(filename)
+        print(f'{size / 1024 / 1024:.1f} MB of WAV, {args.split_duration // 1000}s chunks')
+
+        # Sending a chunk is done once the last of it is in the socket's buffer, so the upload has to be
+        # well over the few MB the buffers hold to be told apart from waiting for the API
+        scenarios = [
+            ('slow API (1s per request)', {'latency': 1.0}, args.split_duration, 'copy', 'api'),
+            ('slow upload (2 MB/s), 5 minute chunks', {'upload_bandwidth': 2 * 1024 * 1024}, 300000, 'copy',
+             'network'),
+            ('re-encoded chunks, fast API', {}, args.split_duration, 'opus_32k', 'cpu'),
+        ]
+        for name, server_kwargs, split_duration, encoding, expected in scenarios:
+            server, base_url = start_mock_server(**server_kwargs)
+            metrics = Metrics()
+            seconds = transcribe(base_url, filename, split_duration, encoding, metrics)
+            result = metrics.get()
+            ok &= result['bound'] == expected
+            print(f'{name}: {seconds:.2f}s '
+                  f'({"as expected" if result["bound"] == expected else "EXPECTED " + expected})')
+            print_metrics(result)
+            server.shutdown()
+
+        # What recording costs on the hot path, with nothing else slowing the job down
+        server, base_url = start_mock_server()
+        timings = {False: [], True: []}
+        for _ in range(args.repeat):
+            for measured in (False, True):
+                timings[measured].append(transcribe(base_url, filename, args.split_duration, 'copy',
+                                                    Metrics() if measured else None))
+        without, with_metrics = min(timings[False]), min(timings[True])
+        print(f'overhead: {without * 1000:.1f} ms without metrics, {with_metrics * 1000:.1f} ms with '
+              f'({(with_metrics - without) * 1000:+.1f} ms)')
+
+        # The machine readable dumps of the CLI
+        for ext in ('.json', '.prom'):
+            dump_filename = os.path.join(tmp_dir, 'metrics' + ext)
+            subprocess.run([sys.executable, os.path.join(ROOT_DIR, 'cli.py'), filename, '--api-key', 'sk-mock',
+                            '--base-url', base_url, '--split-duration', str(args.split_duration), '--no-resume',
+                            '-o', tmp_dir, '--metrics', dump_filename], check=True, capture_output=True, cwd=tmp_dir)
+            with open(dump_filename) as f:
+                content = f.read()
+            if ext == '.json':
+                jobs = json.loads(content)['jobs']
+                ok &= len(jobs) == 1 and len(jobs[0]['chunks']) > 1
+                print(f'--metrics {os.path.basename(dump_filename)}: {len(jobs[0]["chunks"])} chunks, '
+                      f'first {json.dumps(jobs[0]["chunks"][0])}')
+            else:
+                # The chunks come from the cache of the first run this time
+                lines = [line for line in content.splitlines()
+                         if line.startswith(('transcribe_stage_seconds_total', 'transcribe_cache_hits_total'))]
+                ok &= bool(lines)
+                print(f'--metrics {os.path.basename(dump_filename)}:\n    ' + '\n    '.join(lines))
+        server.shutdown()
+    print('OK' if ok else 'FAILED')
+
+
+if __name__ == '__main__':
+    main()
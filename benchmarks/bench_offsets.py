@@ -0,0 +1,92 @@
+import argparse
+import os
+import subprocess
+import tempfile
+
+from _common import example_files
+from mock_server import start_mock_server, get_sound_segments
+
+from encoding import choose_encoding
+from resilience import ResiliencePolicy
+from script import GPTTranscribeWrapper, get_audio_info, plan_the_audio
+
+
+def get_errors(reference, segments, boundaries, tolerance=0.25):
+    """
+        Distance (seconds) from every sound start of the whole file to the nearest segment start,
+        leaving out the ones near a planned chunk boundary (sound cut in two by the split).
+
+        Re-encoded chunks can split a sound into two segments, so extra segments are fine,
+        but every sound start has to be found at the same time as in the source.
+    """
+    starts = [segment['start'] for segment in segments]
+    errors = []
+    for segment in reference:
+        if any(abs(segment['start'] - boundary) < tolerance for boundary in boundaries):
+            continue
+        errors.append(min((abs(segment['start'] - start) for start in starts), default=float('inf')))
+    return errors
+
+
+def get_misplaced(result_obj_lst, chunk_index, tolerance=0.06):
+    # Segments starting outside the chunk they were transcribed from: its offset is wrong.
+    # Only starts, a copied chunk may run a packet past its planned end
+    return [(chunk['index'], segment) for result_obj, chunk in zip(result_obj_lst, chunk_index)
+            for segment in result_obj['segments']
+            if not chunk['start'] / 1000 - tolerance <= segment['start'] < chunk['end'] / 1000 + tolerance]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Checks that segment times match the source for every chunk size')
+    parser.add_argument('--split-durations', type=int, nargs='+', default=[2000, 3000, 5000, 7000])
+    parser.add_argument('--max-error', type=float, default=0.06, help='Largest allowed error (seconds)')
+    args = parser.parse_args()
+
+    server, base_url = start_mock_server(segments_from_audio=True)
+    wrapper = GPTTranscribeWrapper('sk-mock', db_url=None, base_url=base_url,
+                                   resilience=ResiliencePolicy(requests_per_minute=None))
+
+    # The samples are PCM, encoded copies of them go through the other ways of cutting
+    tmp_dir = tempfile.TemporaryDirectory()
+    filenames = []
+    for filename in example_files():
+        filenames.append(filename)
+        for ext, codec in (('.mp3', 'libmp3lame'), ('.m4a', 'aac')):
+            encoded_filename = os.path.join(tmp_dir.name, os.path.splitext(os.path.basename(filename))[0] + ext)
+            subprocess.run(['ffmpeg', '-y', '-v', 'error', '-i', filename, '-c:a', codec, encoded_filename], check=True)
+            filenames.append(encoded_filename)
+
+    failed = False
+    for filename in filenames:
+        with open(filename, 'rb') as f:
+            reference, _ = get_sound_segments(filename, f.read())
+        info = get_audio_info(filename)
+        for split_duration in args.split_durations:
+            for silence_aware in (False, True):
+                for exact_cuts in (False, True):
+                    result_obj_lst, _ = wrapper.transcribe_audio(
+                        filename, response_format='verbose_json', timestamp_granularities=['segment'],
+                        max_workers=4, split_duration=split_duration, silence_aware=silence_aware,
+                        exact_cuts=exact_cuts)
+                    segments = [segment for result_obj in result_obj_lst for segment in result_obj['segments']]
+                    # Where the chunks were meant to be cut, planned the way transcribe_audio plans them
+                    _, planned_duration = choose_encoding(info, split_duration, exact_cuts=exact_cuts)
+                    chunk_index = plan_the_audio(filename, planned_duration, info, silence_aware)
+                    boundaries = [chunk['start'] / 1000 for chunk in chunk_index[1:]]
+                    errors = get_errors(reference, segments, boundaries)
+                    misplaced = get_misplaced(result_obj_lst, chunk_index)
+                    max_error = max(errors, default=0)
+                    failed = (failed or max_error > args.max_error or not errors or bool(misplaced)
+                              or len(result_obj_lst) != len(chunk_index))
+                    print(f'{os.path.basename(filename)} split={split_duration} silence_aware={silence_aware} '
+                          f'exact_cuts={exact_cuts}: {len(result_obj_lst)} chunks ({len(chunk_index)} planned), '
+                          f'{len(errors)} segments checked, max error {max_error * 1000:.0f} ms, '
+                          f'{len(misplaced)} segments starting outside their chunk')
+    server.shutdown()
+    tmp_dir.cleanup()
+    print('FAILED' if failed else 'OK')
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
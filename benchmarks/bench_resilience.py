@@ -0,0 +1,69 @@
+import argparse
+import threading
+import time
+
+from _common import example_files
+from mock_server import start_mock_server
+
+from resilience import ResiliencePolicy
+from script import GPTTranscribeWrapper, ChunkTranscriptionError
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Transcription against a fault-injecting mock server')
+    parser.add_argument('--latency', type=float, default=0.1, help='Mock API latency per request (seconds)')
+    parser.add_argument('--error-rate', type=float, default=0.3)
+    parser.add_argument('--error-status', type=int, default=429)
+    parser.add_argument('--hang-rate', type=float, default=0.05)
+    parser.add_argument('--timeout', type=float, default=2, help='Per-request timeout (seconds)')
+    parser.add_argument('--rpm', type=int, default=600, help='Requests per minute')
+    parser.add_argument('--split-duration', type=int, default=2000, help='Chunk length (ms)')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--outage', type=float, default=3, help='Seconds every request fails for, then it recovers')
+    args = parser.parse_args()
+
+    server, base_url = start_mock_server(latency=args.latency, error_rate=args.error_rate,
+                                         error_status=args.error_status, hang_rate=args.hang_rate)
+    policy = ResiliencePolicy(base_delay=0.1, max_delay=2, requests_per_minute=args.rpm, timeout=args.timeout,
+                              failure_threshold=20, reset_timeout=1)
+    wrapper = GPTTranscribeWrapper('sk-mock', db_url=None, base_url=base_url, resilience=policy)
+
+    for filename in example_files():
+        start = time.perf_counter()
+        try:
+            result_obj_lst, _ = wrapper.transcribe_audio(filename, response_format='verbose_json',
+                                                         timestamp_granularities=['segment'],
+                                                         max_workers=args.workers, split_duration=args.split_duration)
+            status = f'{len(result_obj_lst)} chunks ok'
+        except ChunkTranscriptionError as e:
+            status = str(e)
+        print(f'{filename}: {status} in {time.perf_counter() - start:.2f}s')
+    print(f'server: {server.request_count} requests, {server.error_count} injected errors')
+    print(f'client: {policy.stats}, breaker {policy.get_circuit_breaker().get_state()}')
+    server.shutdown()
+
+    # The API is down for a while: the breaker opens, the queued chunks wait for its trial and go on once it's back
+    server, base_url = start_mock_server(latency=args.latency, error_rate=1.0, error_status=503)
+    policy = ResiliencePolicy(base_delay=0.1, max_delay=0.5, requests_per_minute=None, timeout=args.timeout,
+                              failure_threshold=3, reset_timeout=1)
+    wrapper = GPTTranscribeWrapper('sk-mock', db_url=None, base_url=base_url, resilience=policy)
+    threading.Timer(args.outage, lambda: setattr(server, 'error_rate', 0.0)).start()
+    start = time.perf_counter()
+    try:
+        result_obj_lst, _ = wrapper.transcribe_audio(example_files()[0], response_format='verbose_json',
+                                                     timestamp_granularities=['segment'], max_workers=args.workers,
+                                                     split_duration=args.split_duration)
+        status = f'{len(result_obj_lst)} chunks ok'
+        failed = False
+    except ChunkTranscriptionError as e:
+        status = f'FAIL: {e}'
+        failed = True
+    print(f'outage of {args.outage}s: {status} in {time.perf_counter() - start:.2f}s, '
+          f'{server.request_count} requests ({server.error_count} failed), client {policy.stats}')
+    server.shutdown()
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
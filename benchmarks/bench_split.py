@@ -0,0 +1,59 @@
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+
+import psutil
+
+from _common import example_files
+
+from script import split_the_audio, plan_the_audio
+
+
+def make_long_audio(src, dst, loops):
+    # Repeat a sample to get an input as long as a real call recording
+    subprocess.run(['ffmpeg', '-y', '-v', 'error', '-stream_loop', str(loops), '-i', src, '-c:a', 'libmp3lame', dst],
+                   check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time and peak memory of split_the_audio on a long input')
+    parser.add_argument('--loops', type=int, default=400, help='How many times the sample is repeated')
+    parser.add_argument('--split-duration', type=int, default=600000, help='Chunk length (ms)')
+    parser.add_argument('--fixed', action='store_true', help='Cut exactly every split duration, ignoring pauses')
+    parser.add_argument('--drop-silence', type=int, default=None, help='Skip silences longer than this (ms)')
+    args = parser.parse_args()
+
+    process = psutil.Process()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = os.path.join(tmp_dir, 'long.mp3')
+        make_long_audio(example_files()[0], filename, args.loops)
+        size = os.path.getsize(filename)
+
+        peak_rss = process.memory_info().rss
+        start = time.perf_counter()
+        first_chunk = None
+        chunk_count = 0
+        for chunk in split_the_audio(filename, args.split_duration, silence_aware=not args.fixed,
+                                     drop_silence=args.drop_silence):
+            first_chunk = first_chunk or time.perf_counter() - start
+            chunk_count += 1
+            peak_rss = max(peak_rss, process.memory_info().rss)
+            os.remove(chunk)
+        elapsed = time.perf_counter() - start
+
+    print(f'input: {size / 1024 / 1024:.1f} MB, {chunk_count} chunks')
+    print(f'first chunk after {first_chunk:.2f}s, all chunks after {elapsed:.2f}s')
+    print(f'peak RSS: {peak_rss / 1024 / 1024:.1f} MB')
+
+    # How much audio each way of planning the chunks would upload, on the samples as they are
+    for filename in example_files():
+        for silence_aware, drop_silence in ((False, None), (True, None), (True, 1000)):
+            chunk_index = plan_the_audio(filename, 4000, silence_aware=silence_aware, drop_silence=drop_silence)
+            print(f'{os.path.basename(filename)} silence_aware={silence_aware} drop_silence={drop_silence}: '
+                  f'{len(chunk_index)} chunks, {sum(chunk["end"] - chunk["start"] for chunk in chunk_index):.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
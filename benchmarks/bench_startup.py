@@ -0,0 +1,108 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from _common import ROOT_DIR
+from mock_server import start_mock_server
+
+
+def run_child(ini_path, api_key, spawned_at, blocking):
+    """
+        Starts the GUI like main.py does, with its settings in ini_path. Prints the seconds from spawned_at
+        until the window is shown and until the key check is done, and the check's outcome.
+    """
+    # Runs without a display
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    sys.path.insert(0, ROOT_DIR)
+    from PyQt5.QtCore import QSettings
+    from PyQt5.QtWidgets import QApplication
+
+    import main
+
+    class Settings(QSettings):
+        # The user's settings.ini is left alone
+        def __init__(self, *args):
+            super().__init__(ini_path, QSettings.Format.IniFormat)
+
+    main.QSettings = Settings
+    main.app = app = QApplication([])
+    if blocking:
+        # What the window did before: the request on the GUI thread, without a timeout, before it's shown
+        from script import GPTTranscribeWrapper
+        GPTTranscribeWrapper(db_url=None).request_and_set_api(api_key, timeout=None)
+    window = main.MainWindow()
+    window.show()
+    app.processEvents()
+    shown = time.time() - spawned_at
+
+    outcome = {}
+    window._MainWindow__apiWidget.apiKeyAccepted.connect(
+        lambda key, f: outcome.update(checked=time.time() - spawned_at, accepted=f))
+    while not outcome and time.time() - spawned_at < 60:
+        app.processEvents()
+        time.sleep(0.005)
+    print(json.dumps(dict(outcome, shown=shown)))
+    sys.stdout.flush()
+    # A check which is still running would keep the process alive
+    os._exit(0)
+
+
+def measure(base_url, api_key, settings=None, blocking=False):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ini_path = os.path.join(tmp_dir, 'settings.ini')
+        with open(ini_path, 'w') as f:
+            f.write('[General]\n' + ''.join(f'{key}={value}\n' for key, value in
+                                            dict({'API_KEY': api_key}, **(settings or {})).items()))
+        spawned_at = time.time()
+        result = subprocess.run([sys.executable, __file__, '--child', ini_path, api_key, str(spawned_at)]
+                                + (['--blocking'] if blocking else []),
+                                env=dict(os.environ, OPENAI_BASE_URL=base_url), capture_output=True, text=True,
+                                check=True, cwd=tmp_dir)
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold start of the GUI: how long until the window is shown '
+                                                 'and until the API key is checked')
+    parser.add_argument('--latency', type=float, default=0.3, help='Latency of a reachable API (seconds)')
+    parser.add_argument('--hang', type=float, default=20, help='Latency of an API which is unreachable (seconds)')
+    parser.add_argument('--child', nargs=3, help=argparse.SUPPRESS)
+    parser.add_argument('--blocking', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        ini_path, api_key, spawned_at = args.child
+        run_child(ini_path, api_key, float(spawned_at), args.blocking)
+        return
+
+    from apiWidget import get_key_hash
+
+    fast_server, fast_url = start_mock_server(latency=args.latency)
+    hanging_server, hanging_url = start_mock_server(latency=args.hang)
+    key = 'sk-mock'
+    checked = {'API_KEY_CHECKED_HASH': get_key_hash(key), 'API_KEY_CHECKED_AT': time.time()}
+    expired = dict(checked, API_KEY_CHECKED_AT=time.time() - 7 * 24 * 60 * 60)
+
+    scenarios = [
+        ('blocking check (before), API hanging', hanging_url, key, None, True),
+        ('API reachable', fast_url, key, None, False),
+        ('API reachable, invalid key', fast_url, 'sk-invalid', None, False),
+        ('API hanging', hanging_url, key, None, False),
+        ('checked recently (cached)', hanging_url, key, checked, False),
+        ('checked a week ago, API hanging', hanging_url, key, expired, False),
+    ]
+    print(f'{"":<40} {"shown s":>8} {"checked s":>10}  key')
+    for name, base_url, api_key, settings, blocking in scenarios:
+        requests_before = fast_server.request_count + hanging_server.request_count
+        result = measure(base_url, api_key, settings, blocking)
+        requests = fast_server.request_count + hanging_server.request_count - requests_before
+        print(f'{name:<40} {result["shown"]:>8.2f} {result.get("checked", float("nan")):>10.2f}  '
+              f'{"accepted" if result.get("accepted") else "not accepted"}, {requests} request(s)')
+    fast_server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+
+from _common import example_files
+from mock_server import start_file_server, start_mock_server
+
+from download import RangedDownloader, StreamingDownload
+from resilience import ResiliencePolicy
+from script import GPTTranscribeWrapper, get_audio_duration
+
+
+def make_fixture(src, dst, loops):
+    # An AAC file like the audio stream of a long video, with its header at the beginning as YouTube sends it
+    subprocess.run(['ffmpeg', '-y', '-v', 'error', '-stream_loop', str(loops), '-i', src, '-c:a', 'aac', '-b:a', '128k',
+                    '-movflags', '+faststart', dst], check=True)
+    with open(dst, 'rb') as f:
+        return f.read()
+
+
+def run(chunks):
+    start = time.perf_counter()
+    first_chunk = None
+    starts = []
+    for i, total, result_obj in chunks:
+        first_chunk = first_chunk or time.perf_counter() - start
+        starts.append(result_obj['segments'][0]['start'] if result_obj['segments'] else None)
+    return first_chunk, time.perf_counter() - start, starts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Download then transcribe, against transcribing while downloading')
+    parser.add_argument('--loops', type=int, default=60, help='How many times the sample is repeated in the fixture')
+    parser.add_argument('--bandwidth', type=int, default=256 * 1024, help='Bytes/s per connection')
+    parser.add_argument('--latency', type=float, default=1.0, help='Seconds every transcription request takes')
+    parser.add_argument('--split-duration', type=int, default=60000, help='Chunk length (ms)')
+    parser.add_argument('--max-workers', type=int, default=4)
+    args = parser.parse_args()
+
+    _, base_url = start_mock_server(latency=args.latency)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fixture = os.path.join(tmp_dir, 'fixture.m4a')
+        data = make_fixture(example_files()[0], fixture, args.loops)
+        duration = get_audio_duration(fixture)
+        print(f'fixture: {len(data) / 1024 / 1024:.1f} MB, {duration / 60000:.1f} minutes, '
+              f'{args.bandwidth * args.max_workers / 1024:.0f} KB/s download')
+
+        def make_wrapper():
+            return GPTTranscribeWrapper('x', db_url=None, base_url=base_url,
+                                        resilience=ResiliencePolicy(requests_per_minute=None))
+
+        server, url = start_file_server(data, bandwidth=args.bandwidth)
+        dst_filename = os.path.join(tmp_dir, 'sequential.m4a')
+
+        def sequential():
+            RangedDownloader(args.max_workers).download(url, dst_filename, len(data))
+            yield from make_wrapper().iter_transcribe_audio(dst_filename, response_format='verbose_json',
+                                                            max_workers=args.max_workers,
+                                                            split_duration=args.split_duration)
+
+        first_chunk, elapsed, sequential_starts = run(sequential())
+        print(f'sequential: first chunk after {first_chunk:.2f}s, done after {elapsed:.2f}s')
+
+        download = StreamingDownload(url, os.path.join(tmp_dir, 'streaming.m4a'), len(data), duration,
+                                     args.max_workers)
+        first_chunk, elapsed, starts = run(make_wrapper().iter_transcribe_stream(
+            download, response_format='verbose_json', max_workers=args.max_workers,
+            split_duration=args.split_duration))
+        print(f'streaming: first chunk after {first_chunk:.2f}s, done after {elapsed:.2f}s, {len(starts)} chunks')
+        server.shutdown()
+
+        # Every chunk has to cover its part completely, even when it was cut before the bytes after it arrived
+        with open(download.get_filename(), 'rb') as f:
+            assert f.read() == data, 'the streamed download differs from the source'
+        # Both cut at the same pauses, one from the whole file and the other from what it had downloaded
+        if len(starts) != len(sequential_starts) or any(
+                abs(a - b) > 0.05 for a, b in zip(starts, sequential_starts) if a is not None and b is not None):
+            print(f'FAIL: the chunks differ, {sequential_starts} against {starts}')
+            raise SystemExit(1)
+        print('OK')
+
+
+if __name__ == '__main__':
+    main()
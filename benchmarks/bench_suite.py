@@ -0,0 +1,217 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from _common import ROOT_DIR, example_files
+from mock_server import start_mock_server
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# Compared with --compare, and whether a higher value is better
+COMPARED = {
+    'throughput': True,
+    'wall_seconds': False,
+    'peak_rss_mb': False,
+    'split_seconds': False,
+    'transcribe_seconds': False,
+    'srt_seconds': False,
+}
+
+
+def prepare_audio(src, dst, loops):
+    # Encoded for real (the samples are WAV inside), into the temp dir: the SRT is written next to it
+    subprocess.run(['ffmpeg', '-y', '-v', 'error', '-stream_loop', str(loops), '-i', src, dst], check=True)
+
+
+def run_case(filename, base_url, split_duration, workers):
+    """
+        split_the_audio -> transcribe_audio -> convert_to_srt of one file, in a process of its own
+        so that the peak RSS is the case's own. Returns its results.
+    """
+    from metrics import Metrics
+    from resilience import ResiliencePolicy
+    from script import ChunkTranscriptionError, GPTTranscribeWrapper, convert_to_srt, get_audio_info, \
+        split_the_audio
+
+    info = get_audio_info(filename)
+    stage_seconds = {}
+    began = time.perf_counter()
+
+    chunk_count = sum(1 for _ in split_the_audio(filename, split_duration, info))
+    stage_seconds['split'] = time.perf_counter() - began
+
+    # Retried quickly, the injected errors shouldn't turn into minutes of back-off
+    policy = ResiliencePolicy(base_delay=0.05, max_delay=0.5, requests_per_minute=None, failure_threshold=1000)
+    wrapper = GPTTranscribeWrapper('sk-mock', db_url=None, base_url=base_url, resilience=policy)
+    metrics = Metrics()
+    stage_began = time.perf_counter()
+    try:
+        result_obj_lst, _ = wrapper.transcribe_audio(filename, response_format='verbose_json',
+                                                     timestamp_granularities=['segment'], max_workers=workers,
+                                                     split_duration=split_duration, metrics=metrics)
+        failed_chunks = 0
+    except ChunkTranscriptionError as e:
+        result_obj_lst, failed_chunks = e.result_obj_lst, len(e.failures)
+    stage_seconds['transcribe'] = time.perf_counter() - stage_began
+
+    stage_began = time.perf_counter()
+    lines = [f'[{segment["start"]} --> {segment["end"]}] {segment["text"]}'
+             for result_obj in result_obj_lst if result_obj for segment in result_obj['segments']]
+    convert_to_srt(filename, lines)
+    stage_seconds['srt'] = time.perf_counter() - stage_began
+
+    wall_seconds = time.perf_counter() - began
+    result = metrics.get()
+    return {
+        'audio_seconds': info['duration'] / 1000,
+        'chunks': chunk_count,
+        'segments': len(lines),
+        'failed_chunks': failed_chunks,
+        'requests': result['counters'].get('requests', 0),
+        'retries': result['counters'].get('retries', 0),
+        'wall_seconds': wall_seconds,
+        'throughput': info['duration'] / 1000 / wall_seconds,
+        # ru_maxrss is in KB on Linux, ffmpeg's is the largest of the processes it ran
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'peak_ffmpeg_rss_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+        **{f'{stage}_seconds': seconds for stage, seconds in stage_seconds.items()},
+        # Where transcribe_audio's time went (metrics.Metrics), threads add up
+        'pipeline_seconds': {stage: totals['seconds'] for stage, totals in result['stages'].items()},
+    }
+
+
+def run_child(filename, base_url, split_duration, workers):
+    result = subprocess.run([sys.executable, __file__, '--child', filename, base_url, str(split_duration),
+                             str(workers)],
+                            # Nothing goes through a proxy, the mock server is all there is
+                            env=dict(os.environ, NO_PROXY='127.0.0.1', no_proxy='127.0.0.1'),
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def get_median(runs):
+    median = {}
+    for key, value in runs[0].items():
+        if isinstance(value, dict):
+            median[key] = get_median([run[key] for run in runs])
+        else:
+            median[key] = statistics.median(run.get(key, 0) for run in runs)
+    return median
+
+
+def get_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('-dirty' if dirty else '')
+
+
+def compare(results, baseline, tolerance):
+    """
+        Prints every COMPARED value of the cases both have, returns the ones which got worse than tolerance.
+    """
+    regressions = []
+    print(f'compared with {baseline.get("commit")} ({baseline.get("date")}):')
+    for name, case in results['cases'].items():
+        base_case = baseline['cases'].get(name)
+        if not base_case:
+            continue
+        for key, higher_is_better in COMPARED.items():
+            if not base_case.get(key):
+                continue
+            change = case[key] / base_case[key] - 1
+            worse = -change if higher_is_better else change
+            # A few milliseconds more of something that fast is noise
+            noise = key.endswith('_seconds') and max(case[key], base_case[key]) < 0.01
+            flag = ' REGRESSION' if worse > tolerance and not noise else ''
+            if flag:
+                regressions.append((name, key))
+            print(f'  {name:<10} {key:<20} {base_case[key]:>10.3f} -> {case[key]:>10.3f} {change:>+8.1%}{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='split -> transcribe -> SRT of local_examples against the mock API, '
+                                                 'offline. Writes the results as JSON to compare commits')
+    parser.add_argument('--latency', type=float, default=0.2, help='Mock API latency per request (seconds)')
+    parser.add_argument('--error-rate', type=float, default=0.05, help='Share of requests which fail (retried)')
+    parser.add_argument('--loops', type=int, default=10, help='How many more times each sample is repeated')
+    parser.add_argument('--split-duration', type=int, default=30000, help='Chunk length (ms)')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the injected errors')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs of each case, the median is kept')
+    parser.add_argument('-o', '--output', default=None, help='benchmarks/results/<commit>.json by default')
+    parser.add_argument('--compare', metavar='BASELINE', default=None, help='Results JSON of an earlier run')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='Change which counts as a regression')
+    parser.add_argument('--child', nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        filename, base_url, split_duration, workers = args.child
+        print(json.dumps(run_case(filename, base_url, int(split_duration), int(workers))))
+        return 0
+
+    # The mock server draws its errors in this process
+    random.seed(args.seed)
+    server, base_url = start_mock_server(latency=args.latency, error_rate=args.error_rate)
+    results = {
+        'commit': get_commit(),
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': {key: getattr(args, key) for key in ('latency', 'error_rate', 'loops', 'split_duration', 'workers',
+                                                       'seed', 'repeat')},
+        'cases': {},
+    }
+    print(f'{"":<10} {"audio s":>8} {"wall s":>7} {"x real":>7} {"RSS MB":>7} {"split s":>8} {"transcr s":>9} '
+          f'{"srt s":>6} {"retries":>7}')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for src in example_files():
+            name = os.path.basename(src)
+            filename = os.path.join(tmp_dir, name)
+            prepare_audio(src, filename, args.loops)
+            case = get_median([run_child(filename, base_url, args.split_duration, args.workers)
+                               for _ in range(args.repeat)])
+            results['cases'][name] = case
+            print(f'{name:<10} {case["audio_seconds"]:>8.1f} {case["wall_seconds"]:>7.2f} {case["throughput"]:>7.1f} '
+                  f'{case["peak_rss_mb"]:>7.1f} {case["split_seconds"]:>8.2f} {case["transcribe_seconds"]:>9.2f} '
+                  f'{case["srt_seconds"]:>6.3f} {case["retries"]:>7.0f}')
+    server.shutdown()
+
+    cases = results['cases'].values()
+    audio_seconds = sum(case['audio_seconds'] for case in cases)
+    wall_seconds = sum(case['wall_seconds'] for case in cases)
+    results['total'] = {'audio_seconds': audio_seconds, 'wall_seconds': wall_seconds,
+                        'throughput': audio_seconds / wall_seconds,
+                        'peak_rss_mb': max(case['peak_rss_mb'] for case in cases)}
+    print(f'total: {audio_seconds:.0f}s of audio in {wall_seconds:.2f}s, '
+          f'{results["total"]["throughput"]:.1f}x real time')
+
+    output = args.output or os.path.join(RESULTS_DIR, f'{results["commit"] or "results"}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f'results written to {output}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        print(f'{len(regressions)} regression(s)' if regressions else 'no regressions')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+import argparse
+import os
+import random
+import time
+
+# Runs without a display
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import _common  # noqa: F401
+
+from PyQt5.QtWidgets import QApplication, QTextBrowser
+
+from transcriptView import TranscriptView, format_segment
+
+WORDS = ('revenue', 'quarter', 'growth', 'margin', 'guidance', 'customers', 'the', 'and', 'we', 'expect', 'strong',
+         'year', 'operating', 'cash', 'flow', 'thank', 'you', 'question', 'next', 'analyst')
+
+
+def make_chunks(segment_count, segments_per_chunk):
+    # What the transcription thread hands over: a chunk of segments at a time
+    rng = random.Random(0)
+    segments = [{'start': i * 3.2, 'end': i * 3.2 + 3.0, 'text': ' ' + ' '.join(rng.choices(WORDS, k=12))}
+                for i in range(segment_count)]
+    return [segments[i:i + segments_per_chunk] for i in range(0, segment_count, segments_per_chunk)]
+
+
+def scroll_through(scrollBar, viewport, app, pages):
+    """
+        Jumps from the top to the bottom in pages steps, repainting every time. Returns ms per step.
+    """
+    began = time.perf_counter()
+    step = max(1, (scrollBar.maximum() - scrollBar.minimum()) // pages)
+    values = range(scrollBar.minimum(), scrollBar.maximum() + 1, step)
+    for value in values:
+        scrollBar.setValue(value)
+        viewport.repaint()
+        app.processEvents()
+    return (time.perf_counter() - began) / len(values) * 1000
+
+
+def insert(chunks, add, app):
+    """
+        Adds the chunks one by one like the GUI does. Returns the total seconds and the slowest chunk (ms),
+        the longest the GUI thread is blocked.
+    """
+    slowest = 0
+    began = time.perf_counter()
+    for chunk in chunks:
+        chunk_began = time.perf_counter()
+        add(chunk)
+        app.processEvents()
+        slowest = max(slowest, time.perf_counter() - chunk_began)
+    return time.perf_counter() - began, slowest * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Insert, scroll and search time of the transcript view')
+    parser.add_argument('--segments', type=int, default=10000)
+    parser.add_argument('--segments-per-chunk', type=int, default=150, help='About 10 minutes of speech')
+    parser.add_argument('--pages', type=int, default=200, help='Repaints while scrolling through')
+    parser.add_argument('--skip-browser', action='store_true', help="Don't time QTextBrowser.append (slow)")
+    args = parser.parse_args()
+
+    app = QApplication([])
+    chunks = make_chunks(args.segments, args.segments_per_chunk)
+    results = {}
+
+    view = TranscriptView()
+    view.resize(800, 600)
+    view.show()
+    results['TranscriptView'] = insert(chunks, view.addSegments, app) + (
+        scroll_through(view.getView().verticalScrollBar(), view.getView().viewport(), app, args.pages),)
+
+    store = view.getModel().getStore()
+    began = time.perf_counter()
+    searches = 0
+    row = store.find('analyst question', 0)
+    while row >= 0 and row + 1 < len(store):
+        searches += 1
+        row = store.find('analyst question', row + 1)
+    search_seconds = time.perf_counter() - began
+
+    if not args.skip_browser:
+        browser = QTextBrowser()
+        browser.resize(800, 600)
+        browser.show()
+
+        def append(chunk):
+            # What the GUI did before: one append per segment
+            for segment in chunk:
+                browser.append(format_segment(segment['start'], segment['end'], segment['text']))
+
+        results['QTextBrowser'] = insert(chunks, append, app) + (
+            scroll_through(browser.verticalScrollBar(), browser.viewport(), app, args.pages),)
+
+    print(f'{args.segments} segments in chunks of {args.segments_per_chunk}')
+    print(f'{"widget":<16} {"insert s":>9} {"slowest chunk ms":>17} {"ms per scroll":>14}')
+    for name, (insert_seconds, slowest_ms, scroll_ms) in results.items():
+        print(f'{name:<16} {insert_seconds:>9.2f} {slowest_ms:>17.1f} {scroll_ms:>14.1f}')
+    print(f'search: {searches} matches stepped through in {search_seconds * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
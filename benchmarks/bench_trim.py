@@ -0,0 +1,78 @@
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+
+from _common import example_files
+
+from script import get_audio_info, plan_the_audio, trim_the_audio
+
+
+def make_source(src, dst, loops):
+    # A downloaded video: a small picture and AAC audio, like the mp4s remove_trim used to get
+    subprocess.run(['ffmpeg', '-y', '-v', 'error', '-f', 'lavfi', '-i', 'color=c=gray:s=320x240:r=25',
+                    '-stream_loop', str(loops), '-i', src, '-map', '0:v', '-map', '1:a', '-shortest',
+                    '-c:v', 'libx264', '-preset', 'ultrafast', '-c:a', 'aac', '-b:a', '128k', dst], check=True)
+
+
+def trim_by_reencoding(filename, dst_filename, start, end):
+    # What remove_trim did before: decode and encode everything, output seeking
+    subprocess.run(['ffmpeg', '-y', '-v', 'error', '-i', filename, '-ss', f'{start / 1000}',
+                    '-t', f'{(end - start) / 1000}', dst_filename], check=True)
+    return dst_filename
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time and bytes written to trim a video before transcribing it')
+    parser.add_argument('--loops', type=int, default=10, help='How many more times every sample is repeated')
+    parser.add_argument('--intro', type=int, default=5000, help='Cut from the beginning (ms)')
+    parser.add_argument('--outro', type=int, default=5000, help='Cut from the end (ms)')
+    args = parser.parse_args()
+
+    totals = {}
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for i, src in enumerate(example_files()):
+            filename = os.path.join(tmp_dir, f'source_{i}.mp4')
+            make_source(src, filename, args.loops)
+            info = get_audio_info(filename)
+            start, end = args.intro, info['duration'] - args.outro
+
+            methods = {
+                're-encode': lambda: trim_by_reencoding(filename, os.path.join(tmp_dir, f'old_{i}.mp4'), start, end),
+                'copy (video)': lambda: trim_the_audio(filename, start, end, os.path.join(tmp_dir, f'video_{i}.mp4'),
+                                                       keep_video=True),
+                'copy (audio)': lambda: trim_the_audio(filename, start, end, os.path.join(tmp_dir, f'audio_{i}.mp4')),
+                # Nothing written, the chunks are planned (and later cut) straight from the source
+                'virtual (plan)': lambda: plan_the_audio(filename, 600000, info, start=start, end=end) and None,
+            }
+            for name, method in methods.items():
+                began = time.perf_counter()
+                dst_filename = method()
+                elapsed = time.perf_counter() - began
+                size = os.path.getsize(dst_filename) if dst_filename else 0
+                if dst_filename:
+                    trimmed = get_audio_info(dst_filename)['duration']
+                    # Stream copy starts on a packet, a frame (~23 ms for AAC) off at most
+                    if abs(trimmed - (end - start)) > 100:
+                        print(f'FAIL: {name} of {src} is {trimmed} ms long, expected {end - start} ms')
+                        failed = True
+                    os.remove(dst_filename)
+                total = totals.setdefault(name, {'bytes': 0, 'seconds': 0})
+                total['bytes'] += size
+                total['seconds'] += elapsed
+            os.remove(filename)
+
+    print(f'{"method":<14} {"bytes written":>14} {"seconds":>9}')
+    for name, total in totals.items():
+        print(f'{name:<14} {total["bytes"]:>14} {total["seconds"]:>9.2f}')
+    print(f'copy (audio) is {totals["re-encode"]["seconds"] / totals["copy (audio)"]["seconds"]:.1f}x faster '
+          f'than re-encoding')
+    if failed:
+        raise SystemExit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
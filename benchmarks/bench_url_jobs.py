@@ -0,0 +1,138 @@
+import os
+import tempfile
+import time
+
+# Runs without a display
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import _common  # noqa: F401
+
+from PyQt5.QtWidgets import QApplication
+
+import main as gui
+import scheduler
+from scheduler import JobScheduler
+
+URL = 'https://www.youtube.com/watch?v=mock'
+
+
+class Manifest:
+    def exists(self):
+        return False
+
+
+class Download:
+    def __init__(self, filename):
+        self.__filename = filename
+
+    def get_filename(self):
+        return self.__filename
+
+
+class RecordingWrapper:
+    """
+        Stands in for GPTTranscribeWrapper, keeps the arguments of every transcription call.
+    """
+    def __init__(self):
+        self.calls = []
+
+    def is_available(self):
+        return True
+
+    def get_job_manifest(self, filename, **kwargs):
+        return Manifest()
+
+    def iter_transcribe_audio(self, filename, **kwargs):
+        self.calls.append(('iter_transcribe_audio', filename, kwargs))
+        return iter(())
+
+    def iter_transcribe_stream(self, download, **kwargs):
+        self.calls.append(('iter_transcribe_stream', download.get_filename(), kwargs))
+        return iter(())
+
+
+def wait_for(f, app, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not f() and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+    return f()
+
+
+def run_window(app, filename, trim_intro_outro, stream_youtube=True):
+    """
+        Transcribes URL with the button of the main window, the download is filename.
+        Returns the transcription calls.
+    """
+    wrapper = RecordingWrapper()
+    window = gui.MainWindow()
+    # Not through the check boxes, they write to settings.ini
+    window._MainWindow__wrapper = wrapper
+    window._MainWindow__is_local = False
+    window._MainWindow__stream_youtube = stream_youtube
+    window._MainWindow__trim_intro_outro = trim_intro_outro
+    window._MainWindow__fromYoutubeWidget.setText(URL)
+    window._MainWindow__run()
+    # The download thread may hand over to the transcription thread
+    thread = None
+    while thread is not window._MainWindow__t:
+        thread = window._MainWindow__t
+        wait_for(thread.isFinished, app)
+        wait_for(lambda: False, app, timeout=0.1)
+    return wrapper.calls, window
+
+
+def main():
+    app = QApplication([])
+    gui.app = app
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = os.path.join(tmp_dir, 'audio.mp4')
+        open(filename, 'wb').close()
+        gui.install_audio = lambda url, **kwargs: filename
+        gui.stream_audio = lambda url, **kwargs: Download(filename)
+        gui.remove_trim = lambda filename, **kwargs: filename
+
+        # Skipping the intro and outro needs the whole audio, streaming mustn't drop it silently
+        for stream_youtube in (True, False):
+            for trim_intro_outro in (False, True):
+                calls, _ = run_window(app, filename, trim_intro_outro, stream_youtube)
+                names = [name for name, _, _ in calls]
+                trimmed = [kwargs.get('trim_intro_outro', False) for _, _, kwargs in calls]
+                ok = trimmed == [trim_intro_outro] and (
+                    names == ['iter_transcribe_stream'] if stream_youtube and not trim_intro_outro else
+                    names == ['iter_transcribe_audio'])
+                failed |= not ok
+                print(f'window stream_youtube={stream_youtube!s:<5} trim_intro_outro={trim_intro_outro!s:<5} '
+                      f'{names} trim_intro_outro={trimmed} {"ok" if ok else "FAIL"}')
+
+        # A failed download is reported, and nothing is transcribed
+        def fail(url, **kwargs):
+            raise OSError('network down')
+        errors = []
+        gui.install_audio = fail
+        gui.QMessageBox.critical = lambda parent, title, message: errors.append(message)
+        calls, window = run_window(app, filename, trim_intro_outro=False, stream_youtube=False)
+        ok = not calls and errors == ['network down'] and window._MainWindow__btn.isEnabled()
+        failed |= not ok
+        print(f'window failed download: errors={errors} calls={len(calls)} {"ok" if ok else "FAIL"}')
+
+        # Queued URL jobs
+        scheduler.install_audio = lambda url, **kwargs: filename
+        for trim_intro_outro in (False, True):
+            wrapper = RecordingWrapper()
+            jobs = JobScheduler(wrapper, trim=lambda filename, **kwargs: filename, response_format='verbose_json')
+            jobs.add(URL, trim_intro_outro=trim_intro_outro)
+            jobs.wait()
+            trimmed = [kwargs.get('trim_intro_outro', False) for _, _, kwargs in wrapper.calls]
+            ok = trimmed == [trim_intro_outro]
+            failed |= not ok
+            print(f'queue  trim_intro_outro={trim_intro_outro!s:<5} trim_intro_outro={trimmed} '
+                  f'{"ok" if ok else "FAIL"}')
+    if failed:
+        raise SystemExit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
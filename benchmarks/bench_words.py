@@ -0,0 +1,123 @@
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+from _common import example_files
+from mock_server import start_mock_server
+
+from exporters import write_json, write_vtt
+from resilience import ResiliencePolicy
+from script import GPTTranscribeWrapper
+from segments import SegmentStore, WordStore
+
+WORDS = ('revenue', 'quarter', 'growth', 'margin', 'guidance', 'customers', 'the', 'and', 'we', 'expect', 'strong',
+         'year', 'operating', 'cash', 'flow', 'thank', 'you', 'question', 'next', 'analyst', 'über', 'résumé')
+
+
+def make_response(word_count, words_per_segment=12, seconds_per_word=0.25):
+    # Decoded from JSON like a response or the cache, so every word is a str of its own
+    rng = random.Random(0)
+    segments, words = [], []
+    for i in range(0, word_count, words_per_segment):
+        texts = rng.choices(WORDS, k=min(words_per_segment, word_count - i))
+        start = round(i * seconds_per_word, 2)
+        segments.append({'start': start, 'end': round((i + len(texts)) * seconds_per_word, 2),
+                         'text': ' ' + ' '.join(texts)})
+        words += [{'start': round((i + k) * seconds_per_word, 2), 'end': round((i + k + 1) * seconds_per_word, 2),
+                   'word': text} for k, text in enumerate(texts)]
+    return json.dumps({'language': 'english', 'duration': word_count * seconds_per_word, 'segments': segments,
+                       'words': words})
+
+
+def get_allocated(fn):
+    """
+        Returns (what fn returns, MB it leaves allocated).
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    value = fn()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, (after - before) / 1024 / 1024
+
+
+def timed(fn):
+    began = time.perf_counter()
+    fn()
+    return time.perf_counter() - began
+
+
+def check_words(store, duration):
+    """
+        Returns what is wrong with the words of a transcription: out of order, outside the audio
+        or outside their segment.
+    """
+    problems = []
+    words = store.get_words()
+    if not words:
+        return ['no words']
+    previous_start = 0
+    for start, end, word in words:
+        if start < previous_start:
+            problems.append(f'{word!r} at {start}s comes before the word at {previous_start}s')
+        if not 0 <= start <= end <= duration + 0.01:
+            problems.append(f'{word!r} at {start}-{end}s is outside the audio (0-{duration}s)')
+        previous_start = start
+    for i, (start, end, _) in enumerate(store):
+        problems += [f'{word!r} at {word_start}-{word_end}s is outside its segment ({start}-{end}s)'
+                     for word_start, word_end, word in store.get_segment_words(i)
+                     if word_start < start or word_end > end + 0.01]
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory and speed of word-level timestamps')
+    parser.add_argument('--words', type=int, default=100000)
+    args = parser.parse_args()
+
+    content = make_response(args.words)
+    result_obj = json.loads(content)
+    words_mb = get_allocated(lambda: json.loads(json.dumps(result_obj['words'])))[1]
+    word_store, word_store_mb = get_allocated(lambda: WordStore(result_obj['words']))
+    print(f'{args.words} words:')
+    print(f'  dicts       {words_mb:>7.2f} MB ({words_mb * 1024 * 1024 / args.words:>5.0f} bytes per word)')
+    print(f'  WordStore   {word_store_mb:>7.2f} MB ({word_store_mb * 1024 * 1024 / args.words:>5.0f} bytes per word), '
+          f'sys.getsizeof {sys.getsizeof(word_store) / 1024 / 1024:.2f} MB')
+
+    store = SegmentStore(result_obj['segments'], result_obj['words'])
+    del result_obj
+    print(f'  {len(store)} segments')
+    seconds = timed(lambda: [store.get_segment_words(i) for i in range(len(store))])
+    print(f'  words of every segment: {seconds * 1000:.0f} ms')
+    for name, writer in (('json', write_json), ('vtt', write_vtt)):
+        seconds = timed(lambda: writer(io.StringIO(), store))
+        print(f'  {name} export: {seconds * 1000:.0f} ms')
+    ok = word_store_mb < words_mb / 4 and len(store.get_words()) == args.words
+
+    # The words of a real transcription (mock API) end up where they are said
+    server, base_url = start_mock_server(segments_from_audio=True)
+    wrapper = GPTTranscribeWrapper('sk-mock', db_url=None, base_url=base_url,
+                                   resilience=ResiliencePolicy(requests_per_minute=None))
+    for filename in example_files():
+        result_obj_lst, _ = wrapper.transcribe_audio(filename, response_format='verbose_json',
+                                                     timestamp_granularities=['segment', 'word'], max_workers=4,
+                                                     split_duration=5000)
+        store = SegmentStore.from_results(result_obj_lst)
+        duration = sum(result_obj['duration'] for result_obj in result_obj_lst)
+        problems = check_words(store, duration)
+        ok &= not problems
+        print(f'{os.path.basename(filename)}: {len(store)} segments, {len(store.get_words())} words, '
+              f'{len(problems)} problems')
+        for problem in problems[:5]:
+            print(f'    {problem}')
+    server.shutdown()
+    print('OK' if ok else 'FAILED')
+
+
+if __name__ == '__main__':
+    main()
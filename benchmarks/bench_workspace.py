@@ -0,0 +1,115 @@
+import argparse
+import os
+import subprocess
+import tempfile
+import threading
+import time
+
+from _common import example_files
+from mock_server import start_mock_server
+
+from resilience import ResiliencePolicy
+from script import GPTTranscribeWrapper, cut_the_audio, get_audio_info, get_chunk_filename, plan_the_audio
+from workspace import ChunkBuffer, JobWorkspace, get_temp_root
+
+
+def make_long_audio(src, dst, loops, codec):
+    subprocess.run(['ffmpeg', '-y', '-v', 'error', '-stream_loop', str(loops), '-i', src, '-c:a', codec, dst],
+                   check=True)
+
+
+def time_cuts(filename, chunk_index, info, encoding, dst_dir=None, in_memory=False):
+    # Cuts every chunk and reads it back like the upload does
+    began = time.perf_counter()
+    for chunk in chunk_index:
+        chunk_file = cut_the_audio(filename, get_chunk_filename(filename, chunk['index'], info, encoding, dst_dir),
+                                   chunk['start'], chunk['end'] - chunk['start'], encoding, in_memory=in_memory)
+        if isinstance(chunk_file, ChunkBuffer):
+            chunk_file.open().read()
+        else:
+            with open(chunk_file, 'rb') as f:
+                f.read()
+            os.remove(chunk_file)
+    return time.perf_counter() - began
+
+
+def transcribe(wrapper, filename, split_duration, in_memory, encoding):
+    """
+        Returns the segments and the bytes of the chunks which went through files.
+    """
+    file_bytes = []
+
+    def on_chunk_cut(i, path):
+        # Chunks kept in memory have no file
+        if os.path.exists(path):
+            file_bytes.append(os.path.getsize(path))
+
+    segments = [segment for _, _, result_obj in wrapper.iter_transcribe_audio(
+        filename, response_format='verbose_json', timestamp_granularities=['segment'], max_workers=4,
+        split_duration=split_duration, on_chunk_cut=on_chunk_cut, in_memory=in_memory, encoding=encoding)
+        for segment in result_obj['segments']]
+    return segments, sum(file_bytes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Chunks through disk, tmpfs and memory, and jobs side by side')
+    parser.add_argument('--loops', type=int, default=40, help='How many times the sample is repeated')
+    parser.add_argument('--split-duration', type=int, default=60000, help='Chunk length (ms)')
+    args = parser.parse_args()
+
+    server, base_url = start_mock_server(segments_from_audio=True)
+    wrapper = GPTTranscribeWrapper('sk-mock', db_url=None, base_url=base_url,
+                                   resilience=ResiliencePolicy(requests_per_minute=None))
+    ok = True
+    # Outside the repo, a run which is killed can't leave its audio among the samples
+    with tempfile.TemporaryDirectory() as src_dir:
+        # Formats which can be kept in memory (see encoding.PIPE_FORMATS)
+        for codec, ext, encoding in (('libmp3lame', '.mp3', 'opus_32k'), ('aac', '.m4a', 'copy')):
+            filename = os.path.join(src_dir, 'long' + ext)
+            make_long_audio(example_files()[0], filename, args.loops, codec)
+            info = get_audio_info(filename)
+            chunk_index = plan_the_audio(filename, args.split_duration, info, silence_aware=False)
+            print(f'{ext}: {info["duration"] / 60000:.1f} minutes, {len(chunk_index)} chunks ({encoding})')
+
+            with JobWorkspace(root=src_dir) as disk, JobWorkspace() as tmpfs:
+                for name, kwargs in (('disk', {'dst_dir': disk.get_path()}),
+                                     (f'tmpfs ({get_temp_root()})', {'dst_dir': tmpfs.get_path()}),
+                                     ('memory', {'in_memory': True})):
+                    seconds = time_cuts(filename, chunk_index, info, encoding, **kwargs)
+                    print(f'  cut + read back, {name:<20} {seconds:.2f}s')
+
+            results = {}
+            for in_memory in (False, True):
+                began = time.perf_counter()
+                segments, file_bytes = transcribe(wrapper, filename, args.split_duration, in_memory, encoding)
+                results[in_memory] = segments
+                print(f'  transcribe in_memory={in_memory!s:<5} {time.perf_counter() - began:.2f}s, '
+                      f'{len(segments)} segments, {file_bytes / 1024 / 1024:.1f} MB of chunk files written')
+            ok &= results[False] == results[True]
+
+            # Two jobs of the same file at once used to write the same chunk files
+            concurrent = {}
+
+            def run_job(split_duration, encoding=encoding):
+                concurrent[split_duration] = transcribe(wrapper, filename, split_duration, False, encoding)[0]
+
+            threads = [threading.Thread(target=run_job, args=(split_duration,))
+                       for split_duration in (args.split_duration, args.split_duration // 2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            alone = transcribe(wrapper, filename, args.split_duration // 2, False, encoding)[0]
+            same = concurrent[args.split_duration] == results[False] and concurrent[args.split_duration // 2] == alone
+            ok &= same
+            print(f'  two jobs of the same file at once: {"same results as alone" if same else "RESULTS DIFFER"}')
+
+        leftovers = [filename for filename in os.listdir(src_dir) if filename.startswith('split_audio_')]
+        ok &= not leftovers
+        print(f'chunks written next to the sources: {len(leftovers)}')
+    server.shutdown()
+    print('OK' if ok else 'FAILED')
+
+
+if __name__ == '__main__':
+    main()
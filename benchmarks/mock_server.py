@@ -0,0 +1,254 @@
+import json
+import os
+import random
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def get_uploaded_file(content_type, body):
+    # Returns (filename, bytes) of the "file" field of a multipart/form-data body
+    message = BytesParser().parsebytes(f'Content-Type: {content_type}\r\n\r\n'.encode('utf-8') + body)
+    for part in message.get_payload():
+        if part.get_param('name', header='content-disposition') == 'file':
+            return part.get_filename(), part.get_payload(decode=True)
+    return None, b''
+
+
+def get_form_values(content_type, body, name):
+    # Every value of a text field of a multipart/form-data body, e.g. timestamp_granularities[]
+    message = BytesParser().parsebytes(f'Content-Type: {content_type}\r\n\r\n'.encode('utf-8') + body)
+    return [part.get_payload(decode=True).decode('utf-8') for part in message.get_payload()
+            if part.get_param('name', header='content-disposition') == name]
+
+
+def get_words(segments):
+    # The words of each segment spread evenly over its time
+    words = []
+    for segment in segments:
+        texts = segment['text'].split()
+        step = (segment['end'] - segment['start']) / max(len(texts), 1)
+        words += [{'word': text, 'start': round(segment['start'] + i * step, 3),
+                   'end': round(segment['start'] + (i + 1) * step, 3)} for i, text in enumerate(texts)]
+    return words
+
+
+def get_sound_segments(filename, data, silence_threshold=-40, min_silence=200):
+    """
+        Fake "transcription" of the uploaded audio: one segment per run of sound between pauses,
+        with times relative to the start of the upload, like the real API.
+    """
+    from analysis import FRAME_MS, find_silences, get_frame_energy
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, os.path.basename(filename or 'chunk.mp3'))
+        with open(path, 'wb') as f:
+            f.write(data)
+        energy_db = get_frame_energy(path)
+    segments = []
+    cur = 0
+    for start, end in find_silences(energy_db, silence_threshold, min_silence // FRAME_MS) + [(len(energy_db), len(energy_db))]:
+        if start > cur:
+            segments.append({'id': len(segments), 'start': cur * FRAME_MS / 1000, 'end': start * FRAME_MS / 1000,
+                             'text': f' sound {len(segments)}'})
+        cur = end
+    return segments, len(energy_db) * FRAME_MS / 1000
+
+
+class MockTranscriptionHandler(BaseHTTPRequestHandler):
+    """
+        Mimics POST /v1/audio/transcriptions with a verbose_json response.
+
+        The server attributes latency (seconds) and error_rate (0 ~ 1) control how slow and how flaky it is,
+        failing requests get error_status (500, 429, ...). hang_rate of the requests take hang seconds
+        instead of latency, to trigger client timeouts. upload_bandwidth (bytes/s) limits how fast every upload is read.
+        With segments_from_audio, the segments are the runs of sound in the uploaded audio instead of fixed ones,
+        so the timestamps of a whole transcription can be checked against the source.
+        Words are added when timestamp_granularities[] has 'word', spread evenly over their segments.
+        GET /v1/models (the key check) takes latency too and rejects the key sk-invalid.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        # Once per connection, the requests over a kept alive one aren't counted here
+        super().setup()
+        with self.server.lock:
+            self.server.connection_count += 1
+        if self.server.upload_bandwidth:
+            # Like a slow link, which holds little of the upload on its way: the client waits to send the rest
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 64 * 1024)
+
+    def __send_json(self, status, obj):
+        body = json.dumps(obj).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except OSError:
+            # The client gave up waiting
+            pass
+
+    def do_GET(self):
+        if self.path.endswith('/models'):
+            with self.server.lock:
+                self.server.request_count += 1
+            time.sleep(self.server.latency)
+            if self.headers.get('Authorization') == 'Bearer sk-invalid':
+                self.__send_json(401, {'error': {'message': 'Incorrect API key provided', 'type': 'invalid_request_error'}})
+                return
+            self.__send_json(200, {'object': 'list', 'data': [{'id': 'whisper-1', 'object': 'model'}]})
+        else:
+            self.__send_json(404, {'error': {'message': 'Not found'}})
+
+    def do_POST(self):
+        size = int(self.headers.get('Content-Length', 0))
+        if self.server.upload_bandwidth:
+            blocks = []
+            while size > 0:
+                blocks.append(self.rfile.read(min(size, 64 * 1024)))
+                size -= len(blocks[-1])
+                time.sleep(len(blocks[-1]) / self.server.upload_bandwidth)
+            body = b''.join(blocks)
+        else:
+            body = self.rfile.read(size)
+        with self.server.lock:
+            self.server.request_count += 1
+        time.sleep(self.server.hang if random.random() < self.server.hang_rate else self.server.latency)
+        if random.random() < self.server.error_rate:
+            with self.server.lock:
+                self.server.error_count += 1
+            self.__send_json(self.server.error_status, {'error': {'message': 'Injected failure', 'type': 'server_error'}})
+            return
+        content_type = self.headers.get('Content-Type')
+        if self.server.segments_from_audio:
+            segments, duration = get_sound_segments(*get_uploaded_file(content_type, body))
+            result_obj = {'task': 'transcribe', 'language': 'english', 'duration': duration,
+                          'text': ''.join(segment['text'] for segment in segments), 'segments': segments}
+        else:
+            result_obj = self.__get_fixed_result()
+        if 'word' in get_form_values(content_type, body, 'timestamp_granularities[]'):
+            result_obj['words'] = get_words(result_obj['segments'])
+        self.__send_json(200, result_obj)
+
+    def __get_fixed_result(self):
+        return {
+            'task': 'transcribe',
+            'language': 'english',
+            'duration': 4.0,
+            'text': 'Hello there. General Kenobi.',
+            'segments': [
+                {'id': 0, 'seek': 0, 'start': 0.0, 'end': 2.0, 'text': ' Hello there.', 'tokens': [],
+                 'temperature': 0.0, 'avg_logprob': -0.2, 'compression_ratio': 1.0, 'no_speech_prob': 0.0},
+                {'id': 1, 'seek': 0, 'start': 2.0, 'end': 4.0, 'text': ' General Kenobi.', 'tokens': [],
+                 'temperature': 0.0, 'avg_logprob': -0.2, 'compression_ratio': 1.0, 'no_speech_prob': 0.0},
+            ],
+        }
+
+
+def make_certificate(directory):
+    """
+        Writes a self-signed certificate for 127.0.0.1, returns (certfile, keyfile).
+    """
+    certfile, keyfile = os.path.join(directory, 'cert.pem'), os.path.join(directory, 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-keyout', keyfile, '-out', certfile,
+                    '-days', '1', '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1'],
+                   check=True, capture_output=True)
+    return certfile, keyfile
+
+
+def start_mock_server(latency=0.0, error_rate=0.0, error_status=500, hang_rate=0.0, hang=30.0,
+                      segments_from_audio=False, certificate=None, upload_bandwidth=None):
+    """
+        With certificate ((certfile, keyfile), see make_certificate) it's served over TLS like the real API.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockTranscriptionHandler)
+    if certificate:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(*certificate)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    server.daemon_threads = True
+    server.latency = latency
+    server.error_rate = error_rate
+    server.error_status = error_status
+    server.hang_rate = hang_rate
+    server.hang = hang
+    server.segments_from_audio = segments_from_audio
+    server.upload_bandwidth = upload_bandwidth
+    server.request_count = 0
+    server.error_count = 0
+    server.connection_count = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'{"https" if certificate else "http"}://127.0.0.1:{server.server_address[1]}/v1'
+
+
+class MockFileHandler(BaseHTTPRequestHandler):
+    """
+        Serves the server's file (GET /file) with Range support, like a video CDN.
+
+        bandwidth (bytes/s) limits every connection on its own, the way YouTube throttles them.
+        drop_rate of the responses are cut in the middle, to check that a download continues where it stopped.
+        With ranges=False the Range header is ignored and the whole file is sent.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        data = self.server.data
+        start, end = 0, len(data)
+        range_header = self.headers.get('Range')
+        with self.server.lock:
+            self.server.request_count += 1
+        if range_header and self.server.ranges:
+            first, _, last = range_header.replace('bytes=', '').partition('-')
+            start, end = int(first), min(int(last) + 1 if last else len(data), len(data))
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end - 1}/{len(data)}')
+        else:
+            self.send_response(200)
+        self.send_header('Accept-Ranges', 'bytes' if self.server.ranges else 'none')
+        self.send_header('Content-Length', str(end - start))
+        self.end_headers()
+
+        drop_at = end
+        if random.random() < self.server.drop_rate:
+            drop_at = random.randint(start, end)
+        block_size = 64 * 1024
+        for offset in range(start, drop_at, block_size):
+            block = data[offset:min(offset + block_size, drop_at)]
+            try:
+                self.wfile.write(block)
+            except OSError:
+                return
+            with self.server.lock:
+                self.server.bytes_sent += len(block)
+            if self.server.bandwidth:
+                time.sleep(len(block) / self.server.bandwidth)
+        if drop_at < end:
+            self.close_connection = True
+
+
+def start_file_server(data, bandwidth=None, drop_rate=0.0, ranges=True):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockFileHandler)
+    server.daemon_threads = True
+    server.data = data
+    server.bandwidth = bandwidth
+    server.drop_rate = drop_rate
+    server.ranges = ranges
+    server.request_count = 0
+    server.bytes_sent = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/file'
@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from workspace import open_chunk
+
+# Next to the app like settings.ini and the jobs, whatever the working directory is
+DB_URL = f'sqlite:///{os.path.join(os.path.abspath(os.path.dirname(__file__)), "conv.db")}'
+
+
+class TranscriptionCache:
+    """
+        Persistent cache of chunk transcriptions, stored in sqlite.
+
+        Entries are keyed by the hash of the chunk's audio bytes and the request parameters,
+        and evicted in least recently used order when they get older than max_age seconds
+        or the stored results get bigger than max_size bytes.
+    """
+    def __init__(self, db_url=DB_URL, max_size=256 * 1024 * 1024, max_age=30 * 24 * 60 * 60):
+        self.__db_path = db_url.removeprefix('sqlite:///')
+        self.__max_size = max_size
+        self.__max_age = max_age
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self.__conn = sqlite3.connect(self.__db_path, check_same_thread=False)
+        self.__conn.execute('''CREATE TABLE IF NOT EXISTS transcription_cache (
+            key TEXT PRIMARY KEY,
+            result TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        )''')
+        self.__conn.execute('CREATE INDEX IF NOT EXISTS idx_accessed_at ON transcription_cache (accessed_at)')
+        self.__conn.commit()
+
+    @staticmethod
+    def make_key(chunk_file, args):
+        """
+            Hash of the audio bytes (of a file or a workspace.ChunkBuffer) and every request parameter
+            which changes the result.
+        """
+        h = hashlib.sha256()
+        with open_chunk(chunk_file) as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(block)
+        params = {k: v for k, v in args.items() if k != 'file'}
+        h.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+        return h.hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self.__lock:
+            row = self.__conn.execute('SELECT result, created_at FROM transcription_cache WHERE key = ?',
+                                      (key,)).fetchone()
+            if row is None or now - row[1] > self.__max_age:
+                self.misses += 1
+                return None
+            self.__conn.execute('UPDATE transcription_cache SET accessed_at = ? WHERE key = ?', (now, key))
+            self.__conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, result_obj):
+        now = time.time()
+        result = json.dumps(result_obj, ensure_ascii=False)
+        with self.__lock:
+            self.__conn.execute('INSERT OR REPLACE INTO transcription_cache VALUES (?, ?, ?, ?, ?)',
+                                (key, result, len(result), now, now))
+            self.__evict(now)
+            self.__conn.commit()
+
+    def __evict(self, now):
+        self.__conn.execute('DELETE FROM transcription_cache WHERE created_at < ?', (now - self.__max_age,))
+        total_size = self.__conn.execute('SELECT COALESCE(SUM(size), 0) FROM transcription_cache').fetchone()[0]
+        if total_size <= self.__max_size:
+            return
+        for key, size in self.__conn.execute(
+                'SELECT key, size FROM transcription_cache ORDER BY accessed_at').fetchall():
+            self.__conn.execute('DELETE FROM transcription_cache WHERE key = ?', (key,))
+            total_size -= size
+            if total_size <= self.__max_size:
+                break
+
+    def clear(self):
+        with self.__lock:
+            self.__conn.execute('DELETE FROM transcription_cache')
+            self.__conn.commit()
+
+    def stats(self):
+        with self.__lock:
+            count, size = self.__conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM transcription_cache').fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': count, 'size': size}
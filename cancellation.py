@@ -0,0 +1,180 @@
+import io
+import subprocess
+import threading
+
+
+class CancelledError(Exception):
+    """
+        Raised by whatever was running when its CancellationToken was cancelled.
+    """
+    def __init__(self, message='Cancelled'):
+        super(CancelledError, self).__init__(message)
+
+
+class CancellationToken:
+    """
+        Asks a job to stop: it is passed down to everything the job runs (downloads, ffmpeg, requests)
+        which checks it between steps and registers a callback (on_cancel) to abort what it is blocked on.
+        Once cancelled it stays cancelled.
+    """
+    def __init__(self):
+        self.__event = threading.Event()
+        self.__lock = threading.Lock()
+        self.__callbacks = {}
+        self.__next_handle = 0
+
+    def cancel(self):
+        with self.__lock:
+            if self.__event.is_set():
+                return
+            self.__event.set()
+            callbacks = list(self.__callbacks.values())
+            self.__callbacks.clear()
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                # Aborting is best effort, the thread still stops at its next check
+                pass
+
+    def is_cancelled(self):
+        return self.__event.is_set()
+
+    def raise_if_cancelled(self):
+        if self.__event.is_set():
+            raise CancelledError()
+
+    def wait(self, timeout=None):
+        """
+            Sleeps for timeout seconds or until cancelled, returns whether it was cancelled.
+        """
+        return self.__event.wait(timeout)
+
+    def on_cancel(self, callback):
+        """
+            Calls callback() when the token is cancelled (right away if it already is),
+            returns a handle for remove_callback.
+        """
+        with self.__lock:
+            if not self.__event.is_set():
+                self.__next_handle += 1
+                self.__callbacks[self.__next_handle] = callback
+                return self.__next_handle
+        callback()
+        return None
+
+    def remove_callback(self, handle):
+        with self.__lock:
+            self.__callbacks.pop(handle, None)
+
+
+def check(cancel_token):
+    # For functions whose token is optional
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+
+
+def sleep(seconds, cancel_token=None):
+    if cancel_token is None:
+        threading.Event().wait(seconds)
+    elif cancel_token.wait(seconds):
+        raise CancelledError()
+
+
+def acquire(lock, cancel_token=None, poll_interval=0.1):
+    """
+        lock.acquire() which gives up with CancelledError when cancel_token is cancelled,
+        for semaphores shared by several jobs.
+    """
+    if cancel_token is None:
+        lock.acquire()
+        return
+    while not lock.acquire(timeout=poll_interval):
+        cancel_token.raise_if_cancelled()
+
+
+def run_process(command, cancel_token=None):
+    """
+        subprocess.run(command, check=True, capture_output=True), the process is killed when cancel_token is
+        cancelled and CancelledError is raised instead.
+    """
+    if cancel_token is None:
+        return subprocess.run(command, check=True, capture_output=True)
+    cancel_token.raise_if_cancelled()
+    with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as process:
+        handle = cancel_token.on_cancel(process.kill)
+        try:
+            stdout, stderr = process.communicate()
+        finally:
+            cancel_token.remove_callback(handle)
+    cancel_token.raise_if_cancelled()
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command, stdout, stderr)
+    return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+
+
+class CancellableReader(io.RawIOBase):
+    """
+        Reads file (a binary file object, left open) until cancel_token is cancelled, then raises CancelledError.
+        A request uploads its file as it reads it, so the upload is aborted part way.
+    """
+    def __init__(self, file, cancel_token):
+        super(CancellableReader, self).__init__()
+        self.__file = file
+        self.__cancel_token = cancel_token
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        self.__cancel_token.raise_if_cancelled()
+        return self.__file.read(size)
+
+    def seekable(self):
+        return self.__file.seekable()
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self.__file.seek(offset, whence)
+
+    def tell(self):
+        return self.__file.tell()
+
+    def fileno(self):
+        return self.__file.fileno()
+
+
+# Name of the threads call runs fn in, they may outlive the caller which gave up on them
+CALL_THREAD_NAME = 'cancellable call'
+
+
+def call(fn, *args, cancel_token=None):
+    """
+        Returns fn(*args), but returns control with CancelledError as soon as cancel_token is cancelled.
+        fn runs in a thread of its own and whatever it returns after that is dropped: for blocking calls
+        which can't be interrupted, like a request waiting for the API to answer. Pass cancel_token to fn too
+        (in args) to stop it early (see CancellableReader), and keep what it returns late (e.g. cache it) in fn.
+    """
+    if cancel_token is None:
+        return fn(*args)
+    cancel_token.raise_if_cancelled()
+    done = threading.Event()
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = fn(*args)
+        except BaseException as e:
+            outcome['error'] = e
+        done.set()
+
+    threading.Thread(target=run, name=CALL_THREAD_NAME, daemon=True).start()
+    handle = cancel_token.on_cancel(done.set)
+    try:
+        done.wait()
+    finally:
+        cancel_token.remove_callback(handle)
+    if 'error' in outcome:
+        raise outcome['error']
+    if 'result' not in outcome:
+        raise CancelledError()
+    return outcome['result']
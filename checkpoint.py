@@ -0,0 +1,83 @@
+import hashlib
+import json
+import os
+
+JOBS_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'jobs')
+
+
+class JobManifest:
+    """
+        Checkpoint of a transcription job on disk.
+
+        Every finished chunk's segments and offset are written as soon as the chunk is done,
+        so a job which died halfway can continue from the chunks it hasn't finished yet.
+        A manifest only matches the same input file (path, size and modification time)
+        transcribed with the same parameters.
+    """
+    def __init__(self, audio_file_path, params, jobs_dir=JOBS_DIR):
+        stat = os.stat(audio_file_path)
+        self.__source = {
+            'path': os.path.abspath(audio_file_path),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+        }
+        self.__params = params
+        job_id = hashlib.sha1(json.dumps([self.__source, params], sort_keys=True).encode('utf-8')).hexdigest()
+        self.__path = os.path.join(jobs_dir, f'{job_id}.json')
+        self.__total = 0
+        self.__chunks = {}
+
+    def get_path(self):
+        return self.__path
+
+    def exists(self):
+        return os.path.exists(self.__path)
+
+    def load(self):
+        """
+            Reads the finished chunks back, returns a dict of chunk index to result object.
+        """
+        try:
+            with open(self.__path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        self.__total = manifest['total']
+        self.__chunks = {int(i): chunk for i, chunk in manifest['chunks'].items()}
+        return {i: chunk['result'] for i, chunk in self.__chunks.items()}
+
+    def get_progress(self):
+        """
+            Returns (finished chunk count, total chunk count) of the manifest on disk.
+        """
+        self.load()
+        return len(self.__chunks), self.__total
+
+    def start(self, total, resume=True):
+        if not resume:
+            self.__chunks = {}
+        self.__total = total
+        self.__save()
+
+    def save_chunk(self, i, offset, result_obj):
+        self.__chunks[i] = {'offset': offset, 'result': result_obj}
+        self.__save()
+
+    def remove(self):
+        try:
+            os.remove(self.__path)
+        except FileNotFoundError:
+            pass
+
+    def __save(self):
+        os.makedirs(os.path.dirname(self.__path), exist_ok=True)
+        # Write to a temporary file and swap it in, so a job killed in the middle of a write keeps the old manifest
+        tmp_path = self.__path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'source': self.__source,
+                'params': self.__params,
+                'total': self.__total,
+                'chunks': self.__chunks,
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, self.__path)
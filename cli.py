@@ -0,0 +1,133 @@
+import argparse
+import json
+import os
+import sys
+
+from exporters import EXPORTERS, export
+from metrics import to_prometheus
+from resilience import REQUESTS_PER_MINUTE, ResiliencePolicy
+from scheduler import DONE, JobScheduler
+from script import GPTTranscribeWrapper
+from transport import POOL_SIZE, configure, get_stats
+
+
+def get_output_filename(job, output_dir):
+    # Without the extension, every format adds its own
+    base_filename = os.path.splitext(os.path.basename(job.filename))[0]
+    return os.path.join(output_dir or os.path.dirname(os.path.abspath(job.filename)), base_filename)
+
+
+def print_update(job):
+    progress = f' ({job.done}/{job.total} chunks)' if job.total else ''
+    error = f': {job.error}' if job.error else ''
+    bound = job.metrics.get_bound() if job.status == DONE else None
+    bound = f' [{bound}-bound]' if bound else ''
+    print(f'#{job.id} {job.status}{progress} {job.source}{error}{bound}', file=sys.stderr, flush=True)
+
+
+def print_http_stats():
+    stats = get_stats()
+    if stats['requests']:
+        print(f'HTTP: {stats["requests"]} requests over {stats["connections"]} connections '
+              f'({stats["reused"]} reused, {stats["tls_handshakes"]} TLS handshakes, '
+              f'{stats["http2_requests"]} over HTTP/2)', file=sys.stderr)
+
+
+def write_metrics(jobs, filename, format_name='json'):
+    """
+        Writes where the time of every job went (metrics.Metrics) and the HTTP stats, as JSON or
+        in the Prometheus text format, to filename ('-' for stdout).
+    """
+    if format_name == 'prometheus':
+        content = to_prometheus([({'job': job.id, 'source': job.source}, job.metrics) for job in jobs], get_stats())
+    else:
+        content = json.dumps({
+            'jobs': [dict(job.metrics.get(), id=job.id, source=job.source, status=job.status) for job in jobs],
+            'http': get_stats(),
+        }, indent=2) + '\n'
+    if filename == '-':
+        sys.stdout.write(content)
+    else:
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Transcribe files, folders and Youtube URLs without the GUI')
+    parser.add_argument('inputs', nargs='+', help='Audio/video files, folders of them or Youtube URLs')
+    parser.add_argument('-o', '--output-dir', default=None, help='Where the results go (next to the input by default)')
+    parser.add_argument('-c', '--concurrency', type=int, default=4,
+                        help='Downloads, trims and chunk requests running at the same time, all jobs together')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Files transcribed at the same time')
+    parser.add_argument('--api-key', default=os.environ.get('OPENAI_API_KEY'), help='$OPENAI_API_KEY by default')
+    parser.add_argument('--base-url', default=None, help='OpenAI compatible server')
+    parser.add_argument('--rpm', type=int, default=REQUESTS_PER_MINUTE,
+                        help="Requests per minute sent to the API at most (your organization's limit), 0 for no limit")
+    parser.add_argument('--pool-size', type=int, default=None,
+                        help=f'HTTP connections kept open to the API ({POOL_SIZE}, or --concurrency if that is more)')
+    parser.add_argument('--local', metavar='MODEL', default=None,
+                        help='Transcribe with Whisper on this machine (tiny, base, ...) instead of the API')
+    parser.add_argument('--split-duration', type=int, default=600000, help='Chunk length (ms)')
+    parser.add_argument('-f', '--format', nargs='+', choices=list(EXPORTERS), default=['json'],
+                        help='Output formats, one file each')
+    parser.add_argument('--start', type=float, default=0, help='Transcribe from here (seconds)')
+    parser.add_argument('--end', type=float, default=None, help='Transcribe up to here (seconds)')
+    parser.add_argument('--trim-intro-outro', action='store_true',
+                        help='Skip the music or silence the inputs begin and end with (unless --start/--end are given)')
+    parser.add_argument('--words', action='store_true',
+                        help='Word-level timestamps too (words in the JSON, karaoke timing in the VTT)')
+    parser.add_argument('--no-resume', action='store_true', help="Don't continue unfinished jobs, start over")
+    parser.add_argument('--metrics', metavar='FILE', default=None,
+                        help='Write the time, bytes and retries of every stage of every job here (- for stdout)')
+    parser.add_argument('--metrics-format', choices=['json', 'prometheus'], default=None,
+                        help='json, or prometheus when FILE ends with .prom')
+    args = parser.parse_args(argv)
+
+    configure(pool_size=args.pool_size or max(POOL_SIZE, args.concurrency))
+    backend = None
+    if args.local:
+        from backends import LocalWhisperBackend
+        backend = LocalWhisperBackend(args.local)
+        # Loaded while the first inputs are downloaded and cut
+        backend.preload()
+    elif not args.api_key:
+        parser.error('--api-key (or $OPENAI_API_KEY) is needed unless --local is used')
+    wrapper = GPTTranscribeWrapper(args.api_key, base_url=args.base_url, backend=backend,
+                                   resilience=ResiliencePolicy(requests_per_minute=args.rpm or None))
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    def on_update(job):
+        print_update(job)
+        # Written as soon as the job is done, a long night run keeps what it finished if it's killed
+        if job.status == DONE:
+            export(job.store, get_output_filename(job, args.output_dir), args.format)
+
+    scheduler = JobScheduler(wrapper, max_concurrency=args.concurrency, max_jobs=args.jobs, on_update=on_update,
+                             response_format='verbose_json',
+                             timestamp_granularities=['segment', 'word'] if args.words else ['segment'],
+                             split_duration=args.split_duration, resume=not args.no_resume,
+                             # Cut from the source, no trimmed copy is written
+                             start=int(args.start * 1000), end=args.end and int(args.end * 1000),
+                             trim_intro_outro=args.trim_intro_outro)
+    for source in args.inputs:
+        if os.path.isdir(source):
+            scheduler.add_directory(source)
+        else:
+            scheduler.add(source)
+    try:
+        scheduler.wait()
+    except KeyboardInterrupt:
+        # Finished chunks are kept in the job manifests, running again resumes them
+        scheduler.stop()
+        scheduler.wait()
+    print_http_stats()
+    if args.metrics:
+        write_metrics(scheduler.get_jobs(), args.metrics,
+                      args.metrics_format or ('prometheus' if args.metrics.endswith('.prom') else 'json'))
+    return 0 if all(job.status == DONE for job in scheduler.get_jobs()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,316 @@
+import contextlib
+import json
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from cancellation import CancelledError, check, sleep
+from metrics import DOWNLOAD, measure
+
+# Speech doesn't get better above this, YouTube's 48 kb/s AAC stream is enough
+MIN_SPEECH_BITRATE = 48000
+PIECE_SIZE = 4 * 1024 * 1024
+# Smaller pieces when the file is read while it downloads, the first chunk can't start before the first piece is in
+STREAMING_PIECE_SIZE = 1024 * 1024
+BLOCK_SIZE = 64 * 1024
+
+
+def select_audio_stream(streams, min_bitrate=MIN_SPEECH_BITRATE):
+    """
+        Returns the smallest audio stream with at least min_bitrate (the best one if none has it).
+        mp4 (AAC) wins a tie, its chunks can be cut without re-encoding.
+    """
+    streams = [stream for stream in streams if stream.includes_audio_track and not stream.includes_video_track]
+    if not streams:
+        raise ValueError('The video has no audio-only stream')
+    streams.sort(key=lambda stream: (stream.bitrate or 0, stream.subtype != 'mp4'))
+    return next((stream for stream in streams if (stream.bitrate or 0) >= min_bitrate), streams[-1])
+
+
+def get_remote_size(session, url, timeout=30):
+    """
+        Returns the size of the file at url, None if the server can't send parts of it.
+    """
+    response = session.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=timeout)
+    response.close()
+    if response.status_code != 206:
+        return None
+    # Content-Range: bytes 0-0/12345
+    content_range = response.headers.get('Content-Range', '')
+    size = content_range.rpartition('/')[2]
+    return int(size) if size.isdigit() else None
+
+
+def get_state_filename(dst_filename):
+    # Exists while dst_filename is incomplete
+    return dst_filename + '.download.json'
+
+
+class RangedDownloader:
+    """
+        Downloads a file with max_workers ranged requests at the same time, piece_size bytes each.
+
+        The pieces are written straight into dst_filename and every finished piece is recorded next to it
+        (get_state_filename), so a download which failed or was killed continues with the pieces it hasn't got yet.
+        A failed piece is requested again up to retries times. Servers which don't support ranges
+        get a single request, from the beginning.
+
+        Pieces are requested in order, so the beginning of the file can be read while the rest is downloading:
+        wait_for(size) blocks until the first size bytes are there (see StreamingDownload).
+
+        on_progress(downloaded, total) is called from the download threads.
+        Cancelling cancel_token closes the open responses and raises CancelledError, the pieces which are done
+        are kept for the next try.
+    """
+    def __init__(self, max_workers=4, piece_size=PIECE_SIZE, retries=3, timeout=30, on_progress=None, session=None,
+                 cancel_token=None):
+        self.__max_workers = max(1, max_workers)
+        self.__piece_size = piece_size
+        self.__retries = retries
+        self.__timeout = timeout
+        self.__on_progress = on_progress
+        self.__session = session
+        self.__cancel_token = cancel_token
+        self.__lock = threading.Lock()
+        self.__downloaded = 0
+        self.__total = 0
+        # Bytes from the beginning of the file which are all there, and whether the download is over
+        self.__available = 0
+        self.__finished = False
+        self.__error = None
+        self.__cond = threading.Condition(self.__lock)
+
+    def get_total(self):
+        return self.__total
+
+    def is_finished(self):
+        return self.__finished
+
+    def wait_for(self, size, timeout=None):
+        """
+            Blocks until the first size bytes are downloaded or the download is over, returns the bytes available.
+            Raises the download's exception if it failed before getting them.
+        """
+        with self.__cond:
+            self.__cond.wait_for(lambda: self.__available >= size or self.__finished, timeout)
+            if self.__available < size and self.__error:
+                raise self.__error
+            return self.__available
+
+    def __set_available(self, available, finished=False, error=None):
+        with self.__cond:
+            self.__available = max(self.__available, available)
+            self.__finished = self.__finished or finished
+            self.__error = self.__error or error
+            self.__cond.notify_all()
+
+    def __get_session(self):
+        if self.__session is None:
+            import requests
+            self.__session = requests.Session()
+        return self.__session
+
+    def __progress(self, size):
+        with self.__lock:
+            self.__downloaded += size
+            downloaded = self.__downloaded
+        if self.__on_progress:
+            self.__on_progress(downloaded, self.__total)
+
+    def __retry(self, fn, *args):
+        for attempt in range(self.__retries + 1):
+            check(self.__cancel_token)
+            try:
+                return fn(*args)
+            except CancelledError:
+                raise
+            except Exception:
+                if attempt == self.__retries:
+                    raise
+                sleep(random.uniform(0, min(30, 2 ** attempt)), self.__cancel_token)
+
+    @contextlib.contextmanager
+    def __get(self, session, url, **kwargs):
+        # A response which is closed when the download is cancelled, so a read blocked on it ends right away
+        with session.get(url, stream=True, timeout=self.__timeout, **kwargs) as response:
+            if self.__cancel_token is None:
+                yield response
+                return
+            handle = self.__cancel_token.on_cancel(response.close)
+            try:
+                yield response
+            except Exception:
+                # Whatever closing the response made the read raise
+                check(self.__cancel_token)
+                raise
+            finally:
+                self.__cancel_token.remove_callback(handle)
+            check(self.__cancel_token)
+
+    def download(self, url, dst_filename, total_size=None):
+        """
+            Returns dst_filename, a file which is already there (with total_size bytes) is kept as it is.
+        """
+        try:
+            if (os.path.exists(dst_filename) and not os.path.exists(get_state_filename(dst_filename))
+                    and (total_size is None or os.path.getsize(dst_filename) == total_size)):
+                self.__total = os.path.getsize(dst_filename)
+            else:
+                os.makedirs(os.path.dirname(os.path.abspath(dst_filename)), exist_ok=True)
+                session = self.__get_session()
+                total_size = total_size or get_remote_size(session, url, self.__timeout)
+                if total_size:
+                    self.__download_pieces(session, url, dst_filename, total_size)
+                else:
+                    self.__retry(self.__download_whole, session, url, dst_filename)
+        except BaseException as e:
+            self.__set_available(0, finished=True, error=e)
+            raise
+        self.__set_available(self.__total, finished=True)
+        return dst_filename
+
+    def __download_whole(self, session, url, dst_filename):
+        state_filename = get_state_filename(dst_filename)
+        self.__save_state(state_filename, None, set())
+        self.__downloaded = 0
+        with self.__get(session, url) as response:
+            response.raise_for_status()
+            self.__total = int(response.headers.get('Content-Length', 0))
+            with open(dst_filename, 'wb') as f:
+                for block in response.iter_content(BLOCK_SIZE):
+                    f.write(block)
+                    f.flush()
+                    self.__progress(len(block))
+                    self.__set_available(self.__downloaded)
+        self.__total = self.__downloaded
+        os.remove(state_filename)
+
+    def __download_pieces(self, session, url, dst_filename, total_size):
+        state_filename = get_state_filename(dst_filename)
+        done = self.__load_state(state_filename, total_size)
+        if not done or not os.path.exists(dst_filename):
+            done = set()
+            with open(dst_filename, 'wb') as f:
+                f.truncate(total_size)
+            self.__save_state(state_filename, total_size, done)
+
+        starts = list(range(0, total_size, self.__piece_size))
+        pieces = [(start, min(start + self.__piece_size, total_size)) for start in starts if start not in done]
+        self.__total = total_size
+        self.__downloaded = sum(min(self.__piece_size, total_size - start) for start in done)
+        if self.__on_progress:
+            self.__on_progress(self.__downloaded, total_size)
+
+        def update_available():
+            # The first piece which isn't done yet is where the readable part of the file ends
+            available = next((start for start in starts if start not in done), total_size)
+            self.__set_available(available)
+
+        update_available()
+
+        def fetch(start, end):
+            written = 0
+            try:
+                headers = {'Range': f'bytes={start}-{end - 1}'}
+                with self.__get(session, url, headers=headers) as response:
+                    if response.status_code != 206:
+                        raise IOError(f'Expected a part of the file, got HTTP {response.status_code}')
+                    with open(dst_filename, 'r+b') as f:
+                        f.seek(start)
+                        for block in response.iter_content(BLOCK_SIZE):
+                            block = block[:end - start - written]
+                            f.write(block)
+                            written += len(block)
+                            self.__progress(len(block))
+                if written != end - start:
+                    raise IOError(f'Got {written} of {end - start} bytes from {start}')
+            except Exception:
+                # The piece starts over, so its bytes don't count anymore
+                self.__progress(-written)
+                raise
+            with self.__lock:
+                done.add(start)
+                self.__save_state(state_filename, total_size, done)
+            update_available()
+
+        with ThreadPoolExecutor(max_workers=self.__max_workers) as executor:
+            futures = [executor.submit(self.__retry, fetch, start, end) for start, end in pieces]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+        os.remove(state_filename)
+
+    def __load_state(self, state_filename, total_size):
+        try:
+            with open(state_filename, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return set()
+        if state.get('size') != total_size or state.get('piece_size') != self.__piece_size:
+            return set()
+        return set(state['done'])
+
+    def __save_state(self, state_filename, total_size, done):
+        tmp_filename = state_filename + '.tmp'
+        with open(tmp_filename, 'w', encoding='utf-8') as f:
+            json.dump({'size': total_size, 'piece_size': self.__piece_size, 'done': sorted(done)}, f)
+        os.replace(tmp_filename, state_filename)
+
+
+class StreamingDownload:
+    """
+        Downloads dst_filename in the background, so its beginning can be read while the rest is still coming.
+
+        duration (ms) is what the site says about the audio: wait_for_time(position) uses it to guess how many bytes
+        hold the audio up to position, assuming a constant bitrate, plus margin bytes.
+        Without duration or total_size it waits for the whole file.
+        Cancelling cancel_token stops the download, whoever waits for it gets CancelledError.
+        The download is timed in metrics (metrics.Metrics) when given.
+    """
+    def __init__(self, url, dst_filename, total_size=None, duration=None, max_workers=4, on_progress=None,
+                 margin=256 * 1024, piece_size=STREAMING_PIECE_SIZE, cancel_token=None, metrics=None):
+        self.__downloader = RangedDownloader(max_workers, piece_size, on_progress=on_progress,
+                                             cancel_token=cancel_token)
+        self.__filename = dst_filename
+        self.__total_size = total_size
+        self.__duration = duration
+        self.__margin = margin
+        self.__metrics = metrics
+        self.__thread = threading.Thread(target=self.__run, args=(url, dst_filename, total_size), daemon=True)
+        self.__thread.start()
+
+    def __run(self, url, dst_filename, total_size):
+        try:
+            with measure(self.__metrics, DOWNLOAD) as timing:
+                self.__downloader.download(url, dst_filename, total_size)
+                timing['bytes'] = os.path.getsize(dst_filename)
+        except BaseException:
+            # Kept by the downloader, raised to whoever waits for the missing bytes
+            pass
+
+    def get_filename(self):
+        return self.__filename
+
+    def get_duration(self):
+        return self.__duration
+
+    def is_finished(self):
+        return self.__downloader.is_finished()
+
+    def wait(self):
+        """
+            Blocks until the whole file is downloaded, raises the download's exception if it failed.
+        """
+        self.__downloader.wait_for(float('inf'))
+
+    def wait_for_time(self, position, margin_factor=1):
+        total_size = self.__total_size or self.__downloader.get_total()
+        if not total_size or not self.__duration:
+            return self.wait()
+        size = int(total_size * min(1, position / self.__duration)) + self.__margin * margin_factor
+        self.__downloader.wait_for(min(size, total_size))
@@ -0,0 +1,119 @@
+import functools
+import os
+import shutil
+
+# Bundled with the app for Windows, used when there is no ffmpeg on PATH
+BUNDLED_FFMPEG = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'ffmpeg', 'ffmpeg.exe')
+
+# The transcription endpoint rejects files bigger than this
+MAX_UPLOAD_SIZE = 25 * 1024 * 1024
+
+# Codecs whose stream can be copied into a chunk which still starts where it was cut, and the chunk's extension.
+# Copied mp3 loses the first frames to the bit reservoir and copied opus/vorbis keep the source's timing,
+# so those are re-encoded.
+STREAM_COPY_CODECS = {
+    'aac': '.m4a',
+    'flac': '.flac',
+    'pcm_s16le': '.wav',
+    'pcm_s24le': '.wav',
+    'pcm_s32le': '.wav',
+    'pcm_f32le': '.wav',
+}
+
+# Speech doesn't need more than mono 16 kHz, everything above that is bytes to upload for nothing.
+# The same cut has to give the same bytes, the cache is keyed by them: bitexact stops the ogg muxer
+# from picking a random stream serial number for every file.
+ENCODING_PROFILES = {
+    'mp3_64k': {
+        'ext': '.mp3',
+        'bitrate': 64000,
+        'args': ['-ac', '1', '-ar', '16000', '-c:a', 'libmp3lame', '-b:a', '64k'],
+    },
+    'mp3_32k': {
+        'ext': '.mp3',
+        'bitrate': 32000,
+        'args': ['-ac', '1', '-ar', '16000', '-c:a', 'libmp3lame', '-b:a', '32k'],
+    },
+    'opus_32k': {
+        'ext': '.ogg',
+        'bitrate': 32000,
+        'args': ['-ac', '1', '-ar', '16000', '-c:a', 'libopus', '-b:a', '32k', '-application', 'voip',
+                 '-flags:a', '+bitexact', '-fflags', '+bitexact'],
+    },
+    'opus_16k': {
+        'ext': '.ogg',
+        'bitrate': 16000,
+        'args': ['-ac', '1', '-ar', '16000', '-c:a', 'libopus', '-b:a', '16k', '-application', 'voip',
+                 '-flags:a', '+bitexact', '-fflags', '+bitexact'],
+    },
+}
+
+# Tried in this order by 'auto', the first one whose chunks fit in the upload limit wins
+AUTO_ENCODING_ORDER = ['copy', 'mp3_64k', 'opus_32k', 'opus_16k']
+
+# Used when the stream can't be copied and no profile was asked for
+DEFAULT_ENCODING = 'mp3_64k'
+
+# Chunk formats ffmpeg can write to a pipe (no seeking back to finish the header) which decode exactly like
+# a file would, and the output options for them. m4a is written fragmented, delay_moov keeps the edit list which
+# skips the encoder delay. Piped mp3 has no LAME tag to skip its delay (every timestamp would be ~70ms late),
+# wav and flac headers would have no length, so those are always written to the workspace.
+PIPE_FORMATS = {
+    '.m4a': ['-f', 'ipod', '-movflags', 'frag_keyframe+delay_moov'],
+    '.ogg': ['-f', 'ogg', '-fflags', '+bitexact'],
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get_ffmpeg():
+    """
+        Returns the ffmpeg executable to run, without touching PATH.
+    """
+    if shutil.which('ffmpeg') or not os.path.isfile(BUNDLED_FFMPEG):
+        return 'ffmpeg'
+    return BUNDLED_FFMPEG
+
+
+def can_stream_copy(info):
+    return info['codec'] in STREAM_COPY_CODECS
+
+
+def get_chunk_ext(info, encoding):
+    if encoding == 'copy':
+        return STREAM_COPY_CODECS[info['codec']]
+    return ENCODING_PROFILES[encoding]['ext']
+
+
+def get_max_chunk_duration(bitrate, max_size=MAX_UPLOAD_SIZE):
+    """
+        Returns the longest chunk (ms) of the given bitrate (bits/s) which still fits in max_size,
+        keeping 5% for the container and bitrate peaks.
+    """
+    return int(max_size * 8 * 0.95 / bitrate * 1000)
+
+
+def choose_encoding(info, split_duration, encoding='auto', exact_cuts=False, max_size=MAX_UPLOAD_SIZE):
+    """
+        Decides how the chunks are encoded and how long they can be.
+
+        encoding is 'copy', one of ENCODING_PROFILES or 'auto'. With 'auto' the stream is copied when that's safe
+        and the copied chunks fit in max_size, otherwise the first profile of AUTO_ENCODING_ORDER which keeps
+        split_duration long chunks under max_size is used. Chunks only get shorter than split_duration
+        when even the smallest profile can't fit them.
+
+        Returns:
+            tuple: (encoding, split_duration)
+    """
+    copy_allowed = can_stream_copy(info) and not exact_cuts and bool(info.get('bitrate'))
+    if encoding == 'auto':
+        candidates = [name for name in AUTO_ENCODING_ORDER if name != 'copy' or copy_allowed]
+    elif encoding == 'copy' and not copy_allowed:
+        candidates = [DEFAULT_ENCODING]
+    else:
+        candidates = [encoding]
+
+    for name in candidates:
+        bitrate = info['bitrate'] if name == 'copy' else ENCODING_PROFILES[name]['bitrate']
+        max_duration = get_max_chunk_duration(bitrate, max_size)
+        if split_duration <= max_duration or name == candidates[-1]:
+            return name, min(split_duration, max_duration)
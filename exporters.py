@@ -0,0 +1,89 @@
+import json
+
+from segments import SegmentStore
+
+
+def format_timestamp(seconds, separator=','):
+    millis = round(seconds * 1000)
+    return f'{millis // 3600000:02}:{millis // 60000 % 60:02}:{millis // 1000 % 60:02}{separator}{millis % 1000:03}'
+
+
+# One encoder for every segment, json.dumps makes a new one per call when it's given options
+_encode_string = json.JSONEncoder(ensure_ascii=False).encode
+
+
+# Every writer takes a text file and (start, end, text) segments (a SegmentStore), and writes them one by one,
+# the whole document is never built in memory. The words of a word-level transcription go into JSON and VTT
+
+def write_json(f, segments):
+    # Floats are written as repr() writes them, like json does
+    has_words = bool(segments.get_words())
+    separator = '[\n  '
+    for i, (start, end, text) in enumerate(segments):
+        words = ''
+        if has_words:
+            words = ', '.join(f'{{"start": {word_start!r}, "end": {word_end!r}, "word": {_encode_string(word)}}}'
+                              for word_start, word_end, word in segments.get_segment_words(i))
+            words = f', "words": [{words}]'
+        f.write(f'{separator}{{"start": {start!r}, "end": {end!r}, "text": {_encode_string(text)}{words}}}')
+        separator = ',\n  '
+    f.write('\n]\n' if separator != '[\n  ' else '[]\n')
+
+
+def write_srt(f, segments):
+    f.writelines(f'{idx}\n{format_timestamp(start)} --> {format_timestamp(end)}\n{text.strip()}\n\n'
+                 for idx, (start, end, text) in enumerate(segments, 1))
+
+
+def get_karaoke_text(start, end, words):
+    # VTT timestamp tags before every word said after the cue starts, players highlight the words as they come
+    return ' '.join(f'<{format_timestamp(word_start, ".")}>{word.strip()}' if start < word_start < end
+                    else word.strip() for word_start, _, word in words)
+
+
+def write_vtt(f, segments):
+    f.write('WEBVTT\n\n')
+    if segments.get_words():
+        f.writelines(f'{format_timestamp(start, ".")} --> {format_timestamp(end, ".")}\n'
+                     f'{get_karaoke_text(start, end, segments.get_segment_words(i)) or text.strip()}\n\n'
+                     for i, (start, end, text) in enumerate(segments))
+        return
+    f.writelines(f'{format_timestamp(start, ".")} --> {format_timestamp(end, ".")}\n{text.strip()}\n\n'
+                 for start, end, text in segments)
+
+
+def write_text(f, segments):
+    f.writelines(f'{text.strip()}\n' for _, _, text in segments)
+
+
+# format: (extension, writer)
+EXPORTERS = {
+    'json': ('.json', write_json),
+    'srt': ('.srt', write_srt),
+    'vtt': ('.vtt', write_vtt),
+    'txt': ('.txt', write_text),
+}
+
+
+def get_format(filename):
+    """
+        Returns the format of an output filename by its extension, None if it isn't one of EXPORTERS.
+    """
+    ext = filename[filename.rfind('.'):].lower() if '.' in filename else ''
+    return next((format_name for format_name, (format_ext, _) in EXPORTERS.items() if format_ext == ext), None)
+
+
+def export(segments, filename_without_ext, formats=('json',)):
+    """
+        Writes the transcription in every format of formats, returns the filenames.
+        segments is a SegmentStore, or the result objects of a transcription.
+    """
+    if not isinstance(segments, SegmentStore):
+        segments = SegmentStore.from_results(segments)
+    filenames = []
+    for format_name in formats:
+        ext, writer = EXPORTERS[format_name]
+        with open(filename_without_ext + ext, 'w', encoding='utf-8') as f:
+            writer(f, segments)
+        filenames.append(filename_without_ext + ext)
+    return filenames
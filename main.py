@@ -3,14 +3,23 @@ from collections import Counter
 
 from PyQt5.QtCore import QThread, pyqtSignal, QSettings, QCoreApplication, Qt
 from PyQt5.QtGui import QFont, QIcon
-from PyQt5.QtWidgets import QMainWindow, QPushButton, QApplication, QVBoxLayout, QLineEdit, QTextBrowser, QWidget, \
-    QMessageBox, QGroupBox, QHBoxLayout, QRadioButton, QFrame, QLabel, QMenu, QAction, QSystemTrayIcon
+from PyQt5.QtWidgets import QMainWindow, QPushButton, QApplication, QVBoxLayout, QLineEdit, QWidget, \
+    QMessageBox, QGroupBox, QHBoxLayout, QRadioButton, QFrame, QLabel, QMenu, QAction, QSystemTrayIcon, QProgressBar, \
+    QListWidget, QListWidgetItem, QCheckBox, QFileDialog
 
 from apiWidget import ApiWidget
+from backends import LocalWhisperBackend
+from cancellation import CancellationToken, CancelledError
+from exporters import EXPORTERS, export, get_format
 from findPathWidget import FindPathWidget
 from loadingLbl import LoadingLabel
+from metrics import Metrics, RENDER, measure
 from notifier import NotifierWidget
-from script import install_audio, GPTTranscribeWrapper, remove_trim, convert_to_srt
+from resilience import REQUESTS_PER_MINUTE, ResiliencePolicy
+from scheduler import JobScheduler, DONE
+from script import install_audio, stream_audio, GPTTranscribeWrapper, remove_trim
+from statsWidget import StatsWidget
+from transcriptView import TranscriptView
 
 QApplication.setAttribute(Qt.AA_EnableHighDpiScaling)
 QCoreApplication.setAttribute(Qt.AA_UseHighDpiPixmaps)  # HighDPI support
@@ -18,41 +27,88 @@ QCoreApplication.setAttribute(Qt.AA_UseHighDpiPixmaps)  # HighDPI support
 QApplication.setFont(QFont('Arial', 12))
 
 
+def get_download_progress_callback(signal):
+    # Called for every block from the download threads, the GUI only needs to know when the percentage changes
+    last_percent = [-1]
+
+    def on_progress(downloaded, total):
+        percent = downloaded * 100 // total if total else 0
+        if percent != last_percent[0]:
+            last_percent[0] = percent
+            signal.emit(downloaded, total)
+    return on_progress
+
+
 class Thread1(QThread):
     audioReadyFinished = pyqtSignal(str)
+    errorGenerated = pyqtSignal(str)
+    # Bytes downloaded so far, bytes to download
+    downloadProgressed = pyqtSignal('qint64', 'qint64')
 
-    def __init__(self, url):
+    def __init__(self, url, cancel_token, metrics=None):
         super(Thread1, self).__init__()
         self.__url = url
+        self.__cancel_token = cancel_token
+        self.__metrics = metrics
 
     def run(self):
         try:
-            downloaded_file = install_audio(self.__url)
-            # If you want to trim the video from specific time to specific time, you can use the following line
-            # But we don't need it currently
-            dst_filename = remove_trim(downloaded_file)
+            downloaded_file = install_audio(self.__url, on_progress=get_download_progress_callback(self.downloadProgressed), cancel_token=self.__cancel_token, metrics=self.__metrics)
+            # If you want to trim the video from specific time to specific time, pass them (in seconds) here
+            # Without them the downloaded file is used as it is, nothing is copied
+            dst_filename = remove_trim(downloaded_file, cancel_token=self.__cancel_token, metrics=self.__metrics)
             self.audioReadyFinished.emit(dst_filename)
+        except CancelledError:
+            # Stopped by the user, the download continues from here next time
+            pass
         except Exception as e:
-            raise Exception(e)
+            self.errorGenerated.emit(str(e))
 
 
 class Thread2(QThread):
-    afterGenerated = pyqtSignal(list)
+    audioReadyFinished = pyqtSignal(str)
+    chunkGenerated = pyqtSignal(dict)
+    progressUpdated = pyqtSignal(int, int)
+    errorGenerated = pyqtSignal(str)
+    downloadProgressed = pyqtSignal('qint64', 'qint64')
 
-    def __init__(self, wrapper, dst_filename):
+    def __init__(self, wrapper, dst_filename, max_workers=1, resume=False, url=None, trim_intro_outro=False, cancel_token=None, metrics=None, timestamp_granularities=('segment',)):
         super(Thread2, self).__init__()
         self.__wrapper = wrapper
         self.__dst_filename = dst_filename
+        self.__max_workers = max_workers
+        self.__resume = resume
+        self.__trim_intro_outro = trim_intro_outro
+        self.__cancel_token = cancel_token
+        self.__metrics = metrics
+        self.__timestamp_granularities = list(timestamp_granularities)
+        # With a Youtube url, chunks are transcribed while the rest of the audio is downloading
+        self.__url = url
 
     def run(self):
         try:
-            result_obj_lst, result_audio_file_paths = self.__wrapper.transcribe_audio(self.__dst_filename, response_format='verbose_json' ,timestamp_granularities=['segment'])
-            self.afterGenerated.emit(result_obj_lst)
+            if self.__url:
+                download = stream_audio(self.__url, on_progress=get_download_progress_callback(self.downloadProgressed), cancel_token=self.__cancel_token, metrics=self.__metrics)
+                self.audioReadyFinished.emit(download.get_filename())
+                chunks = self.__wrapper.iter_transcribe_stream(download, response_format='verbose_json', timestamp_granularities=self.__timestamp_granularities, max_workers=self.__max_workers, cancel_token=self.__cancel_token, metrics=self.__metrics)
+            else:
+                chunks = self.__wrapper.iter_transcribe_audio(self.__dst_filename, response_format='verbose_json', timestamp_granularities=self.__timestamp_granularities, max_workers=self.__max_workers, resume=self.__resume, trim_intro_outro=self.__trim_intro_outro, cancel_token=self.__cancel_token, metrics=self.__metrics)
+            # Each chunk is shown as soon as it (and every chunk before it) is transcribed
+            for i, total, result_obj in chunks:
+                self.chunkGenerated.emit(result_obj)
+                self.progressUpdated.emit(i + 1, total)
+        except CancelledError:
+            # Stopped by the user, what we've got is already shown
+            pass
         except Exception as e:
-            raise Exception(e)
+            # What we've got is already shown, a ChunkTranscriptionError tells the user which chunks are missing
+            self.errorGenerated.emit(str(e))
 
 
 class MainWindow(QMainWindow):
+    # Emitted from the scheduler threads, handled in the GUI thread
+    jobUpdated = pyqtSignal(object)
+
     def __init__(self):
         super(MainWindow, self).__init__()
         self.__initVal()
@@ -63,13 +119,51 @@ class MainWindow(QMainWindow):
         if not self.__settings_ini.contains('API_KEY'):
             self.__settings_ini.setValue('API_KEY', '')
         self.__api_key = self.__settings_ini.value('API_KEY', type=str)
-
-        self.__wrapper = GPTTranscribeWrapper(self.__api_key)
+        # Number of chunks sent to the API at the same time
+        if not self.__settings_ini.contains('MAX_WORKERS'):
+            self.__settings_ini.setValue('MAX_WORKERS', 4)
+        self.__max_workers = self.__settings_ini.value('MAX_WORKERS', type=int)
+        # Requests sent to the API per minute at most, the limit of your organization (0 for no limit)
+        if not self.__settings_ini.contains('REQUESTS_PER_MINUTE'):
+            self.__settings_ini.setValue('REQUESTS_PER_MINUTE', REQUESTS_PER_MINUTE)
+        self.__requests_per_minute = self.__settings_ini.value('REQUESTS_PER_MINUTE', type=int)
+        # Transcribe Youtube videos while they are downloading (not when the intro and outro are skipped)
+        if not self.__settings_ini.contains('STREAM_YOUTUBE'):
+            self.__settings_ini.setValue('STREAM_YOUTUBE', True)
+        self.__stream_youtube = self.__settings_ini.value('STREAM_YOUTUBE', type=bool)
+        # Leave out the music or silence the audio begins and ends with (Youtube videos are downloaded first then)
+        if not self.__settings_ini.contains('TRIM_INTRO_OUTRO'):
+            self.__settings_ini.setValue('TRIM_INTRO_OUTRO', False)
+        self.__trim_intro_outro = self.__settings_ini.value('TRIM_INTRO_OUTRO', type=bool)
+        # The time of every word too, for subtitles which follow the speech
+        if not self.__settings_ini.contains('WORD_TIMESTAMPS'):
+            self.__settings_ini.setValue('WORD_TIMESTAMPS', False)
+        self.__word_timestamps = self.__settings_ini.value('WORD_TIMESTAMPS', type=bool)
+        # 'openai' or 'local' (Whisper on this machine, LOCAL_MODEL is its size or a model directory)
+        if not self.__settings_ini.contains('BACKEND'):
+            self.__settings_ini.setValue('BACKEND', 'openai')
+        if not self.__settings_ini.contains('LOCAL_MODEL'):
+            self.__settings_ini.setValue('LOCAL_MODEL', 'base')
+        self.__backend = self.__settings_ini.value('BACKEND', type=str)
+        self.__local_model = self.__settings_ini.value('LOCAL_MODEL', type=str)
+
+        # The key is set by ApiWidget once it's checked, in the background
+        self.__wrapper = GPTTranscribeWrapper(
+            resilience=ResiliencePolicy(requests_per_minute=self.__requests_per_minute or None))
         self.__is_local = True
 
         self.__used_language_list = []
         self.__duration = 0
-        self.__is_stopped = False
+        # Stops the running transcription (and its download), a new one is made for every run
+        self.__cancel_token = CancellationToken()
+        # Where the time of the run (or the job shown) went, shown in the statistics
+        self.__metrics = Metrics()
+        # The file which is (or was last) transcribed
+        self.__dst_filename = None
+
+        # Queued jobs run in the background, apart from the one run by the button above
+        self.__scheduler = None
+        self.__job_items = {}
 
     def __initUi(self):
         self.setWindowTitle('PyQt app example of transcribing Youtube video with Whisper')
@@ -83,6 +177,20 @@ class MainWindow(QMainWindow):
         self.__fromYoutubeWidget.setPlaceholderText('Write Youtube video address...')
         self.__fromYoutubeWidget.textChanged.connect(self.__setAiEnabled)
 
+        self.__apiBackendRadioBtn = QRadioButton('OpenAI API')
+        self.__localBackendRadioBtn = QRadioButton('Local Whisper')
+        self.__apiBackendRadioBtn.setChecked(True)
+        self.__localBackendRadioBtn.setChecked(self.__backend == 'local' and self.__setLocalBackend(True, ask=False))
+        self.__localBackendRadioBtn.toggled.connect(self.__setLocalBackend)
+
+        lay = QHBoxLayout()
+        lay.addWidget(self.__apiBackendRadioBtn)
+        lay.addWidget(self.__localBackendRadioBtn)
+
+        backendGrpBox = QGroupBox()
+        backendGrpBox.setTitle('Transcribe with')
+        backendGrpBox.setLayout(lay)
+
         self.__fromLocalWidget = FindPathWidget()
         self.__fromLocalWidget.setExtOfFiles('Audio Files (*.mp3);; Video Files (*.mp4)')
         self.__fromLocalWidget.getLineEdit().setPlaceholderText('Select a file...')
@@ -102,6 +210,14 @@ class MainWindow(QMainWindow):
         self.__fromWhereGrpBox = QGroupBox()
         self.__fromWhereGrpBox.setTitle('From where?')
         self.__fromWhereGrpBox.setLayout(lay)
+
+        self.__trimIntroOutroCheckBox = QCheckBox('Skip the music and silence at the beginning and the end')
+        self.__trimIntroOutroCheckBox.setChecked(self.__trim_intro_outro)
+        self.__trimIntroOutroCheckBox.toggled.connect(self.__setTrimIntroOutro)
+
+        self.__wordTimestampsCheckBox = QCheckBox('Word-level timestamps (for subtitle sync)')
+        self.__wordTimestampsCheckBox.setChecked(self.__word_timestamps)
+        self.__wordTimestampsCheckBox.toggled.connect(self.__setWordTimestamps)
         
         sep = QFrame()
         sep.setFrameShape(QFrame.VLine)
@@ -117,11 +233,39 @@ class MainWindow(QMainWindow):
 
         self.__loadingLbl = LoadingLabel()
 
+        self.__progressBar = QProgressBar()
+        self.__progressBar.setFormat('%v / %m chunks')
+        self.__progressBar.setVisible(False)
+
         self.__btn = QPushButton('Transcribe the Video')
         self.__btn.clicked.connect(self.__run)
         self.__btn.setEnabled(False)
-        self.__browser = QTextBrowser()
-        self.__browser.setPlaceholderText('Result would be shown here...')
+
+        self.__addToQueueBtn = QPushButton('Add to Queue')
+        self.__addToQueueBtn.clicked.connect(self.__addToQueue)
+        self.__addToQueueBtn.setEnabled(False)
+
+        lay = QHBoxLayout()
+        lay.addWidget(self.__btn)
+        lay.addWidget(self.__addToQueueBtn)
+        lay.setContentsMargins(0, 0, 0, 0)
+
+        btnWidget = QWidget()
+        btnWidget.setLayout(lay)
+
+        self.__jobListWidget = QListWidget()
+        self.__jobListWidget.itemDoubleClicked.connect(self.__showJob)
+        self.jobUpdated.connect(self.__jobUpdated)
+
+        lay = QVBoxLayout()
+        lay.addWidget(self.__jobListWidget)
+
+        self.__queueGrpBox = QGroupBox()
+        self.__queueGrpBox.setTitle('Queue (double-click a finished job to see it)')
+        self.__queueGrpBox.setLayout(lay)
+        self.__queueGrpBox.setVisible(False)
+        self.__transcriptView = TranscriptView()
+        self.__transcriptView.setPlaceholderText('Result would be shown here...')
 
         resultGrpBox = QGroupBox()
         resultGrpBox.setTitle('Result')
@@ -140,24 +284,39 @@ class MainWindow(QMainWindow):
         descriptionWidget = QWidget()
         descriptionWidget.setLayout(lay)
 
-        self.__convertToSrtBtn = QPushButton('Convert to SRT')
-        self.__convertToSrtBtn.clicked.connect(self.__convertToSrt)
-        self.__convertToSrtBtn.setEnabled(False)
+        self.__exportBtn = QPushButton('Export (SRT, VTT, JSON, Text)')
+        self.__exportBtn.clicked.connect(self.__export)
+        self.__exportBtn.setEnabled(False)
+
+        self.__statsWidget = StatsWidget()
+        self.__statsWidget.setVisible(False)
+
+        statsBtn = QPushButton('Statistics')
+        statsBtn.setCheckable(True)
+        statsBtn.toggled.connect(self.__statsWidget.setVisible)
+        statsBtn.toggled.connect(lambda f: self.__statsWidget.refresh())
 
         lay = QVBoxLayout()
         lay.addWidget(descriptionWidget)
-        lay.addWidget(self.__browser)
+        lay.addWidget(self.__transcriptView)
+        lay.addWidget(statsBtn)
+        lay.addWidget(self.__statsWidget)
         resultGrpBox.setLayout(lay)
 
         lay = QVBoxLayout()
         lay.addWidget(self.__apiWidget)
+        lay.addWidget(backendGrpBox)
         lay.addWidget(self.__fromWhereGrpBox)
         lay.addWidget(getFromWidget)
-        lay.addWidget(self.__btn)
+        lay.addWidget(self.__trimIntroOutroCheckBox)
+        lay.addWidget(self.__wordTimestampsCheckBox)
+        lay.addWidget(btnWidget)
+        lay.addWidget(self.__queueGrpBox)
         lay.addWidget(self.__loadingLbl)
+        lay.addWidget(self.__progressBar)
         lay.addWidget(resultGrpBox)
         lay.addWidget(self.__stopBtn)
-        lay.addWidget(self.__convertToSrtBtn)
+        lay.addWidget(self.__exportBtn)
 
         mainWidget = QWidget()
         mainWidget.setLayout(lay)
@@ -194,7 +353,39 @@ class MainWindow(QMainWindow):
 
     def __api_key_accepted(self, api_key, f):
         # Enable AI related features if API key is valid
-        self.__setAiEnabled(f)
+        self.__setAiEnabled(self.__wrapper.is_available())
+
+    def __setLocalBackend(self, f, ask=True):
+        if f:
+            try:
+                backend = LocalWhisperBackend(self.__local_model)
+                # Loaded while the user picks a file, not when the first chunk is ready
+                backend.preload()
+                self.__wrapper.set_backend(backend)
+            except ImportError as e:
+                if ask:
+                    QMessageBox.warning(self, 'Local Whisper', str(e))
+                    self.__apiBackendRadioBtn.setChecked(True)
+                return False
+        else:
+            self.__wrapper.set_backend(None)
+        self.__settings_ini.setValue('BACKEND', 'local' if f else 'openai')
+        if ask:
+            self.__setAiEnabled(self.__wrapper.is_available())
+        return True
+
+    def __setTrimIntroOutro(self, f):
+        self.__trim_intro_outro = f
+        self.__settings_ini.setValue('TRIM_INTRO_OUTRO', f)
+        self.__updateBtnText()
+
+    def __setWordTimestamps(self, f):
+        self.__word_timestamps = f
+        self.__settings_ini.setValue('WORD_TIMESTAMPS', f)
+        self.__updateBtnText()
+
+    def __getTimestampGranularities(self):
+        return ['segment', 'word'] if self.__word_timestamps else ['segment']
 
     def get_current_url(self):
         if self.__is_local:
@@ -209,29 +400,92 @@ class MainWindow(QMainWindow):
             f = f.strip() != ''
         text = self.get_current_url() != ''
         self.__btn.setEnabled(f and text)
+        self.__addToQueueBtn.setEnabled(f and text)
+        self.__updateBtnText()
+
+    def __updateBtnText(self):
+        # Let the user know that an unfinished job of the selected file will be offered to be resumed
+        filename = self.get_current_url()
+        resumable = self.__is_local and os.path.isfile(filename) and self.__wrapper.get_job_manifest(filename, response_format='verbose_json', timestamp_granularities=self.__getTimestampGranularities(), trim_intro_outro=self.__trim_intro_outro).exists()
+        self.__btn.setText('Resume Transcribing the Video' if resumable else 'Transcribe the Video')
 
     def __toggleWidgets(self, f):
         self.__btn.setEnabled(f)
         self.__fromLocalWidget.setEnabled(f)
         self.__fromYoutubeWidget.setEnabled(f)
         self.__stopBtn.setVisible(not f)
-        self.__convertToSrtBtn.setEnabled(f)
+        self.__exportBtn.setEnabled(f)
+        self.__jobListWidget.setEnabled(f)
 
     def __toggleFromWhereRadioWidgets(self):
         self.__is_local = self.sender().text() == 'From local'
         self.__fromLocalWidget.setEnabled(self.__is_local)
         self.__fromYoutubeWidget.setEnabled(not self.__is_local)
 
+    def __addToQueue(self):
+        if self.__scheduler is None:
+            self.__scheduler = JobScheduler(self.__wrapper, max_concurrency=self.__max_workers, trim=remove_trim,
+                                            on_update=self.jobUpdated.emit, response_format='verbose_json')
+        self.__queueGrpBox.setVisible(True)
+        # The check boxes as they are now, every job has its own
+        self.__scheduler.add(self.get_current_url(), timestamp_granularities=self.__getTimestampGranularities(),
+                             trim_intro_outro=self.__trim_intro_outro)
+
+    def __jobUpdated(self, job):
+        item = self.__job_items.get(job.id)
+        if item is None:
+            item = QListWidgetItem()
+            item.setData(Qt.ItemDataRole.UserRole, job)
+            self.__jobListWidget.addItem(item)
+            self.__job_items[job.id] = item
+        progress = f' {job.done}/{job.total}' if job.total else ''
+        error = f' - {job.error}' if job.error else ''
+        item.setText(f'#{job.id} [{job.status}{progress}] {job.source}{error}')
+
+    def __showJob(self, item):
+        job = item.data(Qt.ItemDataRole.UserRole)
+        if job.status != DONE:
+            return
+        self.__used_language_list = list(job.languages)
+        self.__duration = job.duration
+        self.__dst_filename = job.filename
+        self.__metrics = job.metrics
+        with measure(self.__metrics, RENDER):
+            self.__transcriptView.setStore(job.store)
+        self.__statsWidget.setMetrics(job.metrics)
+        self.__exportBtn.setEnabled(True)
+        mostCommonUsedLanguage = Counter(self.__used_language_list).most_common(1)[0][0] if self.__used_language_list else ''
+        self.__transcriptionLanguageLbl.setText(f'Transcription language (Most commonly used): {mostCommonUsedLanguage}')
+        self.__transcriptionDurationLbl.setText(f'Transcription duration: {str(round(self.__duration, 2))} seconds')
+
     def __run(self):
         try:
             url = self.get_current_url()
+            self.__cancel_token = CancellationToken()
+            self.__metrics = Metrics()
+            self.__statsWidget.setMetrics(self.__metrics, running=True)
             if self.__is_local:
                 self.__audioReadyFinished(url)
                 self.__runSecondThread()
+            elif self.__stream_youtube and not self.__trim_intro_outro:
+                # The end of the speech is only known once the whole audio is there, so trimming means downloading first
+                self.__t = Thread2(self.__wrapper, None, self.__max_workers, url=url, cancel_token=self.__cancel_token, metrics=self.__metrics, timestamp_granularities=self.__getTimestampGranularities())
+                self.__t.started.connect(self.__started)
+                self.__t.audioReadyFinished.connect(self.__audioReadyFinished)
+                self.__t.downloadProgressed.connect(self.__downloadProgressed)
+                self.__t.chunkGenerated.connect(self.__chunkGenerated)
+                self.__t.progressUpdated.connect(self.__progressUpdated)
+                self.__t.errorGenerated.connect(self.__errorGenerated)
+                self.__t.finished.connect(self.__finished)
+                self.__t.start()
             else:
-                self.__t = Thread1(url)
+                # Set by audioReadyFinished, only a finished download is transcribed
+                self.__dst_filename = None
+                self.__t = Thread1(url, self.__cancel_token, self.__metrics)
                 self.__t.started.connect(self.__started)
                 self.__t.audioReadyFinished.connect(self.__audioReadyFinished)
+                self.__t.downloadProgressed.connect(self.__downloadProgressed)
+                self.__t.errorGenerated.connect(self.__errorGenerated)
                 self.__t.finished.connect(self.__runSecondThread)
                 self.__t.start()
         except Exception as e:
@@ -239,57 +493,102 @@ class MainWindow(QMainWindow):
 
     def __started(self):
         self.__loadingLbl.start()
-        self.__browser.clear()
+        self.__transcriptView.clear()
         self.__transcriptionLanguageLbl.setText('Transcription language: ')
         self.__transcriptionDurationLbl.setText('Transcription duration: ')
+        self.__used_language_list = []
+        self.__duration = 0
+        self.__progressBar.reset()
+        self.__progressBar.setVisible(False)
         self.__toggleWidgets(False)
 
     def __audioReadyFinished(self, dst_filename):
         self.__dst_filename = dst_filename
 
+    def __askResume(self):
+        manifest = self.__wrapper.get_job_manifest(self.__dst_filename, response_format='verbose_json', timestamp_granularities=self.__getTimestampGranularities(), trim_intro_outro=self.__trim_intro_outro)
+        if not manifest.exists():
+            return False
+        done, total = manifest.get_progress()
+        resumeMessageBox = QMessageBox(self)
+        resumeMessageBox.setWindowTitle('Resume')
+        resumeMessageBox.setText(f'{done} of {total} chunks of this file were already transcribed. Would you like to resume?')
+        resumeBtn = resumeMessageBox.addButton('Resume', QMessageBox.ButtonRole.YesRole)
+        resumeMessageBox.addButton('Start over', QMessageBox.ButtonRole.NoRole)
+        resumeMessageBox.exec()
+        return resumeMessageBox.clickedButton() == resumeBtn
+
     def __runSecondThread(self):
-        if self.__is_stopped:
-            self.__is_stopped = False
+        if self.__cancel_token.is_cancelled() or self.__dst_filename is None:
+            # Stopped while downloading, or the download failed
+            self.__finished()
         else:
-            self.__t = Thread2(self.__wrapper, self.__dst_filename)
+            resume = self.__askResume()
+            self.__t = Thread2(self.__wrapper, self.__dst_filename, self.__max_workers, resume, trim_intro_outro=self.__trim_intro_outro, cancel_token=self.__cancel_token, metrics=self.__metrics, timestamp_granularities=self.__getTimestampGranularities())
             self.__t.started.connect(self.__started)
-            self.__t.afterGenerated.connect(self.__afterGenerated)
+            self.__t.chunkGenerated.connect(self.__chunkGenerated)
+            self.__t.progressUpdated.connect(self.__progressUpdated)
+            self.__t.errorGenerated.connect(self.__errorGenerated)
             self.__t.finished.connect(self.__finished)
             self.__t.start()
 
-    def __afterGenerated(self, result_obj_lst):
-        self.__loadingLbl.stop()
-        self.__btn.setEnabled(True)
+    def __chunkGenerated(self, result_obj):
+        self.__addResults([result_obj])
+
+    def __addResults(self, result_obj_lst):
+        # Every segment of them is inserted at once
+        segments = []
+        words = []
         for result_obj in result_obj_lst:
+            if result_obj is None:
+                continue
             self.__used_language_list.append(result_obj['language'])
             self.__duration += result_obj['duration']
-            segments = result_obj['segments']
-            for segment in segments:
-                start = segment['start']
-                end = segment['end']
-                text = segment['text']
-                self.__browser.append(f"[{start} --> {end}] {text}")
+            segments.extend(result_obj['segments'])
+            words.extend(result_obj.get('words', ()))
+        with measure(self.__metrics, RENDER):
+            self.__transcriptView.addSegments(segments, words)
+
+    def __downloadProgressed(self, downloaded, total):
+        # While streaming, the chunks are what the user is waiting for once they have started coming
+        if self.__progressBar.format() == '%v / %m chunks' and self.__progressBar.isVisibleTo(self):
+            return
+        self.__progressBar.setFormat('%p% downloaded')
+        self.__progressBar.setMaximum(1000)
+        self.__progressBar.setValue(downloaded * 1000 // total if total else 0)
+        self.__progressBar.setVisible(True)
+
+    def __progressUpdated(self, done, total):
+        self.__progressBar.setFormat('%v / %m chunks')
+        self.__progressBar.setMaximum(total)
+        self.__progressBar.setValue(done)
+        self.__progressBar.setVisible(True)
+
+    def __errorGenerated(self, message):
+        QMessageBox.critical(self, 'Error', message)
 
     def __finished(self):
-        if self.__is_stopped:
-            self.__is_stopped = False
-        else:
+        self.__loadingLbl.stop()
+        self.__statsWidget.stop()
+        self.__stopBtn.setEnabled(True)
+        if self.__used_language_list:
             mostCommonUsedLanguage = Counter(self.__used_language_list).most_common(1)[0][0]
             self.__transcriptionLanguageLbl.setText(f'Transcription language (Most commonly used): {mostCommonUsedLanguage}')
-            self.__transcriptionDurationLbl.setText(f'Transcription duration: {str(round(self.__duration, 2))} seconds')
+        self.__transcriptionDurationLbl.setText(f'Transcription duration: {str(round(self.__duration, 2))} seconds')
 
-            self.__toggleWidgets(True)
+        self.__toggleWidgets(True)
+        self.__updateBtnText()
 
-            if not self.isVisible():
-                self.__notifierWidget = NotifierWidget(informative_text='Transcription Complete 💻', detailed_text='Click this!')
-                self.__notifierWidget.show()
-                self.__notifierWidget.doubleClicked.connect(self.show)
+        if not self.isVisible() and not self.__cancel_token.is_cancelled():
+            self.__notifierWidget = NotifierWidget(informative_text='Transcription Complete 💻', detailed_text='Click this!')
+            self.__notifierWidget.show()
+            self.__notifierWidget.doubleClicked.connect(self.show)
 
     def __stop(self):
-        self.__is_stopped = True
-        self.__t.terminate()
-        self.__loadingLbl.stop()
-        self.__toggleWidgets(True)
+        # The thread stops at once (uploads are aborted, ffmpeg is killed) and cleans up after itself,
+        # the widgets are given back in __finished when it's done
+        self.__stopBtn.setEnabled(False)
+        self.__cancel_token.cancel()
 
     def __beforeClose(self):
         message = 'Would you like to exit the application? If you won\'t, it will be running in the background.'
@@ -304,6 +603,7 @@ class MainWindow(QMainWindow):
         else:
             # Yes
             if reply == QMessageBox.StandardButton.Yes:
+                self.__cancel_token.cancel()
                 app = QApplication.instance()
                 app.quit()
             # No
@@ -317,10 +617,21 @@ class MainWindow(QMainWindow):
         else:
             return super().closeEvent(e)
 
-    def __convertToSrt(self):
-        original_filename = self.__fromLocalWidget.getLineEdit().text()
-        content = self.__browser.toPlainText().split('\n')
-        convert_to_srt(original_filename, content)
+    def __export(self):
+        # Next to the file which was transcribed (the downloaded one for Youtube videos), as SRT by default
+        filename = os.path.splitext(self.__dst_filename or 'transcript')[0] + '.srt'
+        filters = ['SubRip (*.srt)', 'WebVTT (*.vtt)', 'JSON (*.json)', 'Text (*.txt)']
+        filename, selected_filter = QFileDialog.getSaveFileName(self, 'Export', filename, ';;'.join(filters))
+        if not filename:
+            return
+        # The extension typed by the user wins, the selected filter is used without one
+        format_name = get_format(filename) or next(name for name, (ext, _) in EXPORTERS.items() if ext in selected_filter)
+        ext = EXPORTERS[format_name][0]
+        filename_without_ext = filename[:-len(ext)] if filename.lower().endswith(ext) else filename
+        try:
+            export(self.__transcriptView.getModel().getStore(), filename_without_ext, [format_name])
+        except OSError as e:
+            QMessageBox.critical(self, 'Error', str(e))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,197 @@
+import contextlib
+import threading
+import time
+
+# Stages of a job
+DOWNLOAD = 'download'
+TRIM = 'trim'
+# Audio decoded to find pauses and where the speech begins and ends
+DECODE = 'decode'
+# Chunks cut by copying the audio stream / by re-encoding it
+SPLIT = 'split'
+ENCODE = 'encode'
+# A chunk request being sent (connecting included), then waiting for the API's answer
+UPLOAD = 'upload'
+API = 'api'
+# A chunk transcribed on this machine (backends.LocalWhisperBackend)
+TRANSCRIBE = 'transcribe'
+# Segments added to the transcript view
+RENDER = 'render'
+STAGES = [DOWNLOAD, TRIM, DECODE, SPLIT, ENCODE, UPLOAD, API, TRANSCRIBE, RENDER]
+
+# What the time of each stage is spent on
+BOUND_BY = {
+    DOWNLOAD: 'network',
+    UPLOAD: 'network',
+    TRIM: 'cpu',
+    DECODE: 'cpu',
+    SPLIT: 'cpu',
+    ENCODE: 'cpu',
+    TRANSCRIBE: 'cpu',
+    RENDER: 'cpu',
+    API: 'api',
+}
+
+
+class Metrics:
+    """
+        Where the time of one job went: the seconds, calls and bytes of every stage, in total and per chunk,
+        and counters (retries, cache_hits). Stages are recorded from every thread of the job,
+        those running at the same time add up to more than wall_seconds, which is the time between
+        the start of the first stage and the end of the last one.
+    """
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__stages = {}
+        self.__counters = {}
+        self.__chunks = {}
+        self.__began = None
+        self.__ended = None
+
+    def add(self, stage, seconds, size=0, chunk=None):
+        """
+            Records seconds (and size bytes) of stage, for the chunk of this index if given.
+        """
+        now = time.perf_counter()
+        with self.__lock:
+            self.__began = min(self.__began or now, now - seconds)
+            self.__ended = max(self.__ended or now, now)
+            totals = self.__stages.setdefault(stage, {'count': 0, 'seconds': 0.0, 'bytes': 0})
+            totals['count'] += 1
+            totals['seconds'] += seconds
+            totals['bytes'] += size
+            if chunk is not None:
+                record = self.__chunks.setdefault(chunk, {'index': chunk})
+                record[f'{stage}_seconds'] = record.get(f'{stage}_seconds', 0.0) + seconds
+                if size:
+                    record[f'{stage}_bytes'] = record.get(f'{stage}_bytes', 0) + size
+
+    @contextlib.contextmanager
+    def stage(self, stage, chunk=None, size=0):
+        """
+            Times the with block as stage. It gets a dict whose 'bytes' can be set once they are known.
+        """
+        timing = {'bytes': size}
+        began = time.perf_counter()
+        try:
+            yield timing
+        finally:
+            self.add(stage, time.perf_counter() - began, timing['bytes'], chunk)
+
+    def count(self, name, value=1, chunk=None):
+        with self.__lock:
+            self.__counters[name] = self.__counters.get(name, 0) + value
+            if chunk is not None:
+                record = self.__chunks.setdefault(chunk, {'index': chunk})
+                record[name] = record.get(name, 0) + value
+
+    def set_chunk(self, chunk, **values):
+        # e.g. the chunk's start and end
+        with self.__lock:
+            self.__chunks.setdefault(chunk, {'index': chunk}).update(values)
+
+    def get_bound(self):
+        """
+            Returns 'network', 'cpu' or 'api', what most of the job's time was spent on, None before any stage.
+        """
+        return self.get()['bound']
+
+    def get(self):
+        """
+            Returns everything recorded so far as a dict which can be written as JSON.
+        """
+        with self.__lock:
+            stages = {stage: dict(totals) for stage, totals in self.__stages.items()}
+            result = {
+                'wall_seconds': (self.__ended - self.__began) if self.__began is not None else 0.0,
+                'stages': stages,
+                'counters': dict(self.__counters),
+                'chunks': [dict(self.__chunks[i]) for i in sorted(self.__chunks)],
+            }
+        bound_seconds = dict.fromkeys(sorted(set(BOUND_BY.values())), 0.0)
+        for stage, totals in stages.items():
+            if stage in BOUND_BY:
+                bound_seconds[BOUND_BY[stage]] += totals['seconds']
+        result['bound_seconds'] = bound_seconds
+        result['bound'] = max(bound_seconds, key=bound_seconds.get) if any(bound_seconds.values()) else None
+        return result
+
+
+def measure(metrics, stage, chunk=None, size=0):
+    # For functions whose metrics are optional
+    if metrics is None:
+        return contextlib.nullcontext({'bytes': size})
+    return metrics.stage(stage, chunk, size)
+
+
+class RequestTimer:
+    """
+        Splits the requests sent for one chunk (see transport.observe_requests) into UPLOAD, until the chunk
+        is sent, and API, waiting for the answer. Every request after the first one is a retry.
+        A chunk counts as sent once its end is in the socket's buffer: on a slow link, the last few MB
+        the buffers hold are still on their way while the time goes to API.
+    """
+    def __init__(self, metrics, chunk=None):
+        self.__metrics = metrics
+        self.__chunk = chunk
+        self.__began = None
+        self.__sent = None
+        self.__size = 0
+        self.requests = 0
+
+    def __call__(self, name, info):
+        now = time.perf_counter()
+        if name == 'request.started':
+            self.requests += 1
+            self.__began = now
+            self.__sent = None
+            self.__size = int(info.headers.get('content-length', 0))
+        elif name.endswith('.send_request_body.complete') and self.__began is not None:
+            self.__sent = now
+            self.__metrics.add(UPLOAD, now - self.__began, self.__size, self.__chunk)
+        elif name == 'request.complete' and self.__began is not None:
+            # Given up on before the chunk was sent: connecting or sending took that long
+            if self.__sent is None:
+                self.__metrics.add(UPLOAD, now - self.__began, 0, self.__chunk)
+            else:
+                self.__metrics.add(API, now - self.__sent, 0, self.__chunk)
+            self.__began = None
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def to_prometheus(jobs, http_stats=None, prefix='transcribe'):
+    """
+        Returns the Prometheus text format of jobs, (labels, Metrics) pairs, and of transport.get_stats().
+        Chunks are left out (they are in Metrics.get()).
+    """
+    samples = {}
+
+    def add(name, kind, help_text, labels, value):
+        metric = samples.setdefault(f'{prefix}_{name}', (kind, help_text, []))
+        label_text = ','.join(f'{key}="{escape_label(label)}"' for key, label in labels.items())
+        metric[2].append(f'{prefix}_{name}{{{label_text}}} {value}' if label_text else f'{prefix}_{name} {value}')
+
+    for labels, metrics in jobs:
+        result = metrics.get()
+        add('job_wall_seconds', 'gauge', 'Time from the first stage of the job to its last', labels,
+            result['wall_seconds'])
+        for stage, totals in result['stages'].items():
+            stage_labels = dict(labels, stage=stage)
+            add('stage_seconds_total', 'counter', 'Time spent in each stage', stage_labels, totals['seconds'])
+            add('stage_calls_total', 'counter', 'Times each stage ran', stage_labels, totals['count'])
+            add('stage_bytes_total', 'counter', 'Bytes moved by each stage', stage_labels, totals['bytes'])
+        for bound, seconds in result['bound_seconds'].items():
+            add('bound_seconds_total', 'counter', 'Time spent on the network, the CPU and waiting for the API',
+                dict(labels, bound=bound), seconds)
+        for name, value in result['counters'].items():
+            add(f'{name}_total', 'counter', name.replace('_', ' ').capitalize(), labels, value)
+    for name, value in (http_stats or {}).items():
+        add(f'http_{name}_total', 'counter', f'HTTP {name.replace("_", " ")} of the shared client', {}, value)
+
+    lines = []
+    for name, (kind, help_text, metric_lines) in samples.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}'] + metric_lines
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,212 @@
+import random
+import threading
+import time
+
+from cancellation import CancelledError, check, sleep
+
+# Requests sent to the API per minute at most by default, set it to the limit of your organization
+REQUESTS_PER_MINUTE = 50
+
+
+class CircuitOpenError(Exception):
+    """
+        Raised instead of calling the API when the trial call of the circuit breaker failed.
+    """
+    pass
+
+
+def is_transient_error(e):
+    """
+        Whether retrying the request later can succeed: timeouts, connection errors, 408, 409, 429 and 5xx.
+    """
+    status_code = getattr(e, 'status_code', None)
+    if status_code is not None:
+        return status_code in (408, 409, 429) or status_code >= 500
+    # openai.APIConnectionError (and APITimeoutError) has no status code
+    return type(e).__name__ in ('APIConnectionError', 'APITimeoutError') or isinstance(e, (ConnectionError, TimeoutError))
+
+
+def get_retry_after(e):
+    """
+        Seconds the server asked us to wait (Retry-After header), None if it didn't.
+    """
+    response = getattr(e, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+        Limits the request rate to rate_per_minute, allowing bursts of up to capacity requests.
+    """
+    def __init__(self, rate_per_minute, capacity=None):
+        self.__rate = rate_per_minute / 60
+        self.__capacity = capacity or max(1, rate_per_minute // 10)
+        self.__tokens = self.__capacity
+        self.__updated_at = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def acquire(self, cancel_token=None):
+        """
+            Blocks until a token is available, returns the seconds it waited.
+        """
+        waited = 0
+        while True:
+            with self.__lock:
+                now = time.monotonic()
+                self.__tokens = min(self.__capacity, self.__tokens + (now - self.__updated_at) * self.__rate)
+                self.__updated_at = now
+                if self.__tokens >= 1:
+                    self.__tokens -= 1
+                    return waited
+                delay = (1 - self.__tokens) / self.__rate
+            sleep(delay, cancel_token)
+            waited += delay
+
+
+class CircuitBreaker:
+    """
+        Stops calling the API after failure_threshold transient failures in a row.
+
+        After reset_timeout seconds one trial call is let through (half-open),
+        its success closes the circuit again and its failure opens it for another reset_timeout.
+        Calls made in the meantime wait for the trial instead of failing right away.
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30, poll_interval=0.1):
+        self.__failure_threshold = failure_threshold
+        self.__reset_timeout = reset_timeout
+        self.__poll_interval = poll_interval
+        self.__failures = 0
+        self.__opened_at = None
+        self.__trial_running = False
+        self.__failed_trials = 0
+        self.__lock = threading.Condition()
+
+    def get_state(self):
+        with self.__lock:
+            if self.__opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.__opened_at >= self.__reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def before_call(self, cancel_token=None):
+        """
+            Waits while the circuit is open: until reset_timeout has passed, then for the trial call, which is
+            the first one to get there. Returns whether the call is the trial.
+            Raises CircuitOpenError when the trial failed, CancelledError when cancel_token is cancelled.
+        """
+        with self.__lock:
+            failed_trials = self.__failed_trials
+            while self.__opened_at is not None:
+                if self.__failed_trials != failed_trials:
+                    raise CircuitOpenError('Transcription API is failing, the trial request after a pause failed too')
+                remaining = self.__reset_timeout - (time.monotonic() - self.__opened_at)
+                if remaining <= 0 and not self.__trial_running:
+                    self.__trial_running = True
+                    return True
+                # Woken up when the trial is over, polled for the reset and the cancellation
+                self.__lock.wait(min(remaining, self.__poll_interval) if remaining > 0 else self.__poll_interval)
+                check(cancel_token)
+            return False
+
+    def on_success(self):
+        with self.__lock:
+            self.__failures = 0
+            self.__opened_at = None
+            self.__trial_running = False
+            self.__lock.notify_all()
+
+    def on_cancel(self, trial):
+        # Says nothing about the API, the next call can be the trial
+        if trial:
+            with self.__lock:
+                self.__trial_running = False
+                self.__lock.notify_all()
+
+    def on_failure(self):
+        with self.__lock:
+            self.__failures += 1
+            if self.__trial_running:
+                self.__failed_trials += 1
+            if self.__trial_running or self.__failures >= self.__failure_threshold:
+                self.__opened_at = time.monotonic()
+            self.__trial_running = False
+            self.__lock.notify_all()
+
+
+class ResiliencePolicy:
+    """
+        Calls a function with rate limiting, a circuit breaker and retries (exponential backoff with full jitter).
+
+        One policy is meant to be shared by every worker thread sending requests to the same API,
+        so the rate limit and the breaker see all of the traffic. requests_per_minute (None for no limit)
+        should be the limit of the organization the API key belongs to.
+        timeout is not enforced here, the caller passes it to the request (see timeout property).
+        The waits between attempts end with CancelledError when cancel_token is cancelled.
+        While the circuit is open the calls wait for its trial call, every trial which fails counts as
+        an attempt of each of them.
+    """
+    def __init__(self, max_retries=5, base_delay=1, max_delay=60, requests_per_minute=REQUESTS_PER_MINUTE,
+                 timeout=600, failure_threshold=5, reset_timeout=30):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.__bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.__breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.__lock = threading.Lock()
+        self.stats = {'calls': 0, 'retries': 0, 'failures': 0, 'rate_limited_seconds': 0.0}
+
+    def get_circuit_breaker(self):
+        return self.__breaker
+
+    def __count(self, key, value=1):
+        with self.__lock:
+            self.stats[key] += value
+
+    def get_delay(self, attempt, e=None):
+        retry_after = get_retry_after(e) if e else None
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, fn, *args, cancel_token=None, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            check(cancel_token)
+            try:
+                trial = self.__breaker.before_call(cancel_token)
+            except CircuitOpenError:
+                if attempt == self.max_retries:
+                    raise
+                # Waiting for the next trial
+                self.__count('retries')
+                continue
+            try:
+                # After the breaker, the calls which waited for it don't all go at once
+                if self.__bucket:
+                    self.__count('rate_limited_seconds', self.__bucket.acquire(cancel_token))
+                self.__count('calls')
+                result = fn(*args, **kwargs)
+            except CancelledError:
+                self.__breaker.on_cancel(trial)
+                raise
+            except Exception as e:
+                if not is_transient_error(e):
+                    # The API answered, retrying won't help but the breaker doesn't need to trip either
+                    self.__breaker.on_success()
+                    raise
+                self.__breaker.on_failure()
+                self.__count('failures')
+                if attempt == self.max_retries:
+                    raise
+                self.__count('retries')
+                sleep(self.get_delay(attempt, e), cancel_token)
+            else:
+                self.__breaker.on_success()
+                return result
@@ -0,0 +1,201 @@
+import contextlib
+import itertools
+import os
+import queue
+import threading
+
+from cancellation import CancellationToken, CancelledError, acquire
+from metrics import Metrics
+from script import install_audio
+from segments import SegmentStore
+
+# Statuses of a job, in the order a job goes through them
+QUEUED = 'queued'
+DOWNLOADING = 'downloading'
+TRIMMING = 'trimming'
+TRANSCRIBING = 'transcribing'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+def is_url(source):
+    return source.startswith(('http://', 'https://', 'www.', 'youtu'))
+
+
+class Job:
+    """
+        One file or URL to transcribe, and how far it got.
+
+        store (segments.SegmentStore) fills up chunk by chunk (see GPTTranscribeWrapper.iter_transcribe_audio),
+        languages has the language of every chunk and duration their total.
+        error is set when the status is FAILED. cancel_token stops this job alone (JobScheduler.cancel).
+        metrics (metrics.Metrics) times every stage of the job.
+        transcribe_kwargs override the scheduler's for this job (see JobScheduler.add).
+    """
+    _ids = itertools.count(1)
+
+    def __init__(self, source, transcribe_kwargs=None):
+        self.id = next(self._ids)
+        self.source = source
+        self.transcribe_kwargs = transcribe_kwargs or {}
+        self.filename = None if is_url(source) else source
+        self.status = QUEUED
+        self.done = 0
+        self.total = 0
+        self.store = SegmentStore()
+        self.languages = []
+        self.duration = 0
+        self.error = None
+        self.cancel_token = CancellationToken()
+        self.metrics = Metrics()
+
+    def is_finished(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    def __repr__(self):
+        progress = f' {self.done}/{self.total}' if self.total else ''
+        return f'<Job #{self.id} {self.status}{progress} {self.source}>'
+
+
+class JobScheduler:
+    """
+        Transcribes many files and URLs, max_jobs of them at the same time.
+
+        max_concurrency caps the work of all jobs together: every download, trim and chunk request
+        takes one of its slots while it runs, so a job stuck downloading doesn't stop the others
+        from using the slots it doesn't need. trim(filename, cancel_token=None, metrics=None) -> filename
+        is run on downloaded files (remove_trim in the GUI). transcribe_kwargs go to iter_transcribe_audio.
+        Each job has a cancellation token and metrics of its own which are passed to everything it runs.
+
+        on_update(job) is called from the scheduler threads every time a job changes.
+    """
+    def __init__(self, wrapper, max_concurrency=4, max_jobs=None, trim=None, on_update=None, **transcribe_kwargs):
+        self.__wrapper = wrapper
+        self.__max_concurrency = max(1, max_concurrency)
+        self.__max_jobs = max(1, max_jobs or self.__max_concurrency)
+        self.__slots = threading.BoundedSemaphore(self.__max_concurrency)
+        self.__trim = trim
+        self.__on_update = on_update
+        self.__transcribe_kwargs = transcribe_kwargs
+        self.__transcribe_kwargs.setdefault('resume', True)
+        self.__jobs = []
+        self.__queue = queue.Queue()
+        self.__threads = []
+        self.__stop_event = threading.Event()
+        self.__lock = threading.Lock()
+
+    def get_jobs(self):
+        with self.__lock:
+            return list(self.__jobs)
+
+    def add(self, source, **transcribe_kwargs):
+        """
+            Queues a file or a URL, the job starts as soon as one of the max_jobs job threads is free.
+            transcribe_kwargs (timestamp_granularities, trim_intro_outro, ...) replace the scheduler's for this job.
+        """
+        job = Job(source, transcribe_kwargs)
+        with self.__lock:
+            self.__jobs.append(job)
+            self.__stop_event.clear()
+            # Queued under the lock, so a job thread which is about to leave sees it
+            self.__queue.put(job)
+            if len(self.__threads) < self.__max_jobs:
+                thread = threading.Thread(target=self.__run, daemon=True)
+                self.__threads.append(thread)
+                thread.start()
+        self.__update(job)
+        return job
+
+    def add_directory(self, dirname, exts=('.mp3', '.mp4', '.m4a', '.wav', '.webm', '.ogg', '.flac'),
+                      **transcribe_kwargs):
+        return [self.add(os.path.join(dirname, filename), **transcribe_kwargs) for filename in sorted(os.listdir(dirname))
+                if filename.lower().endswith(exts) and not filename.startswith('split_audio_')]
+
+    def stop(self):
+        """
+            Cancels every job, running ones stop right away (their finished chunks are kept to resume them).
+        """
+        self.__stop_event.set()
+        for job in self.get_jobs():
+            job.cancel_token.cancel()
+
+    def cancel(self, job_id):
+        """
+            Cancels one job, queued or running, the others go on.
+        """
+        for job in self.get_jobs():
+            if job.id == job_id:
+                job.cancel_token.cancel()
+
+    def wait(self):
+        """
+            Blocks until every job added so far is finished.
+        """
+        self.__queue.join()
+
+    def __update(self, job, status=None):
+        if status:
+            job.status = status
+        if self.__on_update:
+            self.__on_update(job)
+
+    def __run(self):
+        while True:
+            try:
+                job = self.__queue.get(timeout=1)
+            except queue.Empty:
+                with self.__lock:
+                    # Leave for good only when nothing was queued in the meantime
+                    if self.__queue.empty():
+                        self.__threads.remove(threading.current_thread())
+                        return
+                continue
+            try:
+                if self.__stop_event.is_set() or job.cancel_token.is_cancelled():
+                    self.__update(job, CANCELLED)
+                else:
+                    self.__process(job)
+            except CancelledError:
+                self.__update(job, CANCELLED)
+            except Exception as e:
+                job.error = e
+                self.__update(job, FAILED)
+            finally:
+                self.__queue.task_done()
+
+    @contextlib.contextmanager
+    def __slot(self, job):
+        # Waiting for a slot ends when the job is cancelled too
+        acquire(self.__slots, job.cancel_token)
+        try:
+            yield
+        finally:
+            self.__slots.release()
+
+    def __process(self, job):
+        if job.filename is None:
+            self.__update(job, DOWNLOADING)
+            with self.__slot(job):
+                job.filename = install_audio(job.source, cancel_token=job.cancel_token, metrics=job.metrics)
+            if self.__trim:
+                self.__update(job, TRIMMING)
+                with self.__slot(job):
+                    job.filename = self.__trim(job.filename, cancel_token=job.cancel_token, metrics=job.metrics)
+
+        self.__update(job, TRANSCRIBING)
+        # Cancelling the job's token stops its workers, the finished chunks stay in the job manifest
+        chunks = self.__wrapper.iter_transcribe_audio(job.filename, max_workers=self.__max_concurrency,
+                                                      limiter=self.__slots, cancel_token=job.cancel_token,
+                                                      metrics=job.metrics,
+                                                      **dict(self.__transcribe_kwargs, **job.transcribe_kwargs))
+        try:
+            for i, total, result_obj in chunks:
+                job.store.extend(result_obj['segments'], result_obj.get('words', ()))
+                job.languages.append(result_obj['language'])
+                job.duration += result_obj['duration']
+                job.done, job.total = i + 1, total
+                self.__update(job)
+        finally:
+            chunks.close()
+        self.__update(job, DONE)
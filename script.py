@@ -1,59 +1,496 @@
+import contextlib
 import os
-import requests
+import queue
+import re
 import subprocess
+import threading
+import time
 from pathlib import Path
 
-ffmpeg_path = 'ffmpeg/ffmpeg.exe'
-os.environ["PATH"] += os.pathsep + os.path.join(os.path.dirname(__file__), os.path.dirname(ffmpeg_path))
+from backends import OpenAIBackend
+from cache import DB_URL, TranscriptionCache
+from cancellation import CancelledError, acquire, call, check, run_process
+from checkpoint import JobManifest
+from download import MIN_SPEECH_BITRATE, RangedDownloader, StreamingDownload, select_audio_stream
+from encoding import (DEFAULT_ENCODING, ENCODING_PROFILES, PIPE_FORMATS, STREAM_COPY_CODECS, choose_encoding,
+                      get_chunk_ext, get_ffmpeg)
+from metrics import DECODE, DOWNLOAD, ENCODE, SPLIT, TRANSCRIBE, TRIM, RequestTimer, measure
+from resilience import ResiliencePolicy
+from transport import get_client, get_httpx, observe_requests
+from workspace import ChunkBuffer, JobWorkspace, get_chunk_path, get_chunk_size, remove_chunk
 
-from openai import OpenAI
-from pydub import AudioSegment
-from pytube import YouTube
+
+def get_audio_info(audio_file_path):
+    """
+        Returns the duration (ms), sample rate, codec and bitrate (bits/s, None if unknown)
+        of the first audio stream without decoding it.
+
+        ffprobe isn't bundled with the app, so these are read from the header ffmpeg prints.
+    """
+    result = subprocess.run([get_ffmpeg(), '-hide_banner', '-i', audio_file_path], capture_output=True, text=True,
+                            encoding='utf-8', errors='replace')
+    duration_match = re.search(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)', result.stderr)
+    stream_match = re.search(r'Audio: (\w+).*?(\d+) Hz', result.stderr)
+    if not duration_match or not stream_match:
+        raise ValueError(f'Could not read the duration of {audio_file_path}')
+    # Some codecs (opus) have no bitrate of their own, the container's is the closest guess then
+    bitrate_match = (re.search(r'Audio: .*?(\d+) kb/s', result.stderr)
+                     or re.search(r'Duration: .*?bitrate: (\d+) kb/s', result.stderr))
+    hours, minutes, seconds = duration_match.groups()
+    return {
+        'duration': int(round((int(hours) * 3600 + int(minutes) * 60 + float(seconds)) * 1000)),
+        'sample_rate': int(stream_match.group(2)),
+        'codec': stream_match.group(1),
+        'bitrate': int(bitrate_match.group(1)) * 1000 if bitrate_match else None,
+    }
+
+
+def get_audio_duration(audio_file_path):
+    """
+        Returns the duration of the audio in milliseconds without decoding it.
+    """
+    return get_audio_info(audio_file_path)['duration']
 
 
-def split_the_audio(audio_file_path, split_duration=600000):
-    audio = AudioSegment.from_file(audio_file_path)
-    split_audio = []
-    dirname = Path(audio_file_path).parent
-    for i, j in enumerate(range(0, len(audio), split_duration)):
-        _audio = audio[j:j + split_duration]
-        filename = os.path.join(dirname, f'split_audio_{i}.mp3')
-        _audio.export(filename, format='mp3')
-        split_audio.append(filename)
+def cut_the_audio(audio_file_path, dst_filename, start, duration, encoding='copy', cancel_token=None,
+                  in_memory=False):
+    """
+        Cuts [start, start + duration) milliseconds of the audio into dst_filename.
+
+        ffmpeg seeks in the input instead of decoding everything before start. With encoding='copy' the audio
+        stream is copied when the container allows it, otherwise the chunk alone is re-encoded
+        with encoding (one of encoding.ENCODING_PROFILES, DEFAULT_ENCODING when copying fails).
+        A copied chunk starts on a packet of the source, up to one codec frame (~20ms) off start,
+        a re-encoded one starts exactly at start.
+        Cancelling cancel_token kills ffmpeg, the unfinished chunk is removed.
+        With in_memory, a chunk whose format can be written to a pipe (see encoding.PIPE_FORMATS) is read
+        from ffmpeg's stdout into a workspace.ChunkBuffer named dst_filename, and no file is written.
+
+        Returns:
+            str: Path to the chunk (the extension changes to the profile's when it had to be re-encoded),
+            or the ChunkBuffer.
+    """
+    command = [get_ffmpeg(), '-y', '-v', 'error', '-ss', f'{start / 1000:.6f}', '-i', audio_file_path,
+               '-t', f'{duration / 1000:.6f}', '-vn', '-map', '0:a:0']
+
+    def run(codec_args):
+        pipe_args = PIPE_FORMATS.get(os.path.splitext(dst_filename)[1]) if in_memory else None
+        if pipe_args:
+            return ChunkBuffer(dst_filename, run_process(command + codec_args + pipe_args + ['pipe:1'],
+                                                         cancel_token).stdout)
+        run_process(command + codec_args + [dst_filename], cancel_token)
+        return dst_filename
+
+    try:
+        if encoding == 'copy':
+            try:
+                return run(['-c:a', 'copy'])
+            except subprocess.CalledProcessError:
+                Path(dst_filename).unlink(missing_ok=True)
+            encoding = DEFAULT_ENCODING
+        profile = ENCODING_PROFILES[encoding]
+        dst_filename = os.path.splitext(dst_filename)[0] + profile['ext']
+        return run(profile['args'])
+    except CancelledError:
+        Path(dst_filename).unlink(missing_ok=True)
+        raise
+
+
+def trim_the_audio(audio_file_path, start=None, end=None, dst_filename=None, keep_video=False, cancel_token=None):
+    """
+        Writes [start, end) milliseconds of the audio (to the end without end) into dst_filename,
+        '<name>(filtered)<ext>' next to the source by default.
+
+        Nothing is decoded: the audio stream is copied, with keep_video the video stream too. When the container
+        can't take the copied streams, the audio alone is extracted (re-encoded only if copying fails).
+        Without start and end there is nothing to trim, the source itself is returned and no file is written.
+        To transcribe a part of a file, pass start/end to iter_transcribe_audio instead, which skips this copy.
+
+        Returns:
+            str: Path to the trimmed file.
+    """
+    if not start and not end:
+        return audio_file_path
+    start = start or 0
+    base_filename, ext = os.path.splitext(os.path.basename(audio_file_path))
+    dst_filename = dst_filename or os.path.join(os.path.dirname(audio_file_path), f'{base_filename}(filtered){ext}')
+    command = [get_ffmpeg(), '-y', '-v', 'error', '-ss', f'{start / 1000:.6f}', '-i', audio_file_path]
+    if end:
+        command += ['-t', f'{(end - start) / 1000:.6f}']
+    try:
+        maps = ['-map', '0:v:0?', '-map', '0:a:0'] if keep_video else ['-vn', '-map', '0:a:0']
+        run_process(command + maps + ['-c', 'copy', dst_filename], cancel_token)
+        return dst_filename
+    except (subprocess.CalledProcessError, CancelledError) as e:
+        Path(dst_filename).unlink(missing_ok=True)
+        if isinstance(e, CancelledError):
+            raise
+    # The audio alone, in a container which takes its codec
+    info = get_audio_info(audio_file_path)
+    dst_filename = os.path.splitext(dst_filename)[0] + STREAM_COPY_CODECS.get(info['codec'], '.mka')
+    return cut_the_audio(audio_file_path, dst_filename, start, (end or info['duration']) - start,
+                         cancel_token=cancel_token)
+
+
+def plan_chunks(duration, split_duration=600000):
+    """
+        Returns (start, length) in milliseconds of every chunk of an audio which is duration milliseconds long.
+    """
+    return [(j, min(split_duration, duration - j)) for j in range(0, duration, split_duration)]
+
+
+def make_chunk(i, start, length, sample_rate):
+    """
+        Returns the chunk index entry (see index_chunks) of chunk i, None if it holds no sample.
+    """
+    start_sample = round(start * sample_rate / 1000)
+    end_sample = round((start + length) * sample_rate / 1000)
+    if end_sample <= start_sample:
+        return None
+    return {
+        'index': i,
+        'start_sample': start_sample,
+        'end_sample': end_sample,
+        'sample_rate': sample_rate,
+        'start': start_sample * 1000 / sample_rate,
+        'end': end_sample * 1000 / sample_rate,
+    }
+
+
+def index_chunks(chunk_ranges, sample_rate):
+    """
+        Turns (start, length) milliseconds into the chunk index: for every chunk its exact start and end
+        in samples of the source, and the same positions in milliseconds.
+
+        Offsets of the transcribed segments come from start_sample / sample_rate of this index,
+        never from what the API returned for the previous chunk.
+    """
+    chunk_index = []
+    for start, length in chunk_ranges:
+        chunk = make_chunk(len(chunk_index), start, length, sample_rate)
+        if chunk:
+            chunk_index.append(chunk)
+    return chunk_index
+
+
+def get_chunk_offset(chunk):
+    """
+        Returns the start of the chunk in seconds, which is added to the times of its segments.
+    """
+    return chunk['start_sample'] / chunk['sample_rate']
+
+
+def get_chunk_filename(audio_file_path, i, info, encoding='copy', dst_dir=None):
+    # The source's name keeps the chunks of files apart when they are split into the same folder
+    audio_file_path = Path(audio_file_path)
+    return os.path.join(dst_dir or audio_file_path.parent,
+                        f'split_audio_{audio_file_path.stem}_{i}{get_chunk_ext(info, encoding)}')
+
+
+def get_planned_range(info, start=0, end=None):
+    # The part of the audio (ms) start and end leave, within the audio
+    return max(0, start or 0), min(end or info['duration'], info['duration'])
+
+
+def count_chunks(info, split_duration=600000, drop_silence=None, start=0, end=None):
+    """
+        Returns how many chunks plan_the_audio makes, None with drop_silence (only planning tells then).
+    """
+    if drop_silence:
+        return None
+    start, end = get_planned_range(info, start, end)
+    return max(0, -(-(end - start) // split_duration))
+
+
+def plan_chunks_at_pauses(audio_file_path, split_duration=600000, start=0, end=None, search_window=30000,
+                          cancel_token=None, metrics=None):
+    """
+        Yields (start, length) in milliseconds of every chunk of the audio from start to end, cut at the quietest
+        point near each split_duration boundary (see analysis.get_search_range). Only the search window
+        of the chunk being planned is decoded (timed as metrics.DECODE), when the chunk is asked for.
+    """
+    from analysis import find_quietest_point, get_search_range
+
+    cut = start
+    while end - cut > split_duration:
+        earliest, latest = get_search_range(cut, end, split_duration, search_window)
+        boundary = latest
+        if latest > earliest:
+            with measure(metrics, DECODE):
+                boundary = find_quietest_point(audio_file_path, earliest, latest - earliest, cancel_token=cancel_token)
+        yield cut, boundary - cut
+        cut = boundary
+    yield cut, end - cut
+
+
+def iter_plan_the_audio(audio_file_path, split_duration=600000, info=None, silence_aware=True, drop_silence=None,
+                        start=0, end=None, cancel_token=None, metrics=None):
+    """
+        Yields the chunk index entries of plan_the_audio one by one. Unless drop_silence is given, each chunk
+        is planned only when it's asked for, so the first one can be cut before the rest of the audio is decoded.
+    """
+    info = info or get_audio_info(audio_file_path)
+    start, end = get_planned_range(info, start, end)
+    if end <= start:
+        return
+    if silence_aware and not drop_silence:
+        chunk_ranges = plan_chunks_at_pauses(audio_file_path, split_duration, start, end, cancel_token=cancel_token,
+                                             metrics=metrics)
+    elif silence_aware:
+        # numpy is only loaded when it's needed
+        from analysis import get_frame_energy, plan_chunks_by_silence
+        with measure(metrics, DECODE):
+            energy_db = get_frame_energy(audio_file_path, start=start or None,
+                                         duration=end - start if end < info['duration'] else None,
+                                         cancel_token=cancel_token)
+        chunk_ranges = [(start + chunk_start, length) for chunk_start, length
+                        in plan_chunks_by_silence(energy_db, split_duration, end - start, drop_silence=drop_silence)]
+    else:
+        chunk_ranges = [(start + chunk_start, length)
+                        for chunk_start, length in plan_chunks(end - start, split_duration)]
+    i = 0
+    for chunk_start, length in chunk_ranges:
+        chunk = make_chunk(i, chunk_start, length, info['sample_rate'])
+        if chunk:
+            yield chunk
+            i += 1
+
+
+def plan_the_audio(audio_file_path, split_duration=600000, info=None, silence_aware=True, drop_silence=None,
+                   start=0, end=None, cancel_token=None):
+    """
+        Returns the chunk index (see index_chunks) of the chunks the audio is going to be split into.
+
+        With silence_aware, chunks are cut at pauses near every split_duration boundary instead of exactly on it,
+        into as many chunks as cutting exactly would make (see count_chunks). Only the audio around each boundary
+        is decoded (see plan_chunks_at_pauses), unless silences longer than drop_silence (ms) are to be skipped:
+        the whole audio is decoded to find them then (see analysis.plan_chunks_by_silence).
+        start and end (ms) trim the audio: only that part is planned (and decoded), chunk positions stay
+        the positions in the whole audio, so no trimmed copy of the file is needed.
+        info (see get_audio_info) can be given when the caller already has it.
+    """
+    return list(iter_plan_the_audio(audio_file_path, split_duration, info, silence_aware, drop_silence, start, end,
+                                    cancel_token))
+
+
+def split_the_audio(audio_file_path, split_duration=600000, info=None, silence_aware=True, drop_silence=None,
+                    exact_cuts=False, encoding='auto', start=0, end=None, cancel_token=None, dst_dir=None):
+    """
+        Yields the chunk files of the audio one by one, each at most split_duration milliseconds long.
+        They are written into dst_dir, or into a workspace.JobWorkspace of their own which is removed
+        with the chunks left in it once the generator is done.
+
+        Every chunk is cut only when it is requested, so the caller can upload a chunk while the next one is cut,
+        and memory stays flat no matter how long the audio is. The chunk index from plan_the_audio tells
+        where each of them starts, it's planned as the chunks are cut (see iter_plan_the_audio).
+        encoding picks how the chunks are encoded (see encoding.choose_encoding),
+        chunks get shorter than split_duration only if they wouldn't fit in the upload limit otherwise.
+    """
+    info = info or get_audio_info(audio_file_path)
+    encoding, split_duration = choose_encoding(info, split_duration, encoding, exact_cuts)
+    with contextlib.nullcontext() if dst_dir else JobWorkspace() as workspace:
+        for chunk in iter_plan_the_audio(audio_file_path, split_duration, info, silence_aware, drop_silence, start,
+                                         end, cancel_token):
+            yield cut_the_audio(audio_file_path,
+                                get_chunk_filename(audio_file_path, chunk['index'], info, encoding,
+                                                   dst_dir or workspace.get_path()),
+                                chunk['start'], chunk['end'] - chunk['start'], encoding, cancel_token)
+
+
+def plan_chunks_while_downloading(download, split_duration=600000, search_window=30000, cancel_token=None,
+                                  metrics=None):
+    """
+        Yields (start, length) in milliseconds of every chunk of a download.StreamingDownload as soon as
+        the audio of the chunk is downloaded, cutting at the quietest point of the search_window milliseconds
+        before each split_duration boundary (only that part is decoded, timed as metrics.DECODE).
+    """
+    from analysis import find_quietest_point
+
+    audio_file_path = download.get_filename()
+    window = min(search_window, split_duration // 2)
+    cut = 0
+    while True:
+        end = cut + split_duration
+        download.wait_for_time(end)
+        if not download.is_finished() and end >= (download.get_duration() or 0):
+            # The site's duration is rounded, only the whole file tells if this is the last chunk
+            download.wait()
+        if download.is_finished():
+            duration = get_audio_duration(audio_file_path)
+            if end >= duration:
+                if duration > cut:
+                    yield cut, duration - cut
+                return
+        with measure(metrics, DECODE):
+            boundary = find_quietest_point(audio_file_path, end - window, window, cancel_token=cancel_token)
+        yield cut, boundary - cut
+        cut = boundary
+
+
+class ChunkTranscriptionError(Exception):
+    """
+        Raised when some chunks of the audio could not be transcribed.
+
+        result_obj_lst keeps the chunks which succeeded (None for failed ones, in chunk order),
+        failures maps the failed chunk index to its exception.
+    """
+    def __init__(self, result_obj_lst, failures):
+        super().__init__(f'{len(failures)} of {len(result_obj_lst)} chunks failed: '
+                         + ', '.join(f'#{i} ({e})' for i, e in failures.items()))
+        self.result_obj_lst = result_obj_lst
+        self.failures = failures
 
-    return split_audio
 
 class GPTTranscribeWrapper:
-    def __init__(self, api_key=None, db_url='sqlite:///conv.db'):
+    def __init__(self, api_key=None, db_url=DB_URL, base_url=None, resilience=None, backend=None):
         super().__init__()
-        self._client = None
+        # Retries, rate limit, timeout and circuit breaker shared by every chunk request
+        self._resilience = resilience or ResiliencePolicy()
+        # base_url is only needed to point the client at a compatible (or mock) server
+        self._api_backend = OpenAIBackend(self._resilience, base_url)
+        # Chunks go to the API unless another backend (e.g. backends.LocalWhisperBackend) is given
+        self._backend = backend or self._api_backend
         # Initialize OpenAI client
         self._is_available = True if api_key else False
         if api_key and self._is_available:
             self.set_api(api_key)
-        # self._db_handler = ''
-        # self.init_db(db_url)
+        # Chunks which were already transcribed with the same parameters are read from here, pass None to disable
+        self._cache = TranscriptionCache(db_url) if db_url else None
 
     def is_available(self):
-        return self._is_available
+        # A local backend doesn't need an API key
+        return self._is_available or self._backend is not self._api_backend
 
     def set_api(self, api_key):
+        # Without checking it, see request_and_set_api
+        self._is_available = bool(api_key)
         self._api_key = api_key
-        self._client = OpenAI(api_key=api_key)
+        self._api_backend.set_api_key(api_key)
         os.environ['OPENAI_API_KEY'] = api_key
 
-    def request_and_set_api(self, api_key):
+    def get_backend(self):
+        return self._backend
+
+    def set_backend(self, backend=None):
+        """
+            Switches the backend of the next jobs, None goes back to the API.
+        """
+        self._backend = backend or self._api_backend
+
+    def request_and_set_api(self, api_key, timeout=5):
+        """
+            Checks the key with a request to the API (the list of models) and sets it if it's valid.
+
+            Returns:
+                bool: Whether the key is valid, None when the API couldn't tell in timeout seconds
+                (no network, server errors), the key isn't set then.
+        """
+        # The client's own default, so a key for a compatible server is checked against that server
+        base_url = self._api_backend.get_base_url()
         try:
-            response = requests.get('https://api.openai.com/v1/models', headers={'Authorization': f'Bearer {api_key}'})
-            self._is_available = response.status_code == 200
-            if self._is_available:
-                self.set_api(api_key)
-            return self._is_available
-        except Exception as e:
-            print(e)
+            # Over the connection the transcriptions are going to use
+            response = get_client().get(f'{base_url.rstrip("/")}/models',
+                                        headers={'Authorization': f'Bearer {api_key}'}, timeout=timeout)
+        except get_httpx().HTTPError:
+            return None
+        if response.status_code in (401, 403):
+            self._is_available = False
             return False
-
-    def transcribe_audio(self, audio_file_path, model='whisper-1', response_format=None, timestamp_granularities=None):
+        if response.status_code != 200:
+            return None
+        self.set_api(api_key)
+        return True
+
+    def get_cache(self):
+        return self._cache
+
+    def get_resilience(self):
+        return self._resilience
+
+    def _transcribe_chunk(self, chunk_file, offset, args, cancel_token=None, metrics=None, index=None):
+        # chunk_file is a path or a workspace.ChunkBuffer, index is the chunk's for metrics
+        key = None
+        chunk_result_obj = None
+        if self._cache:
+            key = self._cache.make_key(chunk_file, dict(args, **self._backend.get_params()))
+            chunk_result_obj = self._cache.get(key)
+            if chunk_result_obj is not None and metrics:
+                metrics.count('cache_hits', chunk=index)
+        if chunk_result_obj is None:
+            # Segment times are relative to the start of the chunk here
+            # Given up on right away when cancelled: the upload is aborted, but a chunk which is already uploaded
+            # is transcribed (and billed) anyway, its result is cached when it arrives for the next run
+            chunk_result_obj = call(self.__transcribe_and_cache, chunk_file, args, key, cancel_token, metrics, index,
+                                    cancel_token=cancel_token)
+
+        result_obj = {
+            'language': chunk_result_obj['language'],
+            'duration': chunk_result_obj['duration'],
+            'segments': [],
+        }
+        for segment in chunk_result_obj['segments']:
+            # segment['start'], segment['end'] should be 0.00 format
+            segment_obj = {
+                'start': round(segment['start'] + offset, 2),
+                'end': round(segment['end'] + offset, 2),
+                'text': segment['text']
+            }
+            result_obj['segments'].append(segment_obj)
+        if 'words' in chunk_result_obj:
+            result_obj['words'] = [{
+                'start': round(word['start'] + offset, 2),
+                'end': round(word['end'] + offset, 2),
+                'word': word['word']
+            } for word in chunk_result_obj['words']]
+        remove_chunk(chunk_file)
+        return result_obj
+
+    def __transcribe_and_cache(self, chunk_file, args, key, cancel_token, metrics, index):
+        if metrics:
+            chunk_result_obj = self.__transcribe_measured(chunk_file, args, cancel_token, metrics, index)
+        else:
+            chunk_result_obj = self._backend.transcribe(chunk_file, args, cancel_token)
+        if key:
+            self._cache.set(key, chunk_result_obj)
+        return chunk_result_obj
+
+    def __transcribe_measured(self, chunk_file, args, cancel_token, metrics, index):
+        # The requests are seen from the thread which sends them
+        timer = RequestTimer(metrics, index)
+        began = time.perf_counter()
+        try:
+            with observe_requests(timer):
+                return self._backend.transcribe(chunk_file, args, cancel_token)
+        finally:
+            if timer.requests:
+                metrics.count('requests', timer.requests, index)
+                metrics.count('retries', timer.requests - 1, index)
+            else:
+                # Not sent anywhere, transcribed on this machine
+                metrics.add(TRANSCRIBE, time.perf_counter() - began, get_chunk_size(chunk_file), index)
+
+    def get_job_manifest(self, audio_file_path, model='whisper-1', response_format=None,
+                         timestamp_granularities=None, split_duration=600000, silence_aware=True, drop_silence=None,
+                         exact_cuts=False, encoding='auto', start=0, end=None, trim_intro_outro=False):
+        """
+            Returns the checkpoint of transcribing the audio with these parameters, check exists() to see
+            if there is an unfinished job to resume.
+        """
+        params = self._make_args(model, response_format, timestamp_granularities)
+        params['split_duration'] = split_duration
+        params['silence_aware'] = silence_aware
+        params['drop_silence'] = drop_silence
+        params['exact_cuts'] = exact_cuts
+        params['encoding'] = encoding
+        # Only for trimmed jobs, so manifests of whole files written before trimming existed still match
+        if start or end:
+            params['trim'] = [start, end]
+        elif trim_intro_outro:
+            params['trim_intro_outro'] = True
+        params.update(self._backend.get_params())
+        return JobManifest(audio_file_path, params)
+
+    def _make_args(self, model='whisper-1', response_format=None, timestamp_granularities=None):
         args = {
             'model': model,
         }
@@ -62,133 +499,406 @@ class GPTTranscribeWrapper:
             args['response_format'] = response_format
         if timestamp_granularities:
             args['timestamp_granularities'] = timestamp_granularities
+        return args
+
+    def iter_transcribe_audio(self, audio_file_path, model='whisper-1', response_format=None,
+                              timestamp_granularities=None, max_workers=1, split_duration=600000, queue_size=None,
+                              on_chunk_cut=None, resume=False, silence_aware=True, drop_silence=None,
+                              exact_cuts=False, encoding='auto', limiter=None, start=0, end=None,
+                              trim_intro_outro=False, cancel_token=None, in_memory=True, metrics=None):
+        """
+            Transcribes the audio as a pipeline and yields (index, total, result_obj) for each chunk in chunk order.
+
+            A producer thread cuts the chunks into a bounded queue (queue_size, max_workers by default),
+            max_workers threads transcribe them, and this generator hands the results over as soon as
+            the next one in order is ready. The producer waits while the queue is full, so at most
+            queue_size + max_workers + 1 chunks exist at any moment.
+
+            Chunks are written into a workspace.JobWorkspace of the job's own (on tmpfs when there is one),
+            removed when the job ends. With in_memory, chunks are handed to a backend which takes them
+            (accepts_buffers) straight from ffmpeg's stdout without being written at all, when their format
+            allows it (see cut_the_audio).
+
+            Chunks are planned with plan_the_audio (silence_aware, drop_silence), each chunk's segments
+            are shifted by the chunk's start in the chunk index. exact_cuts re-encodes the chunks
+            so they start on the exact sample instead of the nearest packet (sources whose codec
+            can't be copied safely are always re-encoded). encoding is 'copy', 'auto' or one of
+            encoding.ENCODING_PROFILES, 'auto' picks the smallest change which keeps every chunk
+            under the upload limit (see encoding.choose_encoding).
+            start and end (ms) transcribe only that part of the audio, cut straight from the source file,
+            timestamps stay the times in the whole file. Without them, trim_intro_outro leaves out the music
+            or silence the audio begins and ends with (see analysis.find_speech_range).
+
+            Every finished chunk is checkpointed to the job manifest. With resume=True the chunks
+            the manifest already has are yielded from it without being cut or transcribed again.
+            The manifest is removed once every chunk is done.
+
+            Chunks are transcribed by the backend (the API unless set_backend was given another one).
+
+            on_chunk_cut(index, path) is called from the producer thread after each chunk is cut
+            (path is the chunk's name in the workspace for chunks kept in memory).
+            limiter (e.g. a semaphore shared by several jobs) is held while a chunk is transcribed.
+            If any chunk fails, ChunkTranscriptionError is raised after the others have been yielded.
+
+            Cancelling cancel_token raises CancelledError right away: ffmpeg is killed, the requests
+            being sent are given up on, the chunks waiting in the queue are dropped and every chunk file
+            is removed. The finished chunks stay in the manifest, so the job can be resumed.
+
+            Every stage (decoding, cutting, sending, waiting for the API) is timed in metrics (metrics.Metrics)
+            when given, per chunk too.
+        """
+        args = self._make_args(model, response_format, timestamp_granularities)
+
+        info = get_audio_info(audio_file_path)
+        manifest = self.get_job_manifest(audio_file_path, model, response_format, timestamp_granularities,
+                                         split_duration, silence_aware, drop_silence, exact_cuts, encoding, start, end,
+                                         trim_intro_outro)
+        if trim_intro_outro and not start and not end:
+            from analysis import find_speech_range
+            with measure(metrics, DECODE):
+                start, end = find_speech_range(audio_file_path, info['duration'], cancel_token=cancel_token)
+        encoding, split_duration = choose_encoding(info, split_duration, encoding, exact_cuts)
+        # Planned while the chunks are cut, but the whole audio has to be decoded first to drop its silences
+        chunks = iter_plan_the_audio(audio_file_path, split_duration, info, silence_aware, drop_silence, start, end,
+                                     cancel_token, metrics)
+        total = count_chunks(info, split_duration, drop_silence if silence_aware else None, start, end)
+        if total is None:
+            chunks = list(chunks)
+            total = len(chunks)
+
+        finished = manifest.load() if resume else {}
+        manifest.start(total, resume)
+        in_memory = in_memory and self._backend.accepts_buffers
+
+        with JobWorkspace() as workspace:
+            def cut_chunk(chunk):
+                return cut_the_audio(
+                    audio_file_path, get_chunk_filename(audio_file_path, chunk['index'], info, encoding,
+                                                        workspace.get_path()),
+                    chunk['start'], chunk['end'] - chunk['start'], encoding, cancel_token, in_memory)
+
+            yield from self._iter_pipeline(chunks, cut_chunk, args, total, max_workers, queue_size,
+                                           on_chunk_cut, limiter, manifest, finished, cancel_token, metrics,
+                                           SPLIT if encoding == 'copy' else ENCODE)
+
+    def iter_transcribe_stream(self, download, model='whisper-1', response_format=None, timestamp_granularities=None,
+                               max_workers=1, split_duration=600000, queue_size=None, on_chunk_cut=None,
+                               exact_cuts=False, encoding='auto', limiter=None, search_window=30000, cancel_token=None,
+                               metrics=None):
+        """
+            Like iter_transcribe_audio, for a file which is still being downloaded (download.StreamingDownload):
+            every chunk is cut and sent as soon as its audio has arrived, so the download and the transcription
+            overlap. Chunks are cut at pauses (see plan_chunks_while_downloading).
+
+            total is estimated from the duration the site gave until the last chunk is cut.
+            Nothing is checkpointed, the chunks are cached as usual though. Chunks are always written
+            to the job's workspace, their duration tells whether they were cut before the audio arrived.
+            cancel_token should be the download's too, so that waiting for the download ends with it.
+        """
+        args = self._make_args(model, response_format, timestamp_granularities)
+
+        audio_file_path = download.get_filename()
+        # The header is enough to know the codec
+        download.wait_for_time(0)
+        info = get_audio_info(audio_file_path)
+        encoding, split_duration = choose_encoding(info, split_duration, encoding, exact_cuts)
+        duration = download.get_duration() or info['duration']
+
+        def iter_chunks():
+            i = 0
+            for start, length in plan_chunks_while_downloading(download, split_duration, search_window, cancel_token,
+                                                               metrics):
+                chunk = make_chunk(i, start, length, info['sample_rate'])
+                if chunk:
+                    yield chunk
+                    i += 1
+
+        with JobWorkspace() as workspace:
+            def cut_chunk(chunk):
+                length = chunk['end'] - chunk['start']
+                margin_factor = 1
+                while True:
+                    # A chunk cut from a file which is still downloading may end where the downloaded part ends
+                    was_finished = download.is_finished()
+                    result_audio_file_path = cut_the_audio(
+                        audio_file_path, get_chunk_filename(audio_file_path, chunk['index'], info, encoding,
+                                                            workspace.get_path()),
+                        chunk['start'], length, encoding, cancel_token)
+                    if was_finished or get_audio_duration(result_audio_file_path) >= length - 100:
+                        return result_audio_file_path
+                    margin_factor *= 4
+                    download.wait_for_time(chunk['end'], margin_factor)
+
+            yield from self._iter_pipeline(iter_chunks(), cut_chunk, args, -(-duration // split_duration),
+                                           max_workers, queue_size, on_chunk_cut, limiter, cancel_token=cancel_token,
+                                           metrics=metrics, cut_stage=SPLIT if encoding == 'copy' else ENCODE)
+
+    def _iter_pipeline(self, chunks, cut_chunk, args, total, max_workers=1, queue_size=None, on_chunk_cut=None,
+                       limiter=None, manifest=None, finished=None, cancel_token=None, metrics=None, cut_stage=SPLIT):
+        """
+            The pipeline of iter_transcribe_audio. chunks (chunk index entries, may be a generator which
+            takes its time) are cut with cut_chunk(chunk) -> path or workspace.ChunkBuffer by the producer thread,
+            timed as cut_stage (metrics.SPLIT or metrics.ENCODE).
+            The chunks of finished (chunk index -> result object) are skipped and handed over as they are.
+            total is replaced by the real chunk count once the producer went through all of them.
+        """
+        max_workers = max(1, max_workers)
+        finished = finished or {}
+        chunk_queue = queue.Queue(maxsize=queue_size or max_workers)
+        result_queue = queue.Queue()
+        stop_event = threading.Event()
+
+        def is_stopped():
+            return stop_event.is_set() or (cancel_token is not None and cancel_token.is_cancelled())
+
+        def put(q, item):
+            # Blocking put which gives up when the consumer went away
+            while not is_stopped():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                count = 0
+                for chunk in chunks:
+                    check(cancel_token)
+                    i = chunk['index']
+                    count = i + 1
+                    if i in finished:
+                        continue
+                    if metrics:
+                        metrics.set_chunk(i, start=chunk['start'], end=chunk['end'])
+                    with measure(metrics, cut_stage, i) as timing:
+                        chunk_file = cut_chunk(chunk)
+                        timing['bytes'] = get_chunk_size(chunk_file)
+                    if on_chunk_cut:
+                        on_chunk_cut(i, get_chunk_path(chunk_file))
+                    if not put(chunk_queue, (chunk, chunk_file)):
+                        remove_chunk(chunk_file)
+                        break
+                else:
+                    result_queue.put(('total', None, count))
+            except Exception as e:
+                result_queue.put(('error', None, e))
+            finally:
+                for _ in range(max_workers):
+                    put(chunk_queue, None)
+
+        def work():
+            while True:
+                try:
+                    item = chunk_queue.get(timeout=0.1)
+                except queue.Empty:
+                    if is_stopped():
+                        break
+                    continue
+                if item is None:
+                    break
+                chunk, chunk_file = item
+                if is_stopped():
+                    remove_chunk(chunk_file)
+                    continue
+                try:
+                    if limiter:
+                        acquire(limiter, cancel_token)
+                    try:
+                        result_obj = self._transcribe_chunk(chunk_file, get_chunk_offset(chunk), args,
+                                                            cancel_token, metrics, chunk['index'])
+                    finally:
+                        if limiter:
+                            limiter.release()
+                    result_queue.put(('done', chunk, result_obj))
+                except Exception as e:
+                    # A request given up on may still be reading it
+                    with contextlib.suppress(OSError):
+                        remove_chunk(chunk_file)
+                    result_queue.put(('failed', chunk, e))
+            result_queue.put(('exit', None, None))
+
+        threads = [threading.Thread(target=produce, daemon=True)]
+        threads += [threading.Thread(target=work, daemon=True) for _ in range(max_workers)]
+        for thread in threads:
+            thread.start()
 
         result_obj_lst = []
-        result_audio_file_paths = split_the_audio(audio_file_path)
-
-        next_starting_point = 0
-        for result_audio_file_path in result_audio_file_paths:
-            result_obj = {}
-            with open(result_audio_file_path, 'rb') as audio_file:
-                args['file'] = audio_file
-                # print(split_the_audio(audio_file_path))
-                # Get format of the file
-                # print(type(args['file']))
-
-                transcription = self._client.audio.transcriptions.create(
-                    **args,
-                )
-
-                segments = transcription.segments
-
-                language = transcription.language
-                result_obj['language'] = language
-
-                duration = transcription.duration
-                result_obj['duration'] = duration
-                result_obj['segments'] = []
-
-                for segment in segments:
-                    # segment['start'], segment['end'] should be 0.00 format
-                    segment_obj = {
-                        'start': round(segment['start']+next_starting_point, 2),
-                        'end': round(segment['end']+next_starting_point, 2),
-                        'text': segment['text']
-                    }
-                    result_obj['segments'].append(segment_obj)
-                next_starting_point = result_obj['segments'][-1]['end']
-            result_obj_lst.append(result_obj)
-            Path(result_audio_file_path).unlink(missing_ok=True)
+        failures = {}
+        # Chunks from the manifest are ready from the beginning
+        pending = {i: ('resumed', result_obj) for i, result_obj in finished.items()}
+        running_workers = max_workers
+        # Wakes the loop below up as soon as the job is cancelled
+        handle = cancel_token.on_cancel(lambda: result_queue.put(('cancelled', None, None))) if cancel_token else None
+        try:
+            while True:
+                # Hand over everything which is ready in chunk order
+                while len(result_obj_lst) in pending:
+                    next_index = len(result_obj_lst)
+                    kind, value = pending.pop(next_index)
+                    if kind == 'failed':
+                        result_obj_lst.append(None)
+                        failures[next_index] = value
+                    else:
+                        result_obj_lst.append(value)
+                        yield next_index, max(total, next_index + 1), value
+                if not running_workers:
+                    break
+                kind, chunk, value = result_queue.get()
+                check(cancel_token)
+                if kind == 'exit':
+                    running_workers -= 1
+                elif kind == 'total':
+                    total = value
+                elif kind == 'error':
+                    raise value
+                else:
+                    # Checkpoint right away, not when it's its turn to be handed over
+                    if kind == 'done' and manifest:
+                        manifest.save_chunk(chunk['index'], get_chunk_offset(chunk), value)
+                    pending[chunk['index']] = (kind, value)
+        finally:
+            stop_event.set()
+            if handle:
+                cancel_token.remove_callback(handle)
+            # Drop the chunks nobody is going to transcribe
+            while True:
+                try:
+                    item = chunk_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item:
+                    remove_chunk(item[1])
+        if failures:
+            raise ChunkTranscriptionError(result_obj_lst, failures)
+        if manifest:
+            manifest.remove()
+
+    def transcribe_audio(self, audio_file_path, model='whisper-1', response_format=None, timestamp_granularities=None,
+                         max_workers=1, split_duration=600000, resume=False, silence_aware=True, drop_silence=None,
+                         exact_cuts=False, encoding='auto', start=0, end=None, trim_intro_outro=False,
+                         cancel_token=None, metrics=None):
+        """
+            Splits the audio and transcribes the chunks, up to max_workers of them at the same time.
+
+            Results are returned in chunk order, each chunk's segments shifted by the chunk's start time.
+            If any chunk fails, ChunkTranscriptionError is raised after the others have finished;
+            run it again with resume=True to retry only the failed chunks.
+        """
+        result_audio_file_paths = []
+        result_obj_lst = [result_obj for _, _, result_obj in self.iter_transcribe_audio(
+            audio_file_path, model=model, response_format=response_format,
+            timestamp_granularities=timestamp_granularities, max_workers=max_workers, split_duration=split_duration,
+            on_chunk_cut=lambda i, path: result_audio_file_paths.append(path), resume=resume,
+            silence_aware=silence_aware, drop_silence=drop_silence, exact_cuts=exact_cuts, encoding=encoding,
+            start=start, end=end, trim_intro_outro=trim_intro_outro, cancel_token=cancel_token, metrics=metrics)]
         return result_obj_lst, result_audio_file_paths
 
-def install_audio(youtube_video_url):
-    youtube_video_content = YouTube(youtube_video_url)
+def get_audio_stream(youtube_video_url, min_bitrate=MIN_SPEECH_BITRATE):
+    """
+        Returns the smallest audio stream of the video which is still good for speech (see select_audio_stream)
+        and the video's duration in milliseconds.
+    """
+    from pytube import YouTube
 
-    directory = 'content'
+    youtube_video_content = YouTube(youtube_video_url)
 
     # filter only audio
-    audio_streams = youtube_video_content.streams.filter(only_audio=True)
+    audio_stream = select_audio_stream(youtube_video_content.streams.filter(only_audio=True), min_bitrate)
+    return audio_stream, youtube_video_content.length * 1000
+
 
-    # select 128kb stream
-    audio_stream = audio_streams[1]
+def install_audio(youtube_video_url, directory='content', on_progress=None, max_workers=4,
+                  min_bitrate=MIN_SPEECH_BITRATE, cancel_token=None, metrics=None):
+    """
+        Downloads the audio stream of get_audio_stream with max_workers ranged requests at the same time.
+        Running it again after a failure continues the download.
+
+        on_progress(downloaded, total) is called with the bytes downloaded so far.
+        Cancelling cancel_token stops the download with CancelledError, running it again continues it.
+        The download is timed in metrics (metrics.Metrics) when given.
+
+        Returns:
+            str: Path to the downloaded audio file.
+    """
+    audio_stream, _ = get_audio_stream(youtube_video_url, min_bitrate)
 
     # download it
-    downloaded_file = audio_stream.download(directory)
+    downloaded_file = os.path.join(directory, audio_stream.default_filename)
+    check(cancel_token)
+    with measure(metrics, DOWNLOAD) as timing:
+        RangedDownloader(max_workers, on_progress=on_progress, cancel_token=cancel_token).download(
+            audio_stream.url, downloaded_file, audio_stream.filesize)
+        timing['bytes'] = os.path.getsize(downloaded_file)
 
     return downloaded_file
 
+
+def stream_audio(youtube_video_url, directory='content', on_progress=None, max_workers=4,
+                 min_bitrate=MIN_SPEECH_BITRATE, cancel_token=None, metrics=None):
+    """
+        Starts downloading the audio like install_audio, but returns right away with the download.StreamingDownload,
+        to be passed to GPTTranscribeWrapper.iter_transcribe_stream.
+    """
+    audio_stream, duration = get_audio_stream(youtube_video_url, min_bitrate)
+    check(cancel_token)
+    return StreamingDownload(audio_stream.url, os.path.join(directory, audio_stream.default_filename),
+                             audio_stream.filesize, duration, max_workers, on_progress, cancel_token=cancel_token,
+                             metrics=metrics)
+
+
 # For someone who wants to transcribe a specific part of the video
-def remove_trim(downloaded_file):
+def remove_trim(downloaded_file, start_time=None, end_time=None, detect=False, cancel_token=None, metrics=None):
     """
-        Trims a given video file from a specified start time for a certain duration and saves it as a new file.
+        Trims a given video file from start_time to end_time without re-encoding it (see trim_the_audio).
 
         Args:
             downloaded_file (str): Path to the original video file.
-            start_time (int): Start time for trimming (in seconds).
-            duration (int): Duration of the video to trim (in seconds).
+            start_time (float): Start time for trimming (in seconds), from the beginning if None.
+            end_time (float): End time for trimming (in seconds), to the end if None.
+            detect (bool): Without start_time and end_time, trim the music or silence the file begins
+                and ends with (see analysis.find_speech_range).
+            cancel_token (cancellation.CancellationToken): Stops it with CancelledError.
+            metrics (metrics.Metrics): Times the detection and the trimming.
 
         Returns:
-            str: Path to the trimmed video file.
+            str: Path to the trimmed file, downloaded_file itself if there is nothing to trim.
     """
-    base_filename = os.path.splitext(os.path.basename(downloaded_file))[0]
-    dst_filename = os.path.join(os.path.dirname(downloaded_file), f'{base_filename}(filtered).mp4')
-    # trim file with ffmpeg
-    ffmpeg_command = f'ffmpeg -ss 1924 -i "{downloaded_file}" -t 2515 "{dst_filename}"'
-    try:
-        subprocess.run(ffmpeg_command, shell=True, check=True)
-        print("FFmpeg command executed successfully.")
-        return dst_filename
-    except subprocess.CalledProcessError as e:
-        print("Error executing FFmpeg command:", e)
+    if detect and start_time is None and end_time is None:
+        from analysis import find_speech_range
+        duration = get_audio_duration(downloaded_file)
+        with measure(metrics, DECODE):
+            start, end = find_speech_range(downloaded_file, duration, cancel_token=cancel_token)
+        end = end if end < duration else None
+    else:
+        start, end = start_time and start_time * 1000, end_time and end_time * 1000
+    if not start and not end:
+        return downloaded_file
+    with measure(metrics, TRIM) as timing:
+        dst_filename = trim_the_audio(downloaded_file, start, end, cancel_token=cancel_token)
+        timing['bytes'] = os.path.getsize(dst_filename)
     return dst_filename
 
 
 def convert_to_srt(original_filename, content):
-    def seconds_to_srt_time(seconds):
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        millis = int((seconds % 1) * 1000)
-        return f"{hours:02}:{minutes:02}:{secs:02},{millis:03}"
-
-    srt_content = ""
-    for idx, line in enumerate(content):
-        try:
-            # Extract the time and text parts
-            time_part = line.split("]")[0].replace("[", "").strip()
-            start_time, end_time = map(float, time_part.split(" --> "))
-            text = line.split("] ")[1].strip()
-
-            # Convert the time to SRT format and add to the SRT content
-            srt_content += f"{idx}\n"
-            srt_content += f"{seconds_to_srt_time(start_time)} --> {seconds_to_srt_time(end_time)}\n"
-            srt_content += f"{text}\n\n"
-            print(f"Start time: {start_time}, End time: {end_time}, Text: {text}")
-        except Exception as e:
-            print(f"Error processing line {idx}: {line} - {e}")
-
-    # Save as SRT file
-    srt_filename = original_filename.replace(".mp4", ".srt")
-    with open(srt_filename, 'w', encoding='utf-8') as file:
-        file.write(srt_content)
+    """
+        Writes the "[start --> end] text" lines of the transcript view (content) as an SRT file
+        next to original_filename. Lines which aren't segments are skipped.
 
-# CUI usage
+        Returns:
+            str: Path to the SRT file.
+    """
+    from exporters import export
+    from segments import SegmentStore
+    store = SegmentStore()
+    for line in content:
+        match = re.match(r'\[\s*([\d.]+)\s*-->\s*([\d.]+)\s*] ?(.*)', line)
+        if match:
+            store.append(float(match.group(1)), float(match.group(2)), match.group(3))
+    return export(store, os.path.splitext(original_filename)[0], ['srt'])[0]
 
-# wrapper = GPTTranscribeWrapper(api_key=API_KEY)
-
-# filename = 'content/Microsoft (MSFT) Q4 2022 Earnings Call(filtered).mp4'
-# print(wrapper.transcribe_audio(filename, response_format='verbose_json', timestamp_granularities=['segment']), end='\n\n')
-
-# dirname = Path('examples')
-# filenames = [str(file) for file in dirname.iterdir() if file.is_file()]
-# for filename in filenames:
-#     result_obj_lst, result_audio_file_paths = wrapper.transcribe_audio(filename, response_format='verbose_json', timestamp_granularities=['segment'])
-#     for result_obj in result_obj_lst:
-#         print(f"Transcription language: {result_obj['language']}")
-#         print(f"Transcription duration: {result_obj['duration']}")
-#         segments = result_obj['segments']
-#         for segment in segments:
-#             start = segment['start']
-#             end = segment['end']
-#             text = segment['text']
-#             print(f"[{start} --> {end}] {text}")
\ No newline at end of file
+
+# CUI usage
+# python cli.py content/video.mp4 examples/ https://www.youtube.com/watch?v=... -o results
+# transcribes files, every file of a folder and Youtube URLs with the same job scheduler as the GUI queue
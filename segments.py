@@ -0,0 +1,176 @@
+import bisect
+import sys
+from array import array
+
+
+class WordStore:
+    """
+        The words of a transcription with their times (timestamp_granularities=['segment', 'word']),
+        in time order. Times are in two arrays of doubles, the words one after another in a single UTF-8 buffer
+        with the offset each of them ends at: no object per word, a word's str is only made when it's read.
+    """
+    __slots__ = ('__starts', '__ends', '__text', '__text_ends')
+
+    def __init__(self, words=()):
+        self.__starts = array('d')
+        self.__ends = array('d')
+        self.__text = bytearray()
+        # 4 bytes per word, enough for 4 GB of text
+        self.__text_ends = array('I')
+        self.extend(words)
+
+    def __len__(self):
+        return len(self.__starts)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self.__starts)
+        return self.__starts[i], self.__ends[i], self.get_word(i)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self.__starts)))
+
+    def __sizeof__(self):
+        return (object.__sizeof__(self) + sys.getsizeof(self.__starts) + sys.getsizeof(self.__ends)
+                + sys.getsizeof(self.__text) + sys.getsizeof(self.__text_ends))
+
+    def get_word(self, i):
+        begin = self.__text_ends[i - 1] if i else 0
+        return self.__text[begin:self.__text_ends[i]].decode('utf-8')
+
+    def get_starts(self):
+        return self.__starts
+
+    def append(self, start, end, word):
+        self.__starts.append(start)
+        self.__ends.append(end)
+        self.__text += word.encode('utf-8')
+        self.__text_ends.append(len(self.__text))
+
+    def extend(self, words):
+        """
+            Adds word dicts ({'start', 'end', 'word'}), as the backends return them.
+        """
+        for word in words:
+            self.append(word['start'], word['end'], word['word'])
+
+    def clear(self):
+        del self.__starts[:], self.__ends[:], self.__text[:], self.__text_ends[:]
+
+    def find_at(self, seconds):
+        """
+            Returns the index of the word being said at seconds, -1 between words.
+        """
+        i = bisect.bisect_right(self.__starts, seconds) - 1
+        return i if i >= 0 and seconds < self.__ends[i] else -1
+
+
+class SegmentStore:
+    """
+        The segments of a transcription, times in two arrays of doubles and the texts in a list,
+        instead of a dict per segment. The words of a word-level transcription are kept in a WordStore
+        next to them (get_words), each segment has the words from its start up to the next segment's.
+
+        find() searches a lowercase copy of all the texts joined together with one str.find,
+        the copy is only extended with the segments added since the last search.
+    """
+    __slots__ = ('__starts', '__ends', '__texts', '__words', '__search_text', '__search_offsets')
+
+    def __init__(self, segments=(), words=()):
+        self.__starts = array('d')
+        self.__ends = array('d')
+        self.__texts = []
+        self.__words = WordStore()
+        self.__search_text = ''
+        # Where each searched segment starts in __search_text
+        self.__search_offsets = array('q')
+        self.extend(segments, words)
+
+    @classmethod
+    def from_results(cls, result_obj_lst):
+        """
+            The segments (and words) of every result object of a transcription, failed chunks (None) are skipped.
+        """
+        store = cls()
+        for result_obj in result_obj_lst:
+            if result_obj:
+                store.extend(result_obj['segments'], result_obj.get('words', ()))
+        return store
+
+    def __len__(self):
+        return len(self.__texts)
+
+    def __getitem__(self, i):
+        return self.__starts[i], self.__ends[i], self.__texts[i]
+
+    def __iter__(self):
+        return zip(self.__starts, self.__ends, self.__texts)
+
+    def append(self, start, end, text):
+        self.__starts.append(start)
+        self.__ends.append(end)
+        self.__texts.append(text)
+
+    def extend(self, segments, words=()):
+        """
+            Adds segment dicts ({'start', 'end', 'text'}) and word dicts ({'start', 'end', 'word'}),
+            as the backends return them.
+        """
+        for segment in segments:
+            self.append(segment['start'], segment['end'], segment['text'])
+        self.__words.extend(words)
+
+    def clear(self):
+        del self.__starts[:], self.__ends[:], self.__texts[:], self.__search_offsets[:]
+        self.__words.clear()
+        self.__search_text = ''
+
+    def get_text(self, i):
+        return self.__texts[i]
+
+    def get_words(self):
+        return self.__words
+
+    def get_segment_words(self, i):
+        """
+            Returns the (start, end, word) of the words of segment i: the words which start before the next segment
+            does (every word before the second segment for the first one), an empty list without words.
+        """
+        if not self.__words:
+            return []
+        word_starts = self.__words.get_starts()
+        begin = bisect.bisect_left(word_starts, self.__starts[i]) if i else 0
+        end = (bisect.bisect_left(word_starts, self.__starts[i + 1], begin) if i + 1 < len(self.__starts)
+               else len(word_starts))
+        return [self.__words[k] for k in range(begin, end)]
+
+    def __update_search_text(self):
+        searched = len(self.__search_offsets)
+        if searched == len(self.__texts):
+            return
+        offset = len(self.__search_text)
+        new_texts = [text.lower() for text in self.__texts[searched:]]
+        for text in new_texts:
+            self.__search_offsets.append(offset)
+            # One separator per text, so a match can't run from one segment into the next
+            offset += len(text) + 1
+        self.__search_text += '\n'.join(new_texts) + '\n'
+
+    def find(self, query, start=0, backwards=False):
+        """
+            Returns the index of the first segment from start (the last one up to start with backwards)
+            whose text contains query, ignoring case, -1 if none does.
+        """
+        query = query.lower()
+        if not query or not self.__texts:
+            return -1
+        self.__update_search_text()
+        start = min(max(start, 0), len(self.__texts) - 1)
+        if backwards:
+            end = self.__search_offsets[start + 1] if start + 1 < len(self.__texts) else len(self.__search_text)
+            position = self.__search_text.rfind(query, 0, end)
+        else:
+            position = self.__search_text.find(query, self.__search_offsets[start])
+        if position < 0:
+            return -1
+        return bisect.bisect_right(self.__search_offsets, position) - 1
@@ -0,0 +1,78 @@
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QWidget, QTableWidget, QTableWidgetItem, QVBoxLayout, QLabel, QHeaderView, \
+    QAbstractItemView
+
+from metrics import BOUND_BY, STAGES, Metrics
+
+BOUND_TEXT = {
+    'network': 'the network (downloading and sending the chunks)',
+    'cpu': 'this machine (decoding, cutting and showing)',
+    'api': 'the API (waiting for its answers)',
+}
+
+
+class StatsWidget(QWidget):
+    """
+        Where the time of a job went: the seconds, calls and MB of every stage of a metrics.Metrics,
+        refreshed while the job runs.
+    """
+    def __init__(self, refresh_interval=500):
+        super(StatsWidget, self).__init__()
+        self.__initVal(refresh_interval)
+        self.__initUi()
+
+    def __initVal(self, refresh_interval):
+        self.__metrics = None
+        self.__timer = QTimer(self)
+        self.__timer.setInterval(refresh_interval)
+        self.__timer.timeout.connect(self.refresh)
+
+    def __initUi(self):
+        self.__summaryLbl = QLabel()
+        self.__summaryLbl.setWordWrap(True)
+
+        self.__tableWidget = QTableWidget(0, 5)
+        self.__tableWidget.setHorizontalHeaderLabels(['Stage', 'Calls', 'Seconds', 'MB', 'Bound by'])
+        self.__tableWidget.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.__tableWidget.verticalHeader().setVisible(False)
+        self.__tableWidget.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+
+        lay = QVBoxLayout()
+        lay.addWidget(self.__summaryLbl)
+        lay.addWidget(self.__tableWidget)
+        lay.setContentsMargins(0, 0, 0, 0)
+        self.setLayout(lay)
+
+    def setMetrics(self, metrics, running=False):
+        # running: refreshed every refresh_interval ms until stop() is called
+        self.__metrics = metrics
+        self.refresh()
+        if running:
+            self.__timer.start()
+        else:
+            self.__timer.stop()
+
+    def stop(self):
+        self.__timer.stop()
+        self.refresh()
+
+    def refresh(self):
+        if not self.isVisible() and self.__timer.isActive():
+            return
+        result = (self.__metrics or Metrics()).get()
+        stages = [stage for stage in STAGES if stage in result['stages']]
+        stages += sorted(set(result['stages']) - set(STAGES))
+        self.__tableWidget.setRowCount(len(stages))
+        for row, stage in enumerate(stages):
+            totals = result['stages'][stage]
+            values = [stage, str(totals['count']), f'{totals["seconds"]:.2f}',
+                      f'{totals["bytes"] / 1024 / 1024:.1f}' if totals['bytes'] else '', BOUND_BY.get(stage, '')]
+            for column, value in enumerate(values):
+                self.__tableWidget.setItem(row, column, QTableWidgetItem(value))
+
+        counters = result['counters']
+        text = f'{len(result["chunks"])} chunks in {result["wall_seconds"]:.2f} seconds, ' \
+               f'{counters.get("retries", 0)} retries, {counters.get("cache_hits", 0)} from the cache'
+        if result['bound']:
+            text += f'. Most of the time went to {BOUND_TEXT[result["bound"]]}'
+        self.__summaryLbl.setText(text)
@@ -0,0 +1,191 @@
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex
+from PyQt5.QtGui import QKeySequence, QPainter
+from PyQt5.QtWidgets import QListView, QWidget, QLineEdit, QVBoxLayout, QApplication, QAbstractItemView, \
+    QStyledItemDelegate, QStyle
+
+from segments import SegmentStore
+
+
+def format_segment(start, end, text):
+    return f'[{start} --> {end}] {text}'
+
+
+class TranscriptModel(QAbstractListModel):
+    """
+        One row per segment of a SegmentStore, the text of a row is only made when the view paints it.
+        With word-level timestamps, the tooltip of a row has the time of each of its words.
+    """
+    def __init__(self, store=None):
+        super(TranscriptModel, self).__init__()
+        self.__store = SegmentStore() if store is None else store
+
+    def getStore(self):
+        return self.__store
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.__store)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            return format_segment(*self.__store[index.row()])
+        if role == Qt.ItemDataRole.ToolTipRole:
+            words = self.__store.get_segment_words(index.row())
+            if words:
+                return '\n'.join(f'[{start}] {word.strip()}' for start, end, word in words)
+            return self.__store.get_text(index.row()).strip()
+        return None
+
+    def addSegments(self, segments, words=()):
+        # One insert for all of them, the view lays out and repaints once
+        segments = list(segments)
+        if not segments:
+            return
+        row = len(self.__store)
+        self.beginInsertRows(QModelIndex(), row, row + len(segments) - 1)
+        self.__store.extend(segments, words)
+        self.endInsertRows()
+
+    def setStore(self, store):
+        # Shown as it is, e.g. a finished job's
+        self.beginResetModel()
+        self.__store = store
+        self.endResetModel()
+
+    def clear(self):
+        # A new store, the one shown may be a job's
+        self.setStore(SegmentStore())
+
+
+class TranscriptItemDelegate(QStyledItemDelegate):
+    """
+        Draws a row as one line of plain text, without the eliding and layout of QStyledItemDelegate,
+        which take most of the time of a repaint.
+    """
+    def paint(self, painter, option, index):
+        rect = option.rect
+        painter.save()
+        if option.state & QStyle.StateFlag.State_Selected:
+            painter.fillRect(rect, option.palette.highlight())
+            painter.setPen(option.palette.highlightedText().color())
+        else:
+            painter.setPen(option.palette.text().color())
+        fontMetrics = option.fontMetrics
+        baseline = rect.y() + (rect.height() + fontMetrics.ascent() - fontMetrics.descent()) // 2
+        painter.drawText(rect.x() + 3, baseline, index.data())
+        painter.restore()
+
+
+class TranscriptListView(QListView):
+    def __init__(self):
+        super(TranscriptListView, self).__init__()
+        self.__initVal()
+        self.__initUi()
+
+    def __initVal(self):
+        self.__placeholder_text = ''
+
+    def __initUi(self):
+        # Every row is one line, so rows are placed without measuring each of them
+        self.setUniformItemSizes(True)
+        self.setLayoutMode(QListView.LayoutMode.Batched)
+        self.setBatchSize(500)
+        self.setItemDelegate(TranscriptItemDelegate(self))
+        self.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+
+    def setPlaceholderText(self, text):
+        self.__placeholder_text = text
+        self.viewport().update()
+
+    def paintEvent(self, e):
+        super().paintEvent(e)
+        if self.model() is not None and self.model().rowCount() == 0 and self.__placeholder_text:
+            painter = QPainter(self.viewport())
+            painter.setPen(self.palette().placeholderText().color())
+            painter.drawText(self.viewport().rect().adjusted(4, 4, -4, -4), Qt.AlignmentFlag.AlignLeft,
+                             self.__placeholder_text)
+
+    def keyPressEvent(self, e):
+        if e.matches(QKeySequence.StandardKey.Copy):
+            rows = sorted(index.row() for index in self.selectedIndexes())
+            QApplication.clipboard().setText('\n'.join(self.model().data(self.model().index(row)) for row in rows))
+            return
+        return super().keyPressEvent(e)
+
+
+class TranscriptView(QWidget):
+    """
+        The segments of a transcription in a list view with a search bar.
+        Enter goes to the next row containing the search text, Shift+Enter to the previous one.
+    """
+    def __init__(self):
+        super(TranscriptView, self).__init__()
+        self.__initUi()
+
+    def __initUi(self):
+        self.__model = TranscriptModel()
+
+        self.__searchLineEdit = QLineEdit()
+        self.__searchLineEdit.setPlaceholderText('Search...')
+        self.__searchLineEdit.setClearButtonEnabled(True)
+        self.__searchLineEdit.textChanged.connect(lambda: self.__find(forward=True, skip_current=False))
+        self.__searchLineEdit.returnPressed.connect(self.__findNext)
+
+        self.__view = TranscriptListView()
+        self.__view.setModel(self.__model)
+
+        lay = QVBoxLayout()
+        lay.addWidget(self.__searchLineEdit)
+        lay.addWidget(self.__view)
+        lay.setContentsMargins(0, 0, 0, 0)
+        self.setLayout(lay)
+
+    def getModel(self):
+        return self.__model
+
+    def getView(self):
+        return self.__view
+
+    def setPlaceholderText(self, text):
+        self.__view.setPlaceholderText(text)
+
+    def addSegments(self, segments, words=()):
+        # Keep following the end of the transcript, unless the user has scrolled up to read
+        scrollBar = self.__view.verticalScrollBar()
+        at_bottom = scrollBar.value() == scrollBar.maximum()
+        self.__model.addSegments(segments, words)
+        if at_bottom:
+            self.__view.scrollToBottom()
+
+    def setStore(self, store):
+        self.__model.setStore(store)
+
+    def clear(self):
+        self.__model.clear()
+
+    def toPlainText(self):
+        return '\n'.join(format_segment(*segment) for segment in self.__model.getStore())
+
+    def __findNext(self):
+        backwards = QApplication.keyboardModifiers() & Qt.KeyboardModifier.ShiftModifier
+        self.__find(forward=not backwards, skip_current=True)
+
+    def __find(self, forward=True, skip_current=True):
+        store = self.__model.getStore()
+        current = self.__view.currentIndex().row()
+        if current < 0:
+            start = 0 if forward else len(store) - 1
+        else:
+            start = current + (1 if forward else -1) * skip_current
+        query = self.__searchLineEdit.text()
+        row = store.find(query, start, backwards=not forward) if 0 <= start < len(store) else -1
+        if row < 0:
+            # Wrap around
+            row = store.find(query, 0 if forward else len(store) - 1, backwards=not forward)
+        if row < 0:
+            return
+        index = self.__model.index(row)
+        self.__view.setCurrentIndex(index)
+        self.__view.scrollTo(index, QAbstractItemView.ScrollHint.PositionAtCenter)
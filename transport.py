@@ -0,0 +1,161 @@
+import contextlib
+import importlib.util
+import sys
+import threading
+
+# Connections kept open, enough for the chunk uploads of a few jobs at once
+POOL_SIZE = 20
+# Idle connections are closed after this many seconds (openai's own client closes them after 5,
+# less than the pause between the key check and the first upload, or a retry's back-off)
+KEEPALIVE_EXPIRY = 60
+
+
+def get_httpx():
+    """
+        Returns the httpx module openai is built on (newer openai versions ship it as httpx2),
+        the client has to be one of its clients to be handed to openai.
+    """
+    from openai import DefaultHttpxClient
+    return sys.modules[DefaultHttpxClient.__bases__[0].__module__.partition('.')[0]]
+
+
+def is_http2_available():
+    # httpx only speaks HTTP/2 with the h2 package
+    return importlib.util.find_spec('h2') is not None
+
+
+class ConnectionStats:
+    """
+        Counts the requests sent through a client and the connections (and TLS handshakes) opened for them,
+        every other request went over a connection which was kept alive.
+    """
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.__lock:
+            self.__requests = 0
+            self.__connections = 0
+            self.__tls_handshakes = 0
+            self.__http2_requests = 0
+
+    def trace(self, name, info):
+        # httpcore's trace extension, called for every step of a request
+        if name == 'connection.connect_tcp.complete':
+            with self.__lock:
+                self.__connections += 1
+        elif name == 'connection.start_tls.complete':
+            with self.__lock:
+                self.__tls_handshakes += 1
+
+    def add_request(self, http_version):
+        with self.__lock:
+            self.__requests += 1
+            if http_version == b'HTTP/2':
+                self.__http2_requests += 1
+
+    def get(self):
+        with self.__lock:
+            return {
+                'requests': self.__requests,
+                'connections': self.__connections,
+                'tls_handshakes': self.__tls_handshakes,
+                'reused': max(0, self.__requests - self.__connections),
+                'http2_requests': self.__http2_requests,
+            }
+
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def observe_requests(observer):
+    """
+        Calls observer(name, info) for every request sent from this thread through a client of create_client
+        in the with block: ('request.started', request), httpcore's trace events of the request
+        and ('request.complete', response), with None when the request failed.
+    """
+    previous = getattr(_local, 'observer', None)
+    _local.observer = observer
+    try:
+        yield
+    finally:
+        _local.observer = previous
+
+
+def create_client(pool_size=POOL_SIZE, keepalive_expiry=KEEPALIVE_EXPIRY, http2=None, verify=True, stats=None):
+    """
+        Returns an httpx client for openai (openai.DefaultHttpxClient: its timeouts and redirects)
+        keeping up to pool_size connections alive for keepalive_expiry seconds, over HTTP/2 when
+        http2 (by default when h2 is installed). Its requests are counted in stats (ConnectionStats)
+        and reported to the observer of observe_requests.
+    """
+    from openai import DefaultHttpxClient
+    httpx = get_httpx()
+
+    class CountingTransport(httpx.HTTPTransport):
+        def handle_request(self, request):
+            observer = getattr(_local, 'observer', None)
+            if stats or observer:
+                trace = request.extensions.get('trace')
+
+                def on_trace(name, info):
+                    if stats:
+                        stats.trace(name, info)
+                    if observer:
+                        observer(name, info)
+                    if trace:
+                        trace(name, info)
+
+                request.extensions['trace'] = on_trace
+            if observer:
+                observer('request.started', request)
+            response = None
+            try:
+                response = super().handle_request(request)
+            finally:
+                if observer:
+                    observer('request.complete', response)
+            if stats:
+                stats.add_request(response.extensions.get('http_version'))
+            return response
+
+    limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size,
+                          keepalive_expiry=keepalive_expiry)
+    transport = CountingTransport(limits=limits, http2=is_http2_available() if http2 is None else http2,
+                                  verify=verify)
+    return DefaultHttpxClient(transport=transport)
+
+
+# The client shared by every outbound call to the API (key checks and transcriptions), made on first use
+_client = None
+_client_lock = threading.Lock()
+_options = {}
+_stats = ConnectionStats()
+
+
+def configure(**options):
+    """
+        Sets the create_client options of the shared client (pool_size, keepalive_expiry, http2, verify).
+        Has to be called before its first use.
+    """
+    with _client_lock:
+        if _client is not None:
+            raise RuntimeError('The shared HTTP client is already in use')
+        _options.update(options)
+
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = create_client(stats=_stats, **_options)
+        return _client
+
+
+def get_stats():
+    """
+        Returns the ConnectionStats.get() of the shared client.
+    """
+    return _stats.get()
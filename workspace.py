@@ -0,0 +1,86 @@
+import io
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+# RAM-backed directories, tried before the system temp dir
+TMPFS_DIRS = ['/dev/shm']
+
+# tmpfs is only used when it has room for this many bytes (a few chunks at the upload limit)
+MIN_TMPFS_FREE = 256 * 1024 * 1024
+
+
+def get_temp_root(min_free=MIN_TMPFS_FREE):
+    """
+        Returns the directory job workspaces are made in: tmpfs when there is one which is writable
+        and has min_free bytes left, the system temp dir otherwise.
+    """
+    for path in TMPFS_DIRS:
+        try:
+            if os.access(path, os.W_OK) and shutil.disk_usage(path).free >= min_free:
+                return path
+        except OSError:
+            pass
+    return tempfile.gettempdir()
+
+
+class JobWorkspace:
+    """
+        A temp directory of its own for the chunks of one job, removed with everything in it by cleanup()
+        (or when the with block ends). Jobs never see each other's chunks, even of the same file,
+        and nothing is written next to the source, so its folder may be read-only.
+    """
+    def __init__(self, root=None, prefix='transcribe_'):
+        self.__path = tempfile.mkdtemp(prefix=prefix, dir=root or get_temp_root())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cleanup()
+
+    def get_path(self):
+        return self.__path
+
+    def cleanup(self):
+        # A request which was given up on may still have its chunk open (Windows can't remove it then)
+        shutil.rmtree(self.__path, ignore_errors=True)
+
+
+class ChunkBuffer:
+    """
+        A chunk kept in memory instead of a file: the bytes ffmpeg wrote to its stdout, and the filename
+        it would have had in the workspace (the API tells the format by its extension).
+    """
+    __slots__ = ('name', 'data')
+
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+    def open(self):
+        # BytesIO shares the bytes until it's written to, so nothing is copied
+        return io.BytesIO(self.data)
+
+
+# Chunks are either a path or a ChunkBuffer, these work for both
+
+def open_chunk(chunk):
+    return chunk.open() if isinstance(chunk, ChunkBuffer) else open(chunk, 'rb')
+
+
+def get_chunk_path(chunk):
+    return chunk.name if isinstance(chunk, ChunkBuffer) else chunk
+
+
+def get_chunk_size(chunk):
+    return len(chunk) if isinstance(chunk, ChunkBuffer) else os.path.getsize(chunk)
+
+
+def remove_chunk(chunk):
+    if not isinstance(chunk, ChunkBuffer):
+        Path(chunk).unlink(missing_ok=True)